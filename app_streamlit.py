@@ -7,9 +7,43 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
+import hashlib
 import io
-import difflib
-import re
+import logging
+import os
+import time
+import zipfile
+
+from fuzzy_match import MODE_EDIT, MODE_EXACT, MODE_FAST
+from jobs import JOB_CANCELLED, JOB_DONE, JOB_QUEUED, JobRegistry, replay
+from master_store import MasterStore, StoredMaster
+from slider_core import (
+    EXPORT_FORMATS,
+    FUZZY_TOP_K,
+    MASTER_EXTENSIONS,
+    MEASUREMENT_EXTENSIONS,
+    PARSER_OPTIONS,
+    POTENTIAL_MATCH_CUTOFF,
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_MEDIUM,
+    SIMILAR_CUTOFF,
+    IncrementalComparison,
+    LRUCache,
+    PipelineStats,
+    Reporter,
+    archive_members,
+    compare_many,
+    compressed_extensions,
+    create_combined_report,
+    create_excel_report,
+    export_formats,
+    export_result,
+    file_digest,
+    read_master_file,
+    read_measurement_file,
+    result_status
+)
 
 # ตั้งค่าหน้าเว็บ
 st.set_page_config(
@@ -60,461 +94,977 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def clean_serial(serial):
-    """ทำความสะอาด serial number"""
-    if not serial or pd.isna(serial):
-        return ""
+# Structured log ของแต่ละ stage (JSON หนึ่งบรรทัด) ออกทาง console ของ server
+stage_logger = logging.getLogger('slider_tool')
+if not stage_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    stage_logger.addHandler(_handler)
+    stage_logger.setLevel(logging.INFO)
+
+
+# Parse cache: จำกัดขนาดด้วยจำนวน serial รวมและจำนวนไฟล์ - serial เก็บเป็น SerialSet (numpy array กว้างเท่า
+# serial ที่ยาวที่สุด, ~10-20 bytes ต่อ serial) จึงใช้หน่วยความจำไม่เกิน ~200 MB เท่างบเดิม
+PARSE_CACHE_MAX_SERIALS = 10_000_000
+PARSE_CACHE_MAX_ENTRIES = 16
+
+# Result cache: ผลการเปรียบเทียบ + Excel report ที่ใช้ร่วมกันทุก session จำกัดด้วยขนาดโดยประมาณ (bytes)
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# ขนาดโดยประมาณของ serial หนึ่งตัวใน missing/extra_serials ของ result (str + ช่องใน list)
+RESULT_SERIAL_BYTES = 72
+
+# Result browser: จำนวนแถวต่อหน้า (format เฉพาะแถวของหน้าที่แสดง)
+PAGE_SIZES = [25, 50, 100, 250]
+
+# ปุ่ม download ไฟล์ export (ตารางผลหนึ่งแถวต่อ serial - เขียน/อ่านเร็วกว่า Excel) ของแต่ละ format
+EXPORT_LABELS = {
+    'parquet': "Parquet",
+    'arrow': "Arrow IPC",
+    'csv': "CSV (gzip)"
+}
+
+# ความถี่ที่หน้าเว็บ poll สถานะของ background job (วินาที)
+JOB_POLL_SECONDS = 1.0
+
+# ชื่อ stage ที่แสดงระหว่าง job รัน
+STAGE_LABELS = {
+    'read_master': "📄 Reading master file",
+    'load_saved_master': "💾 Loading saved master",
+    'parse_cache_hit': "⚡ Reusing parsed file",
+    'read_measurement': "📊 Reading measurement file",
+    'read_appended_rows': "📊 Reading appended rows",
+    'detect_column': "🔍 Detecting serial column",
+    'master_index': "🗂️ Building master index",
+    'compare_file': "🔄 Comparing file",
+    'set_difference': "🔄 Comparing serials",
+    'incremental_delta': "♻️ Applying new rows",
+    'fuzzy_missing': "🔍 Fuzzy matching missing serials",
+    'fuzzy_extra': "🔍 Fuzzy matching extra serials",
+    'result_tables': "📋 Building result tables",
+    'excel_report': "📝 Generating Excel report",
+    'export_files': "📦 Writing Parquet/Arrow/CSV exports"
+}
+
+
+class StreamlitReporter(Reporter):
+    """แสดงข้อความสถานะจาก slider_core บนหน้าเว็บ"""
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self._progress_bars = {}
+
+    def write(self, message):
+        st.write(message)
+
+    def info(self, message):
+        st.info(message)
+
+    def success(self, message):
+        st.success(message)
+
+    def warning(self, message):
+        st.warning(message)
+
+    def error(self, message):
+        st.error(message)
+
+    def exception(self, exc):
+        st.exception(exc)
+
+    def details(self, title, lines, limit=20):
+        with st.expander(title):
+            for line in lines[:limit]:
+                st.text(line)
+            if len(lines) > limit:
+                st.text(f"... and {len(lines) - limit} more")
+
+    def progress(self, label, done, total):
+        if label not in self._progress_bars:
+            self._progress_bars[label] = st.progress(0, text=label)
+        bar = self._progress_bars[label]
+        if done >= total:
+            bar.empty()
+        else:
+            bar.progress(done / total, text=label)
+
 
-    serial_str = str(serial).strip().upper()
+@st.cache_resource
+def get_parse_cache():
+    """Parse cache ที่ใช้ร่วมกันทุก rerun และทุก session ของ server"""
+    return LRUCache(
+        max_weight=PARSE_CACHE_MAX_SERIALS,
+        max_entries=PARSE_CACHE_MAX_ENTRIES,
+        weigher=lambda entry: len(entry['serials']) + 1
+    )
 
-    # ลบ whitespace ส่วนเกิน
-    serial_str = re.sub(r'\s+', '', serial_str)
 
-    # แยก suffix ออก (ถ้ามี comma)
-    if ',' in serial_str:
-        serial_str = serial_str.split(',')[0].strip()
+@st.cache_resource
+def get_result_cache():
+    """ผลการเปรียบเทียบที่ใช้ร่วมกันทุก session - คู่ไฟล์ + ตั้งค่าเดิมไม่ต้อง fuzzy match ซ้ำ"""
+    return LRUCache(max_weight=RESULT_CACHE_MAX_BYTES, weigher=comparison_bytes)
 
-    # เอา 10 ตัวแรก
-    return serial_str[:10] if len(serial_str) >= 8 else serial_str
 
+def comparison_bytes(comparison):
+    """ขนาดโดยประมาณของผลการเปรียบเทียบใน memory: Excel report + exports + profile + ตาราง detail + serial lists
 
-def detect_serial_column(df):
-    """ตรวจจับ column ที่มี serial number"""
+    ตาราง detail ใน tables เป็น DataFrame ตัวเดียวกับใน result จึงนับครั้งเดียว
+    """
+    tables = sum(int(df.memory_usage(deep=True).sum()) for df in comparison['tables'].values())
+    result = comparison['aggregate'] if comparison.get('multi') else comparison['result']
+    serials = (result['missing_count'] + result['extra_count']) * RESULT_SERIAL_BYTES
+    exports = sum(len(data) for data in comparison.get('exports', {}).values())
+    return (len(comparison['excel_data']) + exports + len(comparison.get('profile_data') or b'') + tables
+            + serials)
 
-    # Keywords ที่บ่งบอกว่าเป็น serial column
-    serial_keywords = ['serial', 'slider', 'sn', 'part', 'number']
-    exclude_keywords = ['probe', 'date', 'time', 'tester', 'result', 'status']
 
-    st.write("🔍 **Detecting serial column...**")
+@st.cache_resource
+def get_master_store():
+    """Master ที่ save ไว้บน disk - ใช้ร่วมกันทุก session ของ server"""
+    return MasterStore()
 
-    # วิธีที่ 1: ตรวจสอบจาก column name
-    for idx, col in enumerate(df.columns):
-        col_lower = str(col).lower()
 
-        # ข้าม column ที่มี exclude keywords
-        if any(ex in col_lower for ex in exclude_keywords):
-            continue
+@st.cache_resource
+def get_job_registry():
+    """Background job ของการเปรียบเทียบ - thread pool เดียวกันทุก session ของ server"""
+    return JobRegistry()
 
-        # ตรวจสอบ serial keywords
-        if any(kw in col_lower for kw in serial_keywords):
-            st.success(f"✅ Found serial column: **{col}** (Column {idx})")
-            return idx, col
 
-    # วิธีที่ 2: ตรวจสอบจาก pattern ของข้อมูล
-    st.info("🔍 No keyword match, analyzing data patterns...")
+class DetachedUpload(io.BytesIO):
+    """สำเนาของไฟล์ที่ upload สำหรับอ่านใน background job
 
-    for idx, col in enumerate(df.columns):
-        # ดึงตัวอย่างข้อมูล 50 แถวแรก
-        sample_data = df[col].dropna().head(50).astype(str)
+    ใช้ bytes เดิมร่วมกัน (ไม่ copy) แต่มีตำแหน่งอ่านของตัวเอง และมี digest ติดมา
+    จึงไม่ต้องแตะ UploadedFile หรือ session จาก thread ของ job
 
-        if len(sample_data) == 0:
-            continue
+    member ที่เลือกจาก .zip ก็ใช้ class นี้ - bytes ของ archive แต่ชื่อเป็นของ member (ชื่อไฟล์ข้างในเลือก reader)
+    """
 
-        # นับจำนวนที่ตรงกับ pattern
-        # Pattern: ขึ้นต้นด้วยตัวอักษร 1-3 ตัว ตามด้วยตัวเลขและตัวอักษร รวม 8-15 ตัว
-        valid_count = sum(
-            1 for s in sample_data
-            if re.match(r'^[A-Z]{1,3}[A-Z0-9]{7,14}$', s.strip().upper().split(',')[0])
-        )
+    def __init__(self, uploaded_file, digest, member=None):
+        super().__init__(uploaded_file.getvalue())
+        self.member = member or getattr(uploaded_file, 'member', None)
+        self.name = self.member or uploaded_file.name
+        self.size = uploaded_file.size
+        self.digest = digest
 
-        match_rate = valid_count / len(sample_data)
 
-        st.write(f"  - Column {idx} ({col}): {match_rate * 100:.1f}% match rate")
+def detach_upload(uploaded_file):
+    if isinstance(uploaded_file, StoredMaster):
+        return uploaded_file
+    return DetachedUpload(uploaded_file, upload_digest(uploaded_file))
 
-        # ถ้าตรงกับ pattern มากกว่า 70% ถือว่าเป็น serial column
-        if match_rate >= 0.7:
-            st.success(f"✅ Detected serial column: **{col}** (Column {idx}) - {match_rate * 100:.1f}% pattern match")
-            return idx, col
 
-    # ถ้าไม่เจอ ใช้ column 0 หรือ column ที่ user เลือก
-    st.warning("⚠️ Could not auto-detect serial column, using first column")
-    return 0, df.columns[0]
+def archive_selection(uploaded_file, extensions, key, multiple=False):
+    """ไฟล์ .zip ที่ upload: ให้เลือก member แล้วคืน list ของ member ที่เลือก (ไฟล์อื่นคืน [uploaded_file])
+
+    member ถูก decompress แบบ stream ตอนอ่าน - digest ของ member = hash ของ archive + ชื่อ member
+    """
+    if Path(uploaded_file.name).suffix.lower() != '.zip':
+        return [uploaded_file]
+    try:
+        members = archive_members(uploaded_file, extensions)
+    except zipfile.BadZipFile as e:
+        st.error(f"❌ {uploaded_file.name}: {e}")
+        return []
+    if not members:
+        st.error(f"❌ {uploaded_file.name} has no {', '.join(extensions)} files")
+        return []
+
+    label = f"Files in {uploaded_file.name}"
+    key = f"{key}_{getattr(uploaded_file, 'file_id', uploaded_file.name)}"
+    if multiple:
+        selected = st.multiselect(label, members, default=members, key=key)
+    else:
+        selected = [st.selectbox(label, members, key=key)]
+    archive_digest = upload_digest(uploaded_file)
+    return [DetachedUpload(uploaded_file, hashlib.blake2b(f"{archive_digest}/{member}".encode(),
+                                                          digest_size=16).hexdigest(), member)
+            for member in selected]
+
+
+def upload_types(extensions):
+    """นามสกุลสำหรับ st.file_uploader - รวมไฟล์บีบอัดที่อ่านได้ (lot1.csv.gz ผ่าน filter ด้วย 'gz')"""
+    return [ext.lstrip('.') for ext in (*extensions, *compressed_extensions())]
+
+
+def upload_digest(uploaded_file):
+    """Hash ของไฟล์ที่ upload - จำค่าไว้ใน session ตาม file_id จะได้ไม่ต้อง hash ซ้ำทุก rerun"""
+    # master ที่ save ไว้ (และไฟล์ของ background job) มี digest ของไฟล์เดิมอยู่แล้ว
+    if isinstance(uploaded_file, (StoredMaster, DetachedUpload)):
+        return uploaded_file.digest
+
+    file_id = getattr(uploaded_file, 'file_id', None)
+    if file_id is None:
+        return file_digest(uploaded_file)
+
+    digests = st.session_state.setdefault('upload_digests', {})
+    if file_id not in digests:
+        digests[file_id] = file_digest(uploaded_file)
+    return digests[file_id]
+
+
+def read_file_cached(read_func, uploaded_file, reporter, cache=None):
+    """อ่านไฟล์ผ่าน parse cache - key คือ hash ของไฟล์ + parser options
+
+    ไฟล์เดิม (เนื้อหาเดียวกัน) จะไม่ถูก parse ซ้ำ ทั้งตอน rerun และตอนเปรียบเทียบใหม่
+    background job ส่ง cache มาเอง (ไม่เรียก st.cache_resource จาก thread ของ job)
+    """
+    cache = cache if cache is not None else get_parse_cache()
+    key = (read_func.__name__, upload_digest(uploaded_file),
+           Path(uploaded_file.name).suffix.lower(), PARSER_OPTIONS)
+
+    cached = cache.get(key)
+    if cached is not None:
+        with reporter.stage('parse_cache_hit', rows=len(cached['serials']), detail=uploaded_file.name):
+            reporter.write(f"📄 **{uploaded_file.name}**")
+            reporter.info(f"⚡ Cache hit: reused parsed result - {len(cached['serials'])} serials, "
+                          f"{cached['source']} (parsed in {cached['parse_seconds']:.2f}s)")
+        return cached['serials'], cached['source']
+
+    start = time.perf_counter()
+    serials, source = read_func(uploaded_file, reporter)
+    elapsed = time.perf_counter() - start
+
+    # ไม่ cache ไฟล์ที่อ่านไม่สำเร็จ
+    if serials:
+        cache.put(key, {
+            'serials': serials,
+            'source': source,
+            'parse_seconds': elapsed
+        })
+
+    stats = cache.stats()
+    reporter.write(f"💾 Cache miss: parsed in {elapsed:.2f}s "
+                   f"(cache: {stats['entries']} files, {stats['weight']:,} serials)")
+    return serials, source
+
+
+def read_master_cached(master_file, fuzzy_mode, reporter, cache=None, store=None):
+    """อ่าน master - ถ้าเคย save ไว้ใน master store จะโหลด index ผ่าน memory map แทนการ parse
+
+    คืนค่า (serials, source, master index หรือ None ถ้าต้องสร้างใหม่)
+    """
+    if isinstance(master_file, StoredMaster):
+        stored = master_file
+    else:
+        store = store if store is not None else get_master_store()
+        stored = store.get(upload_digest(master_file))
+
+    if stored is not None:
+        try:
+            with reporter.stage('load_saved_master', rows=stored.count, detail=stored.name):
+                serials, source, index = stored.load(fuzzy_mode)
+        except (OSError, ValueError, KeyError) as e:
+            if stored is master_file:
+                raise
+            reporter.warning(f"⚠️ Saved master index could not be loaded ({e}) - parsing the file instead.")
+        else:
+            reporter.write(f"📄 **{stored.name}**")
+            reporter.info(f"💾 Loaded saved master index - {len(serials):,} serials, {source} "
+                          f"(saved {stored.saved_at})")
+            return serials, source, index
+
+    serials, source = read_file_cached(read_master_file, master_file, reporter, cache)
+    return serials, source, None
+
+
+def render_save_master(master_file):
+    """ปุ่ม save master ที่ upload ไว้ใน master store (ครั้งต่อไปโหลดได้ทันทีโดยไม่ต้อง parse)"""
+    store = get_master_store()
+    digest = upload_digest(master_file)
+    if store.get(digest) is not None:
+        st.caption("💾 Saved master index available - loads without parsing")
+        return
+
+    if st.button("💾 Save as reusable master", key='save_master',
+                 help="Parse and index this master once, then load it instantly in any session"):
+        with st.expander("📄 Master File Analysis"):
+            serials, source = read_file_cached(read_master_file, master_file, StreamlitReporter())
+        if not serials:
+            st.error("❌ No valid serials found - master not saved.")
+            return
+        try:
+            with st.spinner("💾 Building and saving master index..."):
+                stored = store.save(digest, master_file.name, serials, source)
+        except OSError as e:
+            st.error(f"❌ Could not save master: {e}")
+            return
+        st.success(f"✅ Saved {stored.name} ({stored.count:,} serials)")
+
+
+def appendable_state(master_file, measurement_file, fuzzy_mode, top_k=FUZZY_TOP_K):
+    """สถานะการเปรียบเทียบล่าสุดใน session ถ้า measurement file เป็นไฟล์เดิม + แถวต่อท้าย (ไม่งั้น None)"""
+    saved = st.session_state.get('incremental')
+    if saved is None:
+        return None
+    master_digest, incremental = saved
+    if (master_digest != upload_digest(master_file) or incremental.fuzzy_mode != fuzzy_mode
+            or incremental.top_k != top_k):
+        return None
+    return incremental if incremental.is_append(measurement_file) else None
+
+
+def run_comparison(master_file, measurement_file, fuzzy_mode, reporter, workers=1, incremental=None,
+                   top_k=FUZZY_TOP_K, cache=None, store=None):
+    """อ่านไฟล์ เปรียบเทียบ และวิเคราะห์ fuzzy matching - คืนค่าผลลัพธ์ทั้งหมดสำหรับเก็บใน session
+
+    incremental (จาก appendable_state) - อ่านและวิเคราะห์เฉพาะแถวที่ต่อท้ายไฟล์ measurement
+    ไม่แตะ st หรือ session (รันใน background job ได้) - สถานะ incremental ใหม่อยู่ใน key 'incremental'
+    """
+    if incremental is not None:
+        reporter.write("📊 **Measurement file - appended rows only**")
+        incremental.workers = workers
+        result = incremental.append_file(measurement_file, reporter)
+    else:
+        master_serials, master_source, master_index = read_master_cached(master_file, fuzzy_mode, reporter,
+                                                                          cache, store)
+        measurement_serials, measurement_source = read_file_cached(read_measurement_file, measurement_file,
+                                                                   reporter, cache)
+
+        if not master_serials or not measurement_serials:
+            raise ValueError("Failed to read files or no valid serials found.")
+
+        reporter.write("🔄 **Comparison Analysis**")
+        incremental = IncrementalComparison(master_serials, master_source, fuzzy_mode, workers, master_index,
+                                            top_k)
+        result = incremental.compare(measurement_serials, measurement_source, reporter)
+        incremental.track_file(measurement_file, upload_digest(measurement_file))
+
+    # ตารางแสดงผลและ Excel report สร้างครั้งเดียว แล้วเก็บไว้ใน session
+    with reporter.stage('result_tables', rows=result['missing_count'] + result['extra_count']):
+        tables = build_result_tables(result)
+
+    with reporter.stage('excel_report', rows=result['missing_count'] + result['extra_count']):
+        excel_data = create_excel_report(result, master_file.name, measurement_file.name).getvalue()
+
+    with reporter.stage('export_files', rows=result['missing_count'] + result['extra_count']):
+        exports = export_result(result, export_formats())
+
+    now = datetime.now()
+    return {
+        'result': result,
+        'tables': tables,
+        'excel_data': excel_data,
+        'exports': exports,
+        'master_name': master_file.name,
+        'measurement_name': measurement_file.name,
+        'compared_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+        'timestamp': now.strftime('%Y%m%d_%H%M%S'),
+        # ถ้าไฟล์ measurement ถูกต่อท้ายภายหลัง จะคำนวณเฉพาะส่วนที่เพิ่ม
+        'incremental': (upload_digest(master_file), incremental),
+        **diagnostics_fields(reporter.stats)
+    }
 
 
-def find_closest_match(target, candidates, cutoff=0.6):
-    """หา serial ที่ใกล้เคียงที่สุด"""
-    if not candidates:
-        return None, 0.0
+def run_multi_comparison(master_file, measurement_files, fuzzy_mode, reporter, workers=1, top_k=FUZZY_TOP_K,
+                         cache=None, store=None):
+    """เปรียบเทียบ master เดียวกับหลาย measurement file - อ่านและสร้าง master index ครั้งเดียว"""
+    master_serials, master_source, master_index = read_master_cached(master_file, fuzzy_mode, reporter,
+                                                                      cache, store)
+    if not master_serials:
+        raise ValueError("Failed to read master file or no valid serials found.")
+
+    def measurements():
+        # อ่านทีละไฟล์ระหว่างเปรียบเทียบ (ไม่ต้องโหลดทุกไฟล์พร้อมกัน)
+        for i, measurement_file in enumerate(measurement_files, 1):
+            reporter.write(f"📊 **Measurement File {i}: {measurement_file.name}**")
+            serials, source = read_file_cached(read_measurement_file, measurement_file, reporter, cache)
+            if not serials:
+                reporter.warning(f"⚠️ Skipped {measurement_file.name}: no valid serials found.")
+                continue
+            yield measurement_file.name, serials, source
+
+    reporter.write("🔄 **Comparison Analysis**")
+    per_file, aggregate = compare_many(
+        master_serials, measurements(), master_source=master_source,
+        fuzzy_mode=fuzzy_mode, workers=workers, reporter=reporter, master_index=master_index, top_k=top_k
+    )
+
+    if not per_file:
+        raise ValueError("No measurement file could be read.")
+
+    per_file_df = pd.DataFrame([
+        {
+            '📊 Measurement File': name,
+            'Total': result['total_measurement'],
+            '✅ Matched': result['matched_count'],
+            'Match %': f"{result['match_percentage']}%",
+            '❌ Missing': result['missing_count'],
+            '➕ Extra': result['extra_count'],
+            '🚨 Potential Typos': result['missing_priority'][PRIORITY_HIGH],
+            'Status': result_status(result)
+        }
+        for name, result in per_file
+    ])
+
+    with reporter.stage('excel_report', rows=sum(r['missing_count'] + r['extra_count'] for _, r in per_file)):
+        excel_data = create_combined_report(per_file, aggregate, master_file.name).getvalue()
+
+    with reporter.stage('export_files', rows=aggregate['missing_count'] + aggregate['extra_count']):
+        exports = export_result(aggregate, export_formats())
+
+    now = datetime.now()
+    return {
+        'multi': True,
+        'aggregate': aggregate,
+        'tables': {'per_file': per_file_df, 'missing': aggregate['missing_details']},
+        'excel_data': excel_data,
+        'exports': exports,
+        'master_name': master_file.name,
+        'measurement_name': f"{len(per_file)} measurement files",
+        'compared_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+        'timestamp': now.strftime('%Y%m%d_%H%M%S'),
+        **diagnostics_fields(reporter.stats)
+    }
 
-    matches = difflib.get_close_matches(target, candidates, n=1, cutoff=cutoff)
-    if matches:
-        match = matches[0]
-        ratio = difflib.SequenceMatcher(None, target, match).ratio()
-        return match, ratio
-    return None, 0.0
 
+def comparison_job(master_file, measurement_files, fuzzy_mode, workers=1, incremental=None, top_k=FUZZY_TOP_K,
+                   user=None):
+    """สร้างงานเปรียบเทียบสำหรับ JobRegistry.submit - เรียกใน script thread
 
-def highlight_diff(s1, s2):
-    """แสดงความแตกต่างระหว่าง 2 strings"""
-    diff = []
-    max_len = max(len(s1), len(s2))
-    s1_padded = s1.ljust(max_len)
-    s2_padded = s2.ljust(max_len)
+    ไฟล์ถูก detach และ cache/store ถูกดึงมาก่อน งานใน thread ของ job จึงไม่แตะ session หรือ st
+    ผลที่ได้ถูกเก็บใน result cache ทันทีที่เสร็จ (แม้ session ที่สั่งจะปิดไปแล้ว)
+    """
+    key = result_cache_key(master_file, measurement_files, fuzzy_mode, top_k)
+    master_file = detach_upload(master_file)
+    measurement_files = [detach_upload(f) for f in measurement_files]
+    cache, store, result_cache = get_parse_cache(), get_master_store(), get_result_cache()
 
-    for i in range(max_len):
-        if i < len(s1) and i < len(s2):
-            if s1[i] == s2[i]:
-                diff.append('✓')
-            else:
-                diff.append('✗')
+    def run(reporter):
+        if len(measurement_files) == 1:
+            comparison = run_comparison(master_file, measurement_files[0], fuzzy_mode, reporter, workers,
+                                        incremental, top_k, cache, store)
         else:
-            diff.append('✗')
-    return ''.join(diff)
+            comparison = run_multi_comparison(master_file, measurement_files, fuzzy_mode, reporter, workers, top_k,
+                                              cache, store)
+        # สถานะ incremental เป็นของ session ที่สั่งเท่านั้น
+        result_cache.put(key, {**{k: v for k, v in comparison.items() if k != 'incremental'},
+                               'compared_by': user})
+        return comparison
+
+    return run
+
+
+def diagnostics_fields(stats):
+    """ข้อมูล diagnostics ที่เก็บไว้กับผลการเปรียบเทียบใน session"""
+    return {
+        'diagnostics': {
+            'run_id': stats.run_id,
+            'stages': stats.stages,
+            'total_seconds': stats.total_seconds(),
+            'memory_traced': stats.trace_memory
+        },
+        'profile_data': stats.profile_data()
+    }
 
 
-def get_char_differences(s1, s2):
-    """หาตำแหน่งที่ตัวอักษรต่างกัน"""
-    differences = []
-    max_len = max(len(s1), len(s2))
-    s1_padded = s1.ljust(max_len, ' ')
-    s2_padded = s2.ljust(max_len, ' ')
+def other_matches_text(detail):
+    """candidate อันดับ 2 เป็นต้นไปของ detail เป็นข้อความเดียว เช่น "B72ABC1234 (80.0%), ..." """
+    return ', '.join(f"{match} ({similarity}%)" for match, similarity in detail.get('other_matches', ()))
 
-    for i in range(max_len):
-        if s1_padded[i] != s2_padded[i]:
-            differences.append(f"Pos{i + 1}: '{s1_padded[i].strip()}' → '{s2_padded[i].strip()}'")
 
-    return ' | '.join(differences) if differences else 'No differences'
+def build_result_tables(result):
+    """ตารางผลลัพธ์สำหรับ result browser - ใช้ตาราง detail (DataFrame) ของ result โดยตรง ไม่ต้อง copy"""
+    return {
+        'missing': result['missing_details'],
+        'extra': result['extra_details']
+    }
 
 
-def read_master_file(uploaded_file):
-    """อ่าน Master file (Text/CSV/Excel)"""
-    file_ext = Path(uploaded_file.name).suffix.lower()
+def typo_rows(page):
+    """แถวที่แสดงของตาราง potential typos - สร้างเฉพาะแถวในหน้าปัจจุบัน"""
+    return pd.DataFrame([
+        {
+            '📄 Master Serial (Text)': d['master_serial'],
+            '📊 CSV Serial (Closest)': d['closest_csv'],
+            'Match %': f"{d['similarity']}%",
+            'Pattern': d['diff_pattern'],
+            'Differences': d['char_differences'],
+            '🔁 Other Candidates': other_matches_text(d)
+        }
+        for d in page.to_dict('records')
+    ])
+
+
+def missing_rows(page):
+    return pd.DataFrame([
+        {
+            '📄 Master Serial': d['master_serial'],
+            '📊 Closest in CSV': d['closest_csv'],
+            'Match %': f"{d['similarity']}%",
+            'Status': d['status'],
+            'Differences': d['char_differences'][:50] + '...' if len(d['char_differences']) > 50
+            else d['char_differences'],
+            '🔁 Other Candidates': other_matches_text(d)
+        }
+        for d in page.to_dict('records')
+    ])
+
+
+def extra_rows(page):
+    return pd.DataFrame([
+        {
+            '📊 CSV Serial': d['csv_serial'],
+            '📄 Closest in Master': d['closest_master'],
+            'Match %': f"{d['similarity']}%",
+            'Status': d['status'],
+            '🔁 Other Candidates': other_matches_text(d)
+        }
+        for d in page.to_dict('records')
+    ])
+
+
+def multi_missing_rows(page):
+    return pd.DataFrame([
+        {
+            '📄 Master Serial': d['master_serial'],
+            '📊 Closest Match': d['closest_csv'],
+            'Match %': f"{d['similarity']}%",
+            'From File': d['file'] if d['similarity'] > 0 else '',
+            '🔁 Other Candidates': other_matches_text(d),
+            'Status': d['status']
+        }
+        for d in page.to_dict('records')
+    ])
 
-    st.write(f"📄 **Reading Master File:** {uploaded_file.name}")
 
-    try:
-        if file_ext == '.txt':
-            # อ่าน Text file
-            content = uploaded_file.getvalue().decode('utf-8-sig', errors='ignore')
-
-            # แยกทีละบรรทัด
-            lines = content.split('\n')
-
-            serials = set()
-            skipped = []
-
-            for line_num, line in enumerate(lines, 1):
-                cleaned = clean_serial(line)
-
-                # กรองบรรทัดว่าง, header, หรือข้อมูลไม่ใช่ serial
-                if not cleaned:
-                    continue
-                if len(cleaned) < 8:
-                    skipped.append(f"Line {line_num}: '{line.strip()}' (too short)")
-                    continue
-                if cleaned.lower() in ['serial', 'slider', 'sn', 'partnumber']:
-                    skipped.append(f"Line {line_num}: '{line.strip()}' (header)")
-                    continue
-
-                serials.add(cleaned)
-
-            st.success(f"✅ Found {len(serials)} valid serials from Text file")
-
-            if skipped:
-                with st.expander(f"⚠️ Skipped {len(skipped)} lines (click to view)"):
-                    for skip in skipped[:20]:
-                        st.text(skip)
-                    if len(skipped) > 20:
-                        st.text(f"... and {len(skipped) - 20} more")
-
-            return serials, "Text File (Line by line)"
-
-        elif file_ext == '.csv':
-            # อ่าน CSV
-            df = pd.read_csv(uploaded_file, encoding='utf-8-sig')
-            st.write(f"  - Shape: {df.shape[0]} rows × {df.shape[1]} columns")
-            st.write(f"  - Columns: {', '.join(map(str, df.columns.tolist()))}")
-
-            # ตรวจจับ serial column
-            serial_col_idx, serial_col_name = detect_serial_column(df)
-
-            # ดึง serials
-            serials = set(
-                clean_serial(serial)
-                for serial in df.iloc[:, serial_col_idx].dropna().astype(str)
-                if clean_serial(serial) and len(clean_serial(serial)) >= 8
+def filter_table(frame, statuses, similarity=(0, 100), sort_by=None, descending=False):
+    """กรองตาม status และช่วง Match % แล้วเรียงตาม column - ทำกับทั้งตารางบน server ด้วย pandas"""
+    view = frame[frame['status'].isin(statuses) & frame['similarity'].between(*similarity)]
+    if sort_by:
+        view = view.sort_values(sort_by, ascending=not descending, kind='stable')
+    return view
+
+
+def render_table_browser(frame, format_rows, key, sort_columns, similarity_range=(0, 100)):
+    """ตารางผลลัพธ์แบบแบ่งหน้า: กรอง/เรียงทั้งตารางบน server แล้ว format เฉพาะแถวของหน้าปัจจุบัน
+
+    sort_columns - {ชื่อที่แสดง: column ใน frame} ตัวแรกเป็นค่า default
+    """
+    status_options = sorted(frame['status'].unique())
+    col1, col2, col3, col4 = st.columns([3, 3, 2, 1])
+    with col1:
+        statuses = st.multiselect("Status", status_options, default=status_options, key=f'{key}_status')
+    with col2:
+        similarity = st.slider("Match %", similarity_range[0], similarity_range[1], similarity_range,
+                               key=f'{key}_similarity')
+    with col3:
+        sort_label = st.selectbox("Sort by", list(sort_columns), key=f'{key}_sort')
+    with col4:
+        descending = st.checkbox("Descending", key=f'{key}_descending')
+
+    view = filter_table(frame, statuses, similarity, sort_columns[sort_label], descending)
+
+    page_count = max(1, -(-len(view) // st.session_state.get(f'{key}_page_size', PAGE_SIZES[1])))
+    # หน้าที่เลือกไว้อาจเกินจำนวนหน้าหลังเปลี่ยน filter
+    if st.session_state.get(f'{key}_page', 1) > page_count:
+        st.session_state[f'{key}_page'] = page_count
+
+    col1, col2, col3 = st.columns([1, 1, 3])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f'{key}_page_size')
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key=f'{key}_page')
+
+    start = (page - 1) * page_size
+    rows = view.iloc[start:start + page_size]
+    st.dataframe(format_rows(rows), use_container_width=True, hide_index=True,
+                 height=min(len(rows) * 35 + 38, 600))
+    with col3:
+        st.caption(f"Rows {start + 1 if len(rows) else 0:,}-{start + len(rows):,} of {len(view):,}"
+                   + (f" (filtered from {len(frame):,})" if len(view) != len(frame) else "")
+                   + f" - page {page} of {page_count}")
+
+
+def render_export_downloads(comparison, file_prefix):
+    """ปุ่ม download ไฟล์ export - ตารางเดียวหนึ่งแถวต่อ missing/extra serial สำหรับเครื่องมือวิเคราะห์ต่อ"""
+    exports = comparison.get('exports') or {}
+    if not exports:
+        return
+    st.caption("Machine-readable exports: one row per missing/extra serial with closest matches and priority")
+    for column, (fmt, data) in zip(st.columns(len(exports)), exports.items()):
+        extension, mime = EXPORT_FORMATS[fmt]
+        with column:
+            st.download_button(
+                label=f"📦 {EXPORT_LABELS[fmt]}",
+                data=data,
+                file_name=f"{file_prefix}_{comparison['timestamp']}{extension}",
+                mime=mime,
+                key=f'export_{fmt}',
+                use_container_width=True
             )
 
-            st.success(f"✅ Found {len(serials)} valid serials from column '{serial_col_name}'")
 
-            return serials, f"CSV - Column: {serial_col_name}"
+def render_results(comparison):
+    """แสดงผลการเปรียบเทียบจากข้อมูลที่เก็บไว้ (ไม่คำนวณใหม่)"""
+    result = comparison['result']
+    missing_priority = result['missing_priority']
+
+    st.markdown("---")
+    st.markdown("## 📊 Comparison Results")
+    st.caption(f"📄 {comparison['master_name']} vs 📊 {comparison['measurement_name']} "
+               f"- compared at {comparison['compared_at']}")
+
+    delta = result.get('delta')
+    if delta:
+        st.info(f"♻️ Incremental update: {delta['new_serials']} new serial(s) - "
+                f"{delta['newly_matched']} newly matched, {delta['new_extra']} new extra, "
+                f"{delta['improved_matches']} missing serial(s) with a closer match")
+
+    # Metrics
+    col1, col2, col3, col4, col5 = st.columns(5)
+
+    with col1:
+        st.metric("📄 Total Master", result['total_master'])
+    with col2:
+        st.metric("📊 Total Measurement", result['total_measurement'])
+    with col3:
+        st.metric("✅ Matched", result['matched_count'],
+                  delta=f"{result['match_percentage']}%")
+    with col4:
+        st.metric("❌ Missing", result['missing_count'],
+                  delta="⚠️ Check" if result['missing_count'] > 0 else "✅ OK",
+                  delta_color="inverse")
+    with col5:
+        st.metric("➕ Extra", result['extra_count'])
+
+    # Potential typos alert
+    potential_typos = missing_priority[PRIORITY_HIGH]
+    if potential_typos:
+        st.markdown("""
+            <div class='urgent-box'>
+                <h3 style='margin: 0; color: #856404;'>🚨 URGENT: Potential Typos Detected!</h3>
+                <p style='margin: 0.5rem 0 0 0;'>
+                    Found <strong>{}</strong> serial(s) with ≥80% similarity. 
+                    These are <strong>likely data entry errors</strong> that need immediate attention!
+                </p>
+            </div>
+        """.format(potential_typos), unsafe_allow_html=True)
+
+        st.markdown("#### 🚨 Potential Typos (High Priority)")
+        missing_table = comparison['tables']['missing']
+        render_table_browser(missing_table[missing_table['priority'] == PRIORITY_HIGH], typo_rows, 'typos',
+                             {'Master Serial': 'master_serial', 'Match %': 'similarity'}, similarity_range=(80, 100))
+
+    elif result['missing_count'] == 0:
+        st.markdown("""
+            <div class='success-box'>
+                <h3 style='margin: 0; color: #155724;'>✅ Perfect Match!</h3>
+                <p style='margin: 0.5rem 0 0 0;'>
+                    All serials from Master file were found in Measurement file.
+                </p>
+            </div>
+        """, unsafe_allow_html=True)
+
+    # Missing sliders (แบ่งหน้า)
+    if result['missing_count'] > 0:
+        st.markdown("---")
+        st.markdown("#### ❌ Missing Serials (In Master but NOT in CSV)")
+
+        # Group by priority (นับไว้แล้วใน result)
+        st.write(f"- 🚨 **High Priority (≥80% similar):** {missing_priority[PRIORITY_HIGH]} items")
+        st.write(f"- ⚠️ **Medium Priority (50-79% similar):** {missing_priority[PRIORITY_MEDIUM]} items")
+        st.write(f"- ❌ **Not Found (<50% similar):** {missing_priority[PRIORITY_LOW]} items")
+
+        render_table_browser(comparison['tables']['missing'], missing_rows, 'missing', {
+            'Master Serial': 'master_serial', 'Match %': 'similarity', 'Closest in CSV': 'closest_csv',
+            'Status': 'status'
+        })
+
+    # Extra sliders (แบ่งหน้า)
+    if result['extra_count'] > 0:
+        st.markdown("---")
+        st.markdown("#### ➕ Extra Serials (In CSV but NOT in Master)")
+
+        render_table_browser(comparison['tables']['extra'], extra_rows, 'extra', {
+            'CSV Serial': 'csv_serial', 'Match %': 'similarity', 'Closest in Master': 'closest_master',
+            'Status': 'status'
+        })
+
+    # Download button
+    st.markdown("---")
+    st.markdown("### 📥 Download Report")
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+
+    with col2:
+        st.download_button(
+            label="📥 Download Detailed Excel Report (6 Sheets)",
+            data=comparison['excel_data'],
+            file_name=f"slider_comparison_report_{comparison['timestamp']}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            type="primary",
+            use_container_width=True
+        )
+        render_export_downloads(comparison, 'slider_comparison_results')
+
+    st.markdown("""
+        <div style='background: #e7f3ff; padding: 1rem; border-radius: 0.5rem; border-left: 4px solid #2196F3;'>
+            <strong>📋 Report Contents:</strong>
+            <ul style='margin: 0.5rem 0 0 1.5rem;'>
+                <li><strong>Summary:</strong> Overview & statistics</li>
+                <li><strong>Missing (Detailed):</strong> Side-by-side comparison with closest matches</li>
+                <li><strong>Extra (Detailed):</strong> Extra serials analysis</li>
+                <li><strong>🚨 URGENT - Potential Typos:</strong> High-priority items (≥80% match)</li>
+                <li><strong>Missing (Simple List):</strong> Quick reference list</li>
+                <li><strong>Extra (Simple List):</strong> Quick reference list</li>
+            </ul>
+        </div>
+    """, unsafe_allow_html=True)
+
+    # Summary message
+    st.markdown("---")
+    if result['missing_count'] == 0:
+        st.success("✅ **PASS:** All sliders matched successfully!")
+    elif potential_typos:
+        st.error(
+            f"🚨 **CRITICAL:** {result['missing_count']} missing slider(s) detected. **{potential_typos} likely typo(s)** require immediate attention!")
+    else:
+        st.warning(f"⚠️ **WARNING:** {result['missing_count']} missing slider(s) detected.")
+
+
+def render_multi_results(comparison):
+    """แสดงผลการเปรียบเทียบ master กับหลาย measurement file"""
+    aggregate = comparison['aggregate']
+
+    st.markdown("---")
+    st.markdown("## 📊 Comparison Results (Multiple Measurement Files)")
+    st.caption(f"📄 {comparison['master_name']} vs 📊 {comparison['measurement_name']} "
+               f"- compared at {comparison['compared_at']}")
 
-        elif file_ext in ['.xlsx', '.xls']:
-            # อ่าน Excel
-            df = pd.read_excel(uploaded_file)
-            st.write(f"  - Shape: {df.shape[0]} rows × {df.shape[1]} columns")
-            st.write(f"  - Columns: {', '.join(map(str, df.columns.tolist()))}")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("📄 Total Master", aggregate['total_master'])
+    with col2:
+        st.metric("📊 Files", aggregate['file_count'])
+    with col3:
+        st.metric("✅ Matched (any file)", aggregate['matched_count'],
+                  delta=f"{aggregate['match_percentage']}%")
+    with col4:
+        st.metric("❌ Missing (all files)", aggregate['missing_count'],
+                  delta="⚠️ Check" if aggregate['missing_count'] > 0 else "✅ OK",
+                  delta_color="inverse")
+    with col5:
+        st.metric("➕ Extra (any file)", aggregate['extra_count'])
+
+    st.markdown("#### 📋 Per-File Summary")
+    st.dataframe(comparison['tables']['per_file'], use_container_width=True)
+
+    if aggregate['missing_count'] > 0:
+        st.markdown("---")
+        st.markdown("#### ❌ Missing from All Measurement Files")
+        render_table_browser(comparison['tables']['missing'], multi_missing_rows, 'multi_missing', {
+            'Master Serial': 'master_serial', 'Match %': 'similarity', 'From File': 'file', 'Status': 'status'
+        })
+
+    st.markdown("---")
+    st.markdown("### 📥 Download Report")
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.download_button(
+            label="📥 Download Combined Excel Report",
+            data=comparison['excel_data'],
+            file_name=f"slider_comparison_combined_{comparison['timestamp']}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            type="primary",
+            use_container_width=True
+        )
+        render_export_downloads(comparison, 'slider_comparison_combined_results')
 
-            # ตรวจจับ serial column
-            serial_col_idx, serial_col_name = detect_serial_column(df)
+    st.markdown("""
+        <div style='background: #e7f3ff; padding: 1rem; border-radius: 0.5rem; border-left: 4px solid #2196F3;'>
+            <strong>📋 Report Contents:</strong>
+            <ul style='margin: 0.5rem 0 0 1.5rem;'>
+                <li><strong>Aggregate Summary:</strong> Totals across all measurement files</li>
+                <li><strong>Per-File Summary:</strong> One row per measurement file</li>
+                <li><strong>Missing (All Files):</strong> Master serials not found in any file</li>
+                <li><strong>F1 Missing / F1 Extra ...:</strong> Detailed analysis per file</li>
+            </ul>
+        </div>
+    """, unsafe_allow_html=True)
 
-            # ดึง serials
-            serials = set(
-                clean_serial(serial)
-                for serial in df.iloc[:, serial_col_idx].dropna().astype(str)
-                if clean_serial(serial) and len(clean_serial(serial)) >= 8
+    st.markdown("---")
+    status = result_status(aggregate)
+    if status == 'PASS':
+        st.success("✅ **PASS:** Every master slider was found in at least one measurement file!")
+    elif status == 'CRITICAL':
+        st.error(f"🚨 **CRITICAL:** {aggregate['missing_count']} slider(s) missing from all files, "
+                 f"including likely typos - check the Missing (All Files) sheet!")
+    else:
+        st.warning(f"⚠️ **WARNING:** {aggregate['missing_count']} slider(s) missing from all files.")
+
+
+def render_diagnostics(comparison):
+    """แสดงเวลา/CPU/rows/memory ของแต่ละ stage และ download cProfile ของ fuzzy matching"""
+    diagnostics = comparison.get('diagnostics')
+    if not diagnostics:
+        return
+
+    with st.expander(f"🩺 Diagnostics - run {diagnostics['run_id']} "
+                     f"({diagnostics['total_seconds']:.2f}s total)"):
+        stages_df = pd.DataFrame([
+            {
+                'Stage': '\u00a0\u00a0' * stage['depth'] + ('↳ ' if stage['depth'] else '') + stage['stage'],
+                'Detail': stage['detail'],
+                'Rows': stage['rows'],
+                'Wall (s)': stage['wall_s'],
+                'CPU (s)': stage['cpu_s'],
+                'Peak Memory (MB)': stage['peak_mb'],
+                'Rows/s': round(stage['rows'] / stage['wall_s']) if stage['wall_s'] > 0 else None
+            }
+            for stage in diagnostics['stages']
+        ])
+        st.dataframe(stages_df, use_container_width=True, hide_index=True)
+        st.caption("CPU time counts the main thread only - fuzzy matching in worker processes shows as "
+                   "wall time. " + ("" if diagnostics['memory_traced'] else
+                                    "Enable 'Track peak memory' in the sidebar to measure memory."))
+
+        if comparison.get('profile_data'):
+            st.download_button(
+                label="📥 Download fuzzy matching profile (.prof)",
+                data=comparison['profile_data'],
+                file_name=f"fuzzy_profile_{comparison['timestamp']}.prof",
+                mime="application/octet-stream",
+                help="Open with: python -m pstats file.prof (or snakeviz)"
             )
 
-            st.success(f"✅ Found {len(serials)} valid serials from column '{serial_col_name}'")
 
-            return serials, f"Excel - Column: {serial_col_name}"
+def render_job(registry, job):
+    """สถานะของ background job ที่กำลังรอคิว/รันอยู่: stage, progress, ข้อความ และปุ่มยกเลิก"""
+    snapshot = job.snapshot()
+
+    st.markdown("### ⏳ Comparison Running in Background")
+    st.caption(f"{snapshot['label']} - job {snapshot['id']} - you can keep using this page; "
+               f"results appear here when the job finishes.")
 
+    if snapshot['cancel_requested']:
+        st.warning("⏹️ Cancelling - stopping at the next checkpoint...")
+    elif snapshot['status'] == JOB_QUEUED:
+        jobs = registry.stats()
+        st.info(f"🕒 Queued - {registry.queue_position(job)} job(s) ahead, "
+                f"{jobs['running']}/{jobs['workers']} worker(s) busy")
+    else:
+        stage = snapshot['stage']
+        stage_text = STAGE_LABELS.get(stage[0], stage[0]) if stage else "🔄 Processing"
+        if stage and stage[1]:
+            stage_text += f" - {stage[1]}"
+        progress = snapshot['progress']
+        if progress and progress[2]:
+            label, done, total = progress
+            st.progress(done / total, text=f"{stage_text}: {label} {done:,}/{total:,} "
+                                           f"({done / total * 100:.0f}%)")
         else:
-            st.error(f"❌ Unsupported file format: {file_ext}")
-            return set(), "Unknown"
+            st.progress(0, text=stage_text)
+        st.caption(f"⏱️ {snapshot['elapsed']:.0f}s elapsed")
+
+    if snapshot['messages']:
+        with st.expander("📋 Processing log"):
+            replay(snapshot['messages'], StreamlitReporter())
+
+    if not snapshot['cancel_requested']:
+        if st.button("⏹️ Cancel comparison", key='cancel_job'):
+            job.cancel()
+            st.rerun()
+
+
+def finish_job(registry, job, key):
+    """รับผลของ job ที่จบแล้วเข้า session - คืนค่า True ถ้าเปรียบเทียบสำเร็จ"""
+    registry.pop(job.id)
+    st.session_state.pop('job', None)
+    succeeded = job.status == JOB_DONE
+
+    if succeeded:
+        comparison = job.result
+        st.session_state['incremental'] = comparison.pop('incremental', None)
+        comparison['key'] = key
+        st.session_state['comparison'] = comparison
+        st.success(f"✅ Comparison finished in {job.elapsed():.1f}s")
+    else:
+        # สถานะ incremental อาจ update ไม่ครบ - ครั้งหน้าเปรียบเทียบใหม่ทั้งหมด
+        st.session_state.pop('incremental', None)
+        if job.status == JOB_CANCELLED:
+            st.warning(f"⏹️ Comparison cancelled after {job.elapsed():.1f}s.")
+        else:
+            st.error(f"❌ **Error during comparison:** {str(job.error)}")
+            st.exception(job.error)
 
-    except Exception as e:
-        st.error(f"❌ Error reading master file: {str(e)}")
-        st.exception(e)
-        return set(), "Error"
+    messages = job.snapshot()['messages']
+    if messages:
+        with st.expander("📋 Processing log", expanded=not succeeded):
+            replay(messages, StreamlitReporter())
+    return succeeded
 
 
-def read_measurement_file(uploaded_file):
-    """อ่าน Measurement file (CSV/Excel)"""
-    file_ext = Path(uploaded_file.name).suffix.lower()
+def comparison_key(master_file, measurement_files, fuzzy_mode, top_k=FUZZY_TOP_K, diagnostics=()):
+    """Key ของ input ชุดหนึ่ง - ใช้ตรวจว่าผลใน session ยังตรงกับไฟล์/ตั้งค่าปัจจุบัน"""
+    return (upload_digest(master_file), tuple(upload_digest(f) for f in measurement_files), fuzzy_mode,
+            top_k, tuple(diagnostics))
 
-    st.write(f"📊 **Reading Measurement File:** {uploaded_file.name}")
 
-    try:
-        if file_ext == '.csv':
-            # อ่าน CSV
-            df = pd.read_csv(uploaded_file, encoding='utf-8-sig')
-            st.write(f"  - Shape: {df.shape[0]} rows × {df.shape[1]} columns")
-            st.write(f"  - Columns: {', '.join(map(str, df.columns.tolist()))}")
-
-        elif file_ext in ['.xlsx', '.xls']:
-            # อ่าน Excel
-            df = pd.read_excel(uploaded_file)
-            st.write(f"  - Shape: {df.shape[0]} rows × {df.shape[1]} columns")
-            st.write(f"  - Columns: {', '.join(map(str, df.columns.tolist()))}")
+def result_cache_key(master_file, measurement_files, fuzzy_mode, top_k=FUZZY_TOP_K):
+    """Key ของ result cache - hash ของเนื้อหาไฟล์ + โหมด/threshold/parser ที่มีผลต่อผลลัพธ์"""
+    return (upload_digest(master_file), tuple(upload_digest(f) for f in measurement_files), fuzzy_mode,
+            top_k, SIMILAR_CUTOFF, POTENTIAL_MATCH_CUTOFF, PARSER_OPTIONS)
 
-        else:
-            st.error(f"❌ Unsupported file format: {file_ext}")
-            return set(), "Unknown"
 
-        # ตรวจจับ serial column
-        serial_col_idx, serial_col_name = detect_serial_column(df)
+def attach_cached_result(master_file, measurement_files, fuzzy_mode, top_k, input_key):
+    """ใช้ผลจาก result cache ถ้ามีคนเปรียบเทียบไฟล์ชุดเดียวกันด้วยตั้งค่าเดียวกันไว้แล้ว - คืนค่า True ถ้าเจอ"""
+    cached = get_result_cache().get(result_cache_key(master_file, measurement_files, fuzzy_mode, top_k))
+    if cached is None:
+        return False
+    st.session_state['comparison'] = {**cached, 'key': input_key}
+    st.info(f"⚡ Same files and settings were compared by {cached['compared_by'] or 'another user'} "
+            f"at {cached['compared_at']} - showing the shared result from the server cache.")
+    return True
+
+
+def render_admin_panel():
+    """สถิติของ cache และ background job ทั้ง server - แสดงเฉพาะ admin"""
+    st.markdown("### 🛠️ Server Status (admin)")
+
+    result_stats = get_result_cache().stats()
+    lookups = result_stats['hits'] + result_stats['misses']
+    st.markdown(
+        f"**Result cache:** {result_stats['entries']} result(s), "
+        f"{result_stats['weight'] / 1024 / 1024:,.1f} / {result_stats['max_weight'] / 1024 / 1024:,.0f} MB  \n"
+        f"Hits {result_stats['hits']} / misses {result_stats['misses']}"
+        + (f" ({result_stats['hits'] / lookups * 100:.0f}% hit rate)" if lookups else "")
+        + f", {result_stats['evictions']} evicted"
+    )
+    parse_stats = get_parse_cache().stats()
+    st.markdown(f"**Parse cache:** {parse_stats['entries']} file(s), {parse_stats['weight']:,} serials, "
+                f"{parse_stats['hits']} hits / {parse_stats['misses']} misses")
+
+    registry = get_job_registry()
+    jobs = registry.stats()
+    st.markdown(f"**Jobs:** {jobs['running']}/{jobs['workers']} running, {jobs['queued']} queued, "
+                f"{jobs['finished']} finished (not yet collected)")
+    snapshots = [job.snapshot() for job in registry.list()]
+    if snapshots:
+        st.dataframe(pd.DataFrame([
+            {'User': s['owner'], 'Comparison': s['label'], 'Status': s['status'], 'Seconds': round(s['elapsed'])}
+            for s in snapshots
+        ]), use_container_width=True, hide_index=True)
+
+    if st.button("🗑️ Clear result cache", key='clear_result_cache'):
+        get_result_cache().clear()
+        st.success("✅ Result cache cleared")
+
+
+def is_admin():
+    """ผู้ใช้ที่อยู่ใน secrets "admins" (ไม่กำหนด = user ชื่อ admin) เห็นสถิติ cache/job ของ server"""
+    return st.session_state.get('user') in st.secrets.get('admins', ['admin'])
 
-        # ดึง serials
-        serials = set(
-            clean_serial(serial)
-            for serial in df.iloc[:, serial_col_idx].dropna().astype(str)
-            if clean_serial(serial) and len(clean_serial(serial)) >= 8
-        )
 
-        st.success(f"✅ Found {len(serials)} valid serials from column '{serial_col_name}'")
-
-        return serials, f"Column: {serial_col_name}"
-
-    except Exception as e:
-        st.error(f"❌ Error reading measurement file: {str(e)}")
-        st.exception(e)
-        return set(), "Error"
-
-
-def create_excel_report(result, master_filename, measurement_filename):
-    """สร้าง Excel report แบบละเอียด"""
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # ===== Sheet 1: Summary =====
-        potential_typos = len([d for d in result.get('missing_details', []) if d['similarity'] >= 80])
-
-        summary_data = {
-            'Metric': [
-                'Report Generated',
-                'Master File',
-                'Measurement File',
-                'Master Source',
-                'Measurement Source',
-                'Comparison Method',
-                '',
-                'Total Master Sliders',
-                'Total Measurement Sliders',
-                'Matched Sliders',
-                'Match Percentage',
-                'Missing Sliders',
-                'Extra Sliders',
-                '',
-                '🚨 Potential Typos (≥80% similar)',
-                '⚠️ Need Review (50-79% similar)',
-                '❌ Not Found (<50% similar)',
-                '',
-                'Status'
-            ],
-            'Value': [
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                master_filename,
-                measurement_filename,
-                result.get('master_source', 'N/A'),
-                result.get('measurement_source', 'N/A'),
-                'First 10 characters + Fuzzy Matching (difflib)',
-                '',
-                result['total_master'],
-                result['total_measurement'],
-                result['matched_count'],
-                f"{result['match_percentage']}%",
-                result['missing_count'],
-                result['extra_count'],
-                '',
-                potential_typos,
-                len([d for d in result.get('missing_details', []) if 50 <= d['similarity'] < 80]),
-                len([d for d in result.get('missing_details', []) if d['similarity'] < 50]),
-                '',
-                '🚨 CRITICAL - Check Potential Typos!' if potential_typos > 0 else
-                '⚠️ WARNING - Missing items found' if result['missing_count'] > 0 else
-                '✅ PASS - All matched'
-            ]
-        }
-        df_summary = pd.DataFrame(summary_data)
-        df_summary.to_excel(writer, sheet_name='Summary', index=False)
-
-        # Auto-adjust column widths
-        worksheet = writer.sheets['Summary']
-        worksheet.column_dimensions['A'].width = 35
-        worksheet.column_dimensions['B'].width = 50
-
-        # ===== Sheet 2: Missing (Detailed) =====
-        if result.get('missing_details'):
-            missing_data = []
-            for i, detail in enumerate(result['missing_details'], 1):
-                action = ''
-                priority = ''
-
-                if detail['similarity'] >= 80:
-                    action = '🚨 URGENT: Verify immediately - likely a typo'
-                    priority = 'HIGH'
-                elif detail['similarity'] >= 50:
-                    action = '⚠️ CHECK: Similar serial exists in CSV'
-                    priority = 'MEDIUM'
-                else:
-                    action = '❌ NOT FOUND in CSV file'
-                    priority = 'LOW'
-
-                missing_data.append({
-                    'No.': i,
-                    'Priority': priority,
-                    'Master Serial (Text File)': detail['master_serial'],
-                    'Closest Match in CSV': detail['closest_csv'],
-                    'Similarity %': detail['similarity'],
-                    'Visual Pattern': detail['diff_pattern'],
-                    'Character Differences': detail.get('char_differences', ''),
-                    'Status': detail['status'],
-                    '⚠️ Action Required': action
-                })
-
-            df_missing = pd.DataFrame(missing_data)
-            df_missing.to_excel(writer, sheet_name='Missing (Detailed)', index=False)
-
-            # Auto-adjust column widths
-            worksheet = writer.sheets['Missing (Detailed)']
-            for idx, col in enumerate(df_missing.columns):
-                max_length = max(
-                    df_missing[col].astype(str).map(len).max(),
-                    len(str(col))
-                )
-                worksheet.column_dimensions[chr(65 + idx)].width = min(max_length + 2, 50)
-
-        # ===== Sheet 3: Extra (Detailed) =====
-        if result.get('extra_details'):
-            extra_data = []
-            for i, detail in enumerate(result['extra_details'], 1):
-                action = ''
-
-                if detail['similarity'] >= 80:
-                    action = '🚨 CHECK: Very similar to Master - might be misplaced'
-                elif detail['similarity'] >= 50:
-                    action = '⚠️ REVIEW: Similar serial exists in Master'
-                else:
-                    action = '➕ NEW: Not found in Master file'
-
-                extra_data.append({
-                    'No.': i,
-                    'CSV Serial (Measurement)': detail['csv_serial'],
-                    'Closest Match in Master': detail['closest_master'],
-                    'Similarity %': detail['similarity'],
-                    'Visual Pattern': detail['diff_pattern'],
-                    'Character Differences': detail.get('char_differences', ''),
-                    'Status': detail['status'],
-                    '⚠️ Action Required': action
-                })
-
-            df_extra = pd.DataFrame(extra_data)
-            df_extra.to_excel(writer, sheet_name='Extra (Detailed)', index=False)
-
-            # Auto-adjust column widths
-            worksheet = writer.sheets['Extra (Detailed)']
-            for idx, col in enumerate(df_extra.columns):
-                max_length = max(
-                    df_extra[col].astype(str).map(len).max(),
-                    len(str(col))
-                )
-                worksheet.column_dimensions[chr(65 + idx)].width = min(max_length + 2, 50)
-
-        # ===== Sheet 4: 🚨 URGENT - Potential Typos =====
-        potential_typos_list = [d for d in result.get('missing_details', []) if d['similarity'] >= 80]
-        if potential_typos_list:
-            typo_data = []
-            for i, detail in enumerate(potential_typos_list, 1):
-                # Visual comparison
-                master_serial = detail['master_serial']
-                csv_serial = detail['closest_csv']
-                pattern = detail['diff_pattern']
-
-                visual = f"{master_serial}\n{csv_serial}\n{pattern}"
-
-                typo_data.append({
-                    'Priority': i,
-                    '⚠️ Master Serial (Text)': master_serial,
-                    '📊 CSV Serial (Closest)': csv_serial,
-                    'Match %': detail['similarity'],
-                    'Visual Comparison': visual,
-                    'Exact Differences': detail.get('char_differences', ''),
-                    '🚨 Action': '🔍 URGENT: Verify this mismatch immediately',
-                    'Recommendation': 'Likely a typo or data entry error - High priority to fix'
-                })
-
-            df_typos = pd.DataFrame(typo_data)
-            df_typos.to_excel(writer, sheet_name='🚨 URGENT - Potential Typos', index=False)
-
-            # Format urgent sheet
-            worksheet = writer.sheets['🚨 URGENT - Potential Typos']
-            for idx, col in enumerate(df_typos.columns):
-                max_length = max(
-                    df_typos[col].astype(str).map(len).max(),
-                    len(str(col))
-                )
-                worksheet.column_dimensions[chr(65 + idx)].width = min(max_length + 2, 60)
-
-            # Set row height for visual comparison
-            for row in range(2, len(df_typos) + 2):
-                worksheet.row_dimensions[row].height = 45
-
-        # ===== Sheet 5: Missing (Simple List) =====
-        if result.get('missing_serials'):
-            df_missing_simple = pd.DataFrame({
-                'No.': range(1, len(result['missing_serials']) + 1),
-                'Serial Number (Missing from CSV)': sorted(result['missing_serials'])
-            })
-            df_missing_simple.to_excel(writer, sheet_name='Missing (Simple List)', index=False)
-
-        # ===== Sheet 6: Extra (Simple List) =====
-        if result.get('extra_serials'):
-            df_extra_simple = pd.DataFrame({
-                'No.': range(1, len(result['extra_serials']) + 1),
-                'Serial Number (Extra in CSV)': sorted(result['extra_serials'])
-            })
-            df_extra_simple.to_excel(writer, sheet_name='Extra (Simple List)', index=False)
-
-    output.seek(0)
-    return output
 def check_password():
     """Returns `True` if user had correct password."""
 
     def password_entered():
         """Checks whether password entered is correct."""
-        if st.session_state["password"] in st.secrets["passwords"].values():
+        # จำชื่อ user ของ password ที่ตรง (ใช้กับสิทธิ์ admin และบันทึกว่าใครเป็นคนเปรียบเทียบ)
+        users = [user for user, password in st.secrets["passwords"].items()
+                 if password == st.session_state["password"]]
+        if users:
             st.session_state["password_correct"] = True
+            st.session_state["user"] = users[0]
             del st.session_state["password"]  # Don't store password
         else:
             st.session_state["password_correct"] = False
@@ -571,9 +1121,11 @@ def main():
         1. **Upload Master File**
            - Text: One serial per line
            - CSV/Excel: Auto-detect serial column
+           - Or pick a saved master (no parsing)
 
-        2. **Upload Measurement File**
+        2. **Upload Measurement File(s)**
            - CSV/Excel: Auto-detect serial column
+           - Several files: compared against one master
 
         3. **Click Compare Data**
 
@@ -611,310 +1163,191 @@ def main():
         - Or pattern-based detection
         """)
 
+        st.markdown("---")
+        st.markdown("### ⚙️ Matching Settings")
+        fuzzy_mode = st.radio(
+            "Fuzzy matching mode",
+            options=[MODE_EXACT, MODE_FAST, MODE_EDIT],
+            format_func=lambda m: {
+                MODE_EXACT: "Exact (same results as difflib)",
+                MODE_FAST: "Fast (shortlist, approximate)",
+                MODE_EDIT: "Edit distance (insert/delete aware)"
+            }[m],
+            help="Exact: indexed search that returns the same closest match as difflib. "
+                 "Fast: only checks the most promising candidates. "
+                 "Edit distance: similarity = 1 - edits / total length (same 50%/80% thresholds); "
+                 "the diff pattern follows the alignment, so an inserted or missing character is one ✗."
+        )
+        top_k = st.number_input(
+            "Candidates per unmatched serial",
+            min_value=1,
+            max_value=5,
+            value=FUZZY_TOP_K,
+            help="The closest match plus up to this many alternatives in total, found in the same search. "
+                 "Useful when two serials are equally close."
+        )
+        cpu_count = os.cpu_count() or 1
+        workers = st.number_input(
+            "Fuzzy matching worker processes",
+            min_value=1,
+            max_value=cpu_count,
+            value=cpu_count,
+            help="Missing/extra serials are analyzed in batches on this many CPU cores."
+        )
+        incremental_mode = st.checkbox(
+            "♻️ Incremental update for appended CSV rows",
+            value=True,
+            help="When the measurement CSV is the last compared file with new rows added at the end, "
+                 "only the new rows are read and analyzed."
+        )
+
+        st.markdown("---")
+        st.markdown("### 🩺 Diagnostics")
+        show_diagnostics = st.checkbox("Show per-stage timing panel", value=False)
+        trace_memory = st.checkbox(
+            "Track peak memory per stage",
+            value=False,
+            help="Uses tracemalloc - the comparison runs noticeably slower while tracking."
+        )
+        profile_fuzzy = st.checkbox(
+            "Profile fuzzy matching (cProfile)",
+            value=False,
+            help="Captures a downloadable profile of the fuzzy stages. Set worker processes to 1 "
+                 "to profile the matching itself instead of the process pool."
+        )
+        diagnostics_options = (trace_memory, profile_fuzzy)
+
+        if is_admin():
+            st.markdown("---")
+            render_admin_panel()
+
     # Main content
     col1, col2 = st.columns(2)
 
     with col1:
         st.markdown("### 📄 Master File (Reference)")
-        master_file = st.file_uploader(
-            "Upload Master File",
-            type=['txt', 'csv', 'xlsx', 'xls'],
-            key='master',
-            help="Text file (one serial per line) or CSV/Excel"
-        )
-        if master_file:
-            st.success(f"✅ {master_file.name}")
-            st.caption(f"Size: {master_file.size:,} bytes")
+        master_input = st.radio("Master source", ["📤 Upload file", "💾 Saved master"], horizontal=True,
+                                key='master_input', label_visibility='collapsed')
+
+        if master_input == "💾 Saved master":
+            saved_masters = get_master_store().list()
+            master_file = st.selectbox(
+                "Saved master",
+                saved_masters,
+                format_func=StoredMaster.label,
+                key='saved_master',
+                help="Masters saved with 'Save as reusable master' - loaded without parsing"
+            )
+            if master_file:
+                st.success(f"✅ {master_file.name}")
+                st.caption(f"{master_file.count:,} serials - {master_file.source}")
+            else:
+                st.info("ℹ️ No saved masters yet - upload a master and click 'Save as reusable master'.")
+        else:
+            master_file = st.file_uploader(
+                "Upload Master File",
+                type=upload_types(MASTER_EXTENSIONS),
+                key='master',
+                help=f"Text file (one serial per line), CSV/Excel, or Parquet/Arrow - "
+                     f"{'/'.join(compressed_extensions())} compressed files are decompressed while reading"
+            )
+            if master_file:
+                st.success(f"✅ {master_file.name}")
+                st.caption(f"Size: {master_file.size:,} bytes")
+                # .zip: เลือกไฟล์ข้างในที่ใช้เป็น master
+                master_file = next(iter(archive_selection(master_file, MASTER_EXTENSIONS, 'master_member')), None)
+            if master_file:
+                render_save_master(master_file)
 
     with col2:
         st.markdown("### 📊 Measurement File (To Compare)")
-        measurement_file = st.file_uploader(
-            "Upload Measurement File",
-            type=['csv', 'xlsx', 'xls'],
+        uploaded_measurements = st.file_uploader(
+            "Upload Measurement File(s)",
+            type=upload_types(MEASUREMENT_EXTENSIONS),
             key='measurement',
-            help="CSV or Excel file with measurement data"
+            accept_multiple_files=True,
+            help=f"CSV, Excel or Parquet/Arrow file with measurement data ({'/'.join(compressed_extensions())} "
+                 f"compressed is fine) - select several files, or several files in a .zip, to compare them all "
+                 f"against the same master"
         )
-        if measurement_file:
+        measurement_files = []
+        for measurement_file in uploaded_measurements:
             st.success(f"✅ {measurement_file.name}")
             st.caption(f"Size: {measurement_file.size:,} bytes")
+            # .zip: ทุกไฟล์ที่เลือกใน archive เป็น measurement file แยกกัน
+            measurement_files += archive_selection(measurement_file, MEASUREMENT_EXTENSIONS, 'measurement_member',
+                                                   multiple=True)
 
     st.markdown("---")
 
+    # การเปรียบเทียบรันเป็น background job - session เก็บแค่ job id แล้ว poll สถานะทุก rerun
+    registry = get_job_registry()
+    job_state = st.session_state.get('job')
+    job = registry.get(job_state['id']) if job_state else None
+    if job_state and job is None:
+        # server restart หรือ job หมดอายุ (retention) ก่อนมารับผล
+        st.session_state.pop('job', None)
+        st.warning("⚠️ The background comparison is no longer available - click Compare to run it again.")
+
     # Compare button
-    if st.button("🔍 Compare Data with Fuzzy Matching", type="primary", use_container_width=True):
-        if not master_file or not measurement_file:
+    if st.button("🔍 Compare Data with Fuzzy Matching", type="primary", use_container_width=True,
+                 disabled=job is not None and not job.finished):
+        if not master_file or not measurement_files:
             st.error("❌ Please upload both files!")
             return
 
-        try:
-            with st.spinner("🔄 Processing data... Please wait..."):
-
-                # Read Master file
-                st.markdown("### 📂 File Processing")
-
-                with st.expander("📄 Master File Analysis", expanded=True):
-                    master_serials, master_source = read_master_file(master_file)
-
-                with st.expander("📊 Measurement File Analysis", expanded=True):
-                    measurement_serials, measurement_source = read_measurement_file(measurement_file)
-
-                if not master_serials or not measurement_serials:
-                    st.error("❌ Failed to read files or no valid serials found.")
-                    return
-
-                st.markdown("---")
-                st.markdown("### 🔄 Comparison Analysis")
-
-                # Compare
-                missing_sliders = master_serials - measurement_serials
-                extra_sliders = measurement_serials - master_serials
-                matched_sliders = master_serials & measurement_serials
-
-                st.write(f"✅ Matched: {len(matched_sliders)} serials")
-                st.write(f"❌ Missing (in Master but not in CSV): {len(missing_sliders)} serials")
-                st.write(f"➕ Extra (in CSV but not in Master): {len(extra_sliders)} serials")
-
-                # Analyze missing sliders
-                with st.spinner("🔍 Analyzing missing serials with fuzzy matching..."):
-                    missing_details = []
-                    measurement_list = list(measurement_serials)
-
-                    progress_bar = st.progress(0)
-                    for idx, missing_serial in enumerate(sorted(missing_sliders)):
-                        closest_match, similarity = find_closest_match(missing_serial, measurement_list, cutoff=0.5)
-
-                        if closest_match and similarity >= 0.5:
-                            diff_pattern = highlight_diff(missing_serial, closest_match)
-                            char_diff = get_char_differences(missing_serial, closest_match)
-                            missing_details.append({
-                                'master_serial': missing_serial,
-                                'closest_csv': closest_match,
-                                'similarity': round(similarity * 100, 1),
-                                'diff_pattern': diff_pattern,
-                                'char_differences': char_diff,
-                                'status': 'POTENTIAL_MATCH' if similarity >= 0.8 else 'SIMILAR'
-                            })
-                        else:
-                            missing_details.append({
-                                'master_serial': missing_serial,
-                                'closest_csv': 'NOT_FOUND',
-                                'similarity': 0.0,
-                                'diff_pattern': '',
-                                'char_differences': '',
-                                'status': 'MISSING'
-                            })
-
-                        # Update progress
-                        progress_bar.progress((idx + 1) / len(missing_sliders))
-
-                    progress_bar.empty()
-
-                # Analyze extra sliders
-                with st.spinner("🔍 Analyzing extra serials..."):
-                    extra_details = []
-                    master_list = list(master_serials)
-
-                    for extra_serial in sorted(extra_sliders):
-                        closest_match, similarity = find_closest_match(extra_serial, master_list, cutoff=0.5)
-
-                        if closest_match and similarity >= 0.5:
-                            diff_pattern = highlight_diff(extra_serial, closest_match)
-                            char_diff = get_char_differences(extra_serial, closest_match)
-                            extra_details.append({
-                                'csv_serial': extra_serial,
-                                'closest_master': closest_match,
-                                'similarity': round(similarity * 100, 1),
-                                'diff_pattern': diff_pattern,
-                                'char_differences': char_diff,
-                                'status': 'POTENTIAL_MATCH' if similarity >= 0.8 else 'SIMILAR'
-                            })
-                        else:
-                            extra_details.append({
-                                'csv_serial': extra_serial,
-                                'closest_master': 'NOT_FOUND',
-                                'similarity': 0.0,
-                                'diff_pattern': '',
-                                'char_differences': '',
-                                'status': 'EXTRA'
-                            })
-
-                # Results
-                result = {
-                    'total_master': len(master_serials),
-                    'total_measurement': len(measurement_serials),
-                    'matched_count': len(matched_sliders),
-                    'missing_count': len(missing_sliders),
-                    'extra_count': len(extra_sliders),
-                    'missing_serials': list(missing_sliders),
-                    'extra_serials': list(extra_sliders),
-                    'missing_details': missing_details,
-                    'extra_details': extra_details,
-                    'master_source': master_source,
-                    'measurement_source': measurement_source,
-                    'match_percentage': round((len(matched_sliders) / len(master_serials) * 100),
-                                              2) if master_serials else 0
-                }
-
-            # Display results
-            st.markdown("---")
-            st.markdown("## 📊 Comparison Results")
-
-            # Metrics
-            col1, col2, col3, col4, col5 = st.columns(5)
-
-            with col1:
-                st.metric("📄 Total Master", result['total_master'])
-            with col2:
-                st.metric("📊 Total Measurement", result['total_measurement'])
-            with col3:
-                st.metric("✅ Matched", result['matched_count'],
-                          delta=f"{result['match_percentage']}%")
-            with col4:
-                st.metric("❌ Missing", result['missing_count'],
-                          delta="⚠️ Check" if result['missing_count'] > 0 else "✅ OK",
-                          delta_color="inverse")
-            with col5:
-                st.metric("➕ Extra", result['extra_count'])
-
-            # Potential typos alert
-            potential_typos = [d for d in missing_details if d['similarity'] >= 80]
-            if potential_typos:
-                st.markdown("""
-                    <div class='urgent-box'>
-                        <h3 style='margin: 0; color: #856404;'>🚨 URGENT: Potential Typos Detected!</h3>
-                        <p style='margin: 0.5rem 0 0 0;'>
-                            Found <strong>{}</strong> serial(s) with ≥80% similarity. 
-                            These are <strong>likely data entry errors</strong> that need immediate attention!
-                        </p>
-                    </div>
-                """.format(len(potential_typos)), unsafe_allow_html=True)
-
-                st.markdown("#### 🚨 Potential Typos (High Priority)")
-                typo_df = pd.DataFrame([
-                    {
-                        '📄 Master Serial (Text)': d['master_serial'],
-                        '📊 CSV Serial (Closest)': d['closest_csv'],
-                        'Match %': f"{d['similarity']}%",
-                        'Pattern': d['diff_pattern'],
-                        'Differences': d['char_differences']
-                    }
-                    for d in potential_typos
-                ])
-                st.dataframe(typo_df, use_container_width=True, height=min(len(potential_typos) * 35 + 38, 400))
-
-            elif result['missing_count'] == 0:
-                st.markdown("""
-                    <div class='success-box'>
-                        <h3 style='margin: 0; color: #155724;'>✅ Perfect Match!</h3>
-                        <p style='margin: 0.5rem 0 0 0;'>
-                            All serials from Master file were found in Measurement file.
-                        </p>
-                    </div>
-                """, unsafe_allow_html=True)
-
-            # Missing sliders (show first 50)
-            if missing_details and result['missing_count'] > 0:
-                st.markdown("---")
-                st.markdown("#### ❌ Missing Serials (In Master but NOT in CSV)")
-
-                # Group by status
-                high_priority = [d for d in missing_details if d['similarity'] >= 80]
-                medium_priority = [d for d in missing_details if 50 <= d['similarity'] < 80]
-                not_found = [d for d in missing_details if d['similarity'] < 50]
-
-                st.write(f"- 🚨 **High Priority (≥80% similar):** {len(high_priority)} items")
-                st.write(f"- ⚠️ **Medium Priority (50-79% similar):** {len(medium_priority)} items")
-                st.write(f"- ❌ **Not Found (<50% similar):** {len(not_found)} items")
-
-                display_limit = st.slider("Show first N items:", 10, min(len(missing_details), 100), 50, 10)
-
-                missing_df = pd.DataFrame([
-                    {
-                        '📄 Master Serial': d['master_serial'],
-                        '📊 Closest in CSV': d['closest_csv'],
-                        'Match %': f"{d['similarity']}%",
-                        'Status': d['status'],
-                        'Differences': d.get('char_differences', '')[:50] + '...' if len(
-                            d.get('char_differences', '')) > 50 else d.get('char_differences', '')
-                    }
-                    for d in missing_details[:display_limit]
-                ])
-                st.dataframe(missing_df, use_container_width=True, height=400)
-
-                if len(missing_details) > display_limit:
-                    st.info(
-                        f"ℹ️ Showing {display_limit} of {len(missing_details)} missing items. Download Excel for complete list.")
-
-            # Extra sliders (show first 50)
-            if extra_details and result['extra_count'] > 0:
-                st.markdown("---")
-                st.markdown("#### ➕ Extra Serials (In CSV but NOT in Master)")
-
-                display_limit = min(50, len(extra_details))
-
-                extra_df = pd.DataFrame([
-                    {
-                        '📊 CSV Serial': d['csv_serial'],
-                        '📄 Closest in Master': d['closest_master'],
-                        'Match %': f"{d['similarity']}%",
-                        'Status': d['status']
-                    }
-                    for d in extra_details[:display_limit]
-                ])
-                st.dataframe(extra_df, use_container_width=True, height=400)
-
-                if len(extra_details) > display_limit:
-                    st.info(
-                        f"ℹ️ Showing first {display_limit} of {len(extra_details)} extra items. Download Excel for complete list.")
-
-            # Download button
-            st.markdown("---")
-            st.markdown("### 📥 Download Report")
-
-            with st.spinner("📝 Generating detailed Excel report..."):
-                excel_data = create_excel_report(result, master_file.name, measurement_file.name)
-
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-
-            col1, col2, col3 = st.columns([1, 2, 1])
-
-            with col2:
-                st.download_button(
-                    label="📥 Download Detailed Excel Report (6 Sheets)",
-                    data=excel_data,
-                    file_name=f"slider_comparison_report_{timestamp}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    type="primary",
-                    use_container_width=True
-                )
-
-            st.markdown("""
-                <div style='background: #e7f3ff; padding: 1rem; border-radius: 0.5rem; border-left: 4px solid #2196F3;'>
-                    <strong>📋 Report Contents:</strong>
-                    <ul style='margin: 0.5rem 0 0 1.5rem;'>
-                        <li><strong>Summary:</strong> Overview & statistics</li>
-                        <li><strong>Missing (Detailed):</strong> Side-by-side comparison with closest matches</li>
-                        <li><strong>Extra (Detailed):</strong> Extra serials analysis</li>
-                        <li><strong>🚨 URGENT - Potential Typos:</strong> High-priority items (≥80% match)</li>
-                        <li><strong>Missing (Simple List):</strong> Quick reference list</li>
-                        <li><strong>Extra (Simple List):</strong> Quick reference list</li>
-                    </ul>
-                </div>
-            """, unsafe_allow_html=True)
-
-            # Summary message
-            st.markdown("---")
-            if result['missing_count'] == 0:
-                st.success("✅ **PASS:** All sliders matched successfully!")
-            elif potential_typos:
-                st.error(
-                    f"🚨 **CRITICAL:** {result['missing_count']} missing slider(s) detected. **{len(potential_typos)} likely typo(s)** require immediate attention!")
-            else:
-                st.warning(f"⚠️ **WARNING:** {result['missing_count']} missing slider(s) detected.")
+        input_key = comparison_key(master_file, measurement_files, fuzzy_mode, top_k, diagnostics_options)
+        stored = st.session_state.get('comparison')
+
+        if stored is not None and stored['key'] == input_key:
+            st.info("⚡ Same files and settings as the last comparison - showing stored results.")
+        # ไม่เจอใน result cache ก็ส่งเป็น job ใหม่ (run ที่วัด memory/profile ต้องคำนวณจริง - ไม่ใช้ cache)
+        elif trace_memory or profile_fuzzy or not attach_cached_result(master_file, measurement_files,
+                                                                       fuzzy_mode, top_k, input_key):
+            stats = PipelineStats(
+                label=f"{master_file.name} vs {', '.join(f.name for f in measurement_files)}",
+                trace_memory=trace_memory, profile_fuzzy=profile_fuzzy
+            )
+            incremental = None
+            if incremental_mode and len(measurement_files) == 1:
+                incremental = appendable_state(master_file, measurement_files[0], fuzzy_mode, top_k)
+                if incremental is not None:
+                    st.info("♻️ Measurement file has new rows since the last comparison - "
+                            "processing appended rows only.")
+
+            job = registry.submit(
+                comparison_job(master_file, measurement_files, fuzzy_mode, workers, incremental, top_k,
+                               st.session_state.get('user')),
+                label=stats.label, owner=st.session_state.get('user'), stats=stats
+            )
+            job_state = {'id': job.id, 'key': input_key}
+            st.session_state['job'] = job_state
 
-        except Exception as e:
-            st.error(f"❌ **Error during comparison:** {str(e)}")
-            st.exception(e)
+    polling = False
+    if job is not None:
+        if job.finished:
+            finish_job(registry, job, job_state['key'])
+        else:
+            render_job(registry, job)
+            polling = True
+
+    # แสดงผลจาก session state - การขยับ widget จะ render ใหม่โดยไม่คำนวณซ้ำ
+    comparison = st.session_state.get('comparison')
+    if comparison is not None and master_file and measurement_files:
+        if comparison['key'] == comparison_key(master_file, measurement_files, fuzzy_mode, top_k,
+                                               diagnostics_options):
+            try:
+                if comparison.get('multi'):
+                    render_multi_results(comparison)
+                else:
+                    render_results(comparison)
+                if show_diagnostics:
+                    render_diagnostics(comparison)
+            except Exception as e:
+                st.error(f"❌ **Error displaying results:** {str(e)}")
+                st.exception(e)
+        else:
+            st.info("ℹ️ Files or settings changed since the last comparison - click Compare to update.")
 
     # Footer
     st.markdown("---")
@@ -932,6 +1365,11 @@ def main():
         </div>
     """, unsafe_allow_html=True)
 
+    # job ยังไม่จบ - rerun เพื่อ update progress (ทั้งหน้ายังใช้งานได้ระหว่างรอ)
+    if polling:
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
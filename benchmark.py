@@ -0,0 +1,354 @@
+"""
+Slider Data Comparison Tool - Benchmark
+วัดเวลา/throughput/peak memory ของแต่ละขั้นตอนด้วยข้อมูล serial สังเคราะห์ (reproducible ด้วย seed)
+
+Usage:
+    python benchmark.py                                   # 1k, 10k, 100k, 1M rows
+    python benchmark.py --sizes 1000 10000 --stages fuzzy_match excel_report
+    python benchmark.py --sizes 10000 100000 --stages read_excel read_excel_pandas
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json   # exit 1 ถ้าช้าลง/ใช้ memory เพิ่มเกิน tolerance
+"""
+import argparse
+import gc
+import io
+import json
+import platform
+import random
+import string
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import Workbook
+
+from fuzzy_match import MATCH_MODES, MODE_EXACT, SerialMatchIndex, SerialSet, similarity_ratio
+from slider_core import (
+    FUZZY_TOP_K,
+    SIMILAR_CUTOFF,
+    _comparison_result,
+    _fuzzy_details,
+    clean_serial_series,
+    create_excel_report,
+    detect_serial_column,
+    read_master_file,
+    read_measurement_file
+)
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+STAGES = [
+    'read_master',
+    'read_measurement',
+    'detect_column',
+    'set_difference',
+    'fuzzy_index',
+    'fuzzy_match',
+    'excel_report'
+]
+# อ่าน measurement เป็น .xlsx: path ปัจจุบัน เทียบกับ pd.read_excel ทั้ง sheet แบบเดิม
+# (ไม่รันโดย default เพราะการสร้าง .xlsx ขนาดใหญ่ใช้เวลานาน)
+EXCEL_STAGES = [
+    'read_excel',
+    'read_excel_pandas'
+]
+
+ALPHANUMERIC = string.ascii_uppercase + string.digits
+# prefix ของ lot ที่ใช้สุ่ม (serial จริงใน lot เดียวกันมักขึ้นต้นเหมือนกัน)
+LOT_PREFIXES = ['B', 'SY', 'A', 'B72', 'SYC', 'WD', 'H', 'KT']
+SUFFIXES = ['A1', 'B2', 'P', 'R01', 'OK']
+PARAMETRIC_COLUMNS = 12
+
+# stage ที่ใช้เวลาน้อยกว่านี้ไม่นำมาเทียบเวลากับ baseline (noise สูงเกินไป)
+MIN_COMPARABLE_SECONDS = 0.01
+
+
+class BenchmarkFile(io.BytesIO):
+    """ไฟล์ใน memory ที่มี name/size เหมือน UploadedFile"""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def generate_serial(rng):
+    """สุ่ม serial รูปแบบ ^[A-Z]{1,3}[A-Z0-9]{7,14}$ คืนค่า (serial ดิบ, serial หลัง clean)"""
+    prefix = rng.choice(LOT_PREFIXES)
+    core_length = rng.randint(max(8, len(prefix) + 7), 10)
+    core = prefix + ''.join(rng.choice(ALPHANUMERIC) for _ in range(core_length - len(prefix)))
+
+    # serial ยาวกว่า 10 ตัว ถูกตัดเหลือ 10 ตัวแรกตอน clean
+    raw = core
+    if core_length == 10:
+        raw += ''.join(rng.choice(ALPHANUMERIC) for _ in range(rng.randint(0, 7 - (3 - len(prefix)))))
+    if rng.random() < 0.3:
+        raw += ',' + rng.choice(SUFFIXES)
+    return raw, core
+
+
+def make_typo(serial, rng):
+    """แทนตัวอักษร 1 ตัวหลัง prefix (จำลองการพิมพ์ผิด)"""
+    pos = rng.randrange(3, len(serial))
+    replacement = rng.choice(ALPHANUMERIC.replace(serial[pos], ''))
+    return serial[:pos] + replacement + serial[pos + 1:]
+
+
+def generate_dataset(size, seed=42, typo_rate=0.01, missing_rate=0.02, extra_rate=0.02):
+    """สร้าง master/measurement สังเคราะห์
+
+    - master มี size serials ที่ไม่ซ้ำกัน
+    - measurement ขาด missing_rate ของ master, มี typo_rate ที่พิมพ์ผิด 1 ตัว
+      และมี serial ใหม่ที่ไม่อยู่ใน master อีก extra_rate
+    """
+    rng = random.Random(seed)
+    seen = set()
+    rows = []
+    while len(rows) < size:
+        raw, core = generate_serial(rng)
+        if core not in seen:
+            seen.add(core)
+            rows.append((raw, core))
+
+    measurement_rows = []
+    typo_pairs = {}
+    for raw, core in rows:
+        roll = rng.random()
+        if roll < missing_rate:
+            continue
+        if roll < missing_rate + typo_rate:
+            typo = make_typo(core, rng)
+            if typo not in seen:
+                seen.add(typo)
+                typo_pairs[core] = typo
+                measurement_rows.append(typo + raw[len(core):])
+                continue
+        measurement_rows.append(raw)
+
+    for _ in range(int(size * extra_rate)):
+        raw, core = generate_serial(rng)
+        if core not in seen:
+            seen.add(core)
+            measurement_rows.append(raw)
+    rng.shuffle(measurement_rows)
+
+    master_text = 'Serial\n' + '\n'.join(raw for raw, _ in rows) + '\n'
+
+    measurement_csv = io.StringIO()
+    header = ['Test Date', 'Slider Serial'] + [f'Param_{i}' for i in range(PARAMETRIC_COLUMNS)]
+    measurement_csv.write(','.join(header) + '\n')
+    for raw in measurement_rows:
+        params = ','.join(f"{rng.random():.4f}" for _ in range(PARAMETRIC_COLUMNS))
+        # serial ที่มี comma ต้องอยู่ใน quote
+        measurement_csv.write(f'2025-01-01,"{raw}",{params}\n')
+
+    return {
+        'size': size,
+        'master_bytes': master_text.encode('utf-8'),
+        'measurement_bytes': measurement_csv.getvalue().encode('utf-8'),
+        'master_serials': {core for _, core in rows},
+        'typo_pairs': typo_pairs
+    }
+
+
+def measurement_xlsx(data):
+    """measurement เดียวกันในรูป .xlsx (สร้างครั้งแรกที่ใช้ แล้วเก็บไว้ใน data)"""
+    if 'measurement_xlsx' not in data:
+        frame = pd.read_csv(io.BytesIO(data['measurement_bytes']), dtype=str)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(frame.columns.tolist())
+        for row in frame.itertuples(index=False):
+            sheet.append(list(row))
+        output = io.BytesIO()
+        workbook.save(output)
+        data['measurement_xlsx'] = output.getvalue()
+    return data['measurement_xlsx']
+
+
+def read_excel_pandas(xlsx_bytes):
+    """path เดิม: โหลดทั้ง sheet เป็น DataFrame แล้วค่อยเลือก serial column"""
+    frame = pd.read_excel(io.BytesIO(xlsx_bytes))
+    serial_col_idx, _ = detect_serial_column(frame)
+    return clean_serial_series(frame.iloc[:, serial_col_idx])
+
+
+def known_matches(serial, pairs):
+    """closest match จากคู่ typo ที่สร้างไว้ (รูปแบบเดียวกับผลของ closest_matches)"""
+    match = pairs.get(serial)
+    return [(match, similarity_ratio(serial, match))] if match else []
+
+
+def stage_setup(stage, data, fuzzy_sample, fuzzy_mode):
+    """เตรียม input ของแต่ละ stage (ไม่นับเวลา) คืนค่า (function ที่จะวัด, จำนวน rows)"""
+    if stage == 'read_master':
+        return lambda: read_master_file(BenchmarkFile('master.txt', data['master_bytes'])), data['size']
+
+    if stage == 'read_measurement':
+        return (lambda: read_measurement_file(BenchmarkFile('measurement.csv', data['measurement_bytes'])),
+                data['size'])
+
+    if stage == 'read_excel':
+        xlsx_bytes = measurement_xlsx(data)
+        return lambda: read_measurement_file(BenchmarkFile('measurement.xlsx', xlsx_bytes)), data['size']
+
+    if stage == 'read_excel_pandas':
+        xlsx_bytes = measurement_xlsx(data)
+        return lambda: read_excel_pandas(xlsx_bytes), data['size']
+
+    measurement_serials, _ = read_measurement_file(BenchmarkFile('measurement.csv', data['measurement_bytes']))
+    master_serials = data['master_serials']
+
+    if stage == 'detect_column':
+        sample = pd.read_csv(io.BytesIO(data['measurement_bytes']), nrows=1000)
+        return lambda: detect_serial_column(sample), sample.shape[1]
+
+    if stage == 'set_difference':
+        # master จาก reader เป็น SerialSet อยู่แล้ว - วัดเฉพาะ sorted merge
+        master_set = SerialSet(master_serials)
+        return lambda: master_set.split(measurement_serials), len(master_serials) + len(measurement_serials)
+
+    if stage == 'fuzzy_index':
+        return lambda: SerialMatchIndex(sorted(measurement_serials), mode=fuzzy_mode), len(measurement_serials)
+
+    missing = sorted(master_serials - measurement_serials)
+
+    if stage == 'fuzzy_match':
+        # สุ่ม missing serial มาไม่เกิน fuzzy_sample ตัว เพื่อให้ 1M rows ยังวัดได้ในเวลาสมเหตุผล
+        targets = random.Random(0).sample(missing, min(fuzzy_sample, len(missing)))
+        index = SerialMatchIndex(sorted(measurement_serials), mode=fuzzy_mode)
+        return lambda: [index.closest(t, cutoff=SIMILAR_CUTOFF, n=FUZZY_TOP_K) for t in targets], len(targets)
+
+    if stage == 'excel_report':
+        # สร้าง result จาก set difference + คู่ typo ที่รู้อยู่แล้วเป็น closest match (ไม่รัน fuzzy เลย)
+        extra = sorted(set(measurement_serials) - master_serials)
+        typo_sources = {typo: serial for serial, typo in data['typo_pairs'].items()}
+        missing_matches = [known_matches(serial, data['typo_pairs']) for serial in missing]
+        extra_matches = [known_matches(serial, typo_sources) for serial in extra]
+        result = _comparison_result(
+            master_serials, len(measurement_serials), missing, extra,
+            _fuzzy_details(missing, missing_matches, 'master_serial', 'closest_csv', 'MISSING'),
+            _fuzzy_details(extra, extra_matches, 'csv_serial', 'closest_master', 'EXTRA'),
+            'Text File (Line by line)', 'Column: Slider Serial', MODE_EXACT
+        )
+        rows = len(missing) + len(extra)
+        return lambda: create_excel_report(result, 'master.txt', 'measurement.csv'), rows
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def measure(func, repeat):
+    """วัดเวลา (ดีที่สุดจาก repeat รอบ) แล้ววัด peak memory แยกอีกรอบด้วย tracemalloc"""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(timings), peak
+
+
+def run_benchmarks(sizes, stages, seed=42, repeat=1, fuzzy_sample=2000, fuzzy_mode=MODE_EXACT, **rates):
+    results = []
+    for size in sizes:
+        data = generate_dataset(size, seed=seed, **rates)
+        for stage in stages:
+            func, rows = stage_setup(stage, data, fuzzy_sample, fuzzy_mode)
+            seconds, peak = measure(func, repeat)
+            results.append({
+                'size': size,
+                'stage': stage,
+                'rows': rows,
+                'seconds': round(seconds, 4),
+                'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+                'peak_mb': round(peak / 1024 / 1024, 2)
+            })
+            print(f"{size:>9,}  {stage:<17} {rows:>9,} rows  {seconds:>9.3f}s  "
+                  f"{results[-1]['rows_per_second'] or 0:>12,.0f} rows/s  {results[-1]['peak_mb']:>8.1f} MB",
+                  flush=True)
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """เทียบกับ baseline - คืนค่ารายการ stage ที่ช้าลงหรือใช้ memory มากขึ้นเกิน tolerance"""
+    previous = {(r['size'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        base = previous.get((result['size'], result['stage']))
+        if base is None:
+            continue
+        for metric in ('seconds', 'peak_mb'):
+            if metric == 'seconds' and base[metric] < MIN_COMPARABLE_SECONDS:
+                continue
+            if base[metric] > 0 and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{result['size']:,} {result['stage']} {metric}: "
+                    f"{base[metric]} → {result[metric]} (+{(result[metric] / base[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the slider comparison pipeline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Master list sizes")
+    parser.add_argument('--stages', nargs='+', choices=STAGES + EXCEL_STAGES, default=STAGES,
+                        help="Stages to run (default: all except the Excel read stages)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=1, help="Timing runs per stage (best is kept)")
+    parser.add_argument('--typo-rate', type=float, default=0.01)
+    parser.add_argument('--missing-rate', type=float, default=0.02)
+    parser.add_argument('--extra-rate', type=float, default=0.02)
+    parser.add_argument('--fuzzy-sample', type=int, default=2000,
+                        help="Missing serials timed in the fuzzy_match stage (default: 2000)")
+    parser.add_argument('--mode', choices=MATCH_MODES, default=MODE_EXACT, help="Fuzzy matching mode")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Write results as a new baseline")
+    parser.add_argument('--baseline', metavar='PATH', help="Compare results with a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown/memory growth vs baseline (default: 0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmarks(
+        args.sizes, args.stages, seed=args.seed, repeat=args.repeat, fuzzy_sample=args.fuzzy_sample,
+        fuzzy_mode=args.mode, typo_rate=args.typo_rate, missing_rate=args.missing_rate,
+        extra_rate=args.extra_rate
+    )
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'machine': platform.platform(),
+                'settings': {k: v for k, v in vars(args).items() if k not in ('save_baseline', 'baseline')},
+                'results': results
+            }, f, indent=2)
+        print(f"Baseline saved: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("No regressions vs baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,546 @@
+"""
+Fuzzy serial matching engine
+Candidate index สำหรับหา serial ที่ใกล้เคียงที่สุด โดยไม่ต้อง scan ทั้ง list ด้วย difflib
+"""
+import difflib
+import heapq
+import json
+import multiprocessing
+from collections import Counter
+from collections.abc import Set
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+# โหมดการค้นหา
+MODE_EXACT = 'exact'  # ผลลัพธ์เหมือน difflib.get_close_matches ทุกประการ
+MODE_FAST = 'fast'  # ตรวจเฉพาะ shortlist ที่ upper bound สูงสุด (อาจต่างจาก difflib ได้เล็กน้อย)
+MODE_EDIT = 'edit'  # Indel edit distance (LCS แบบ bit-parallel) + alignment ของ match สำหรับแสดง diff
+MATCH_MODES = (MODE_EXACT, MODE_FAST, MODE_EDIT)
+
+# Similarity ของโหมด edit เทียบกับ % เดิม:
+#   similarity = 1 - d / T = 2 * LCS / T   (d = Indel distance: insert/delete ละ 1, แทนที่ = 2; T = len(a) + len(b))
+# เป็นสูตรเดียวกับ SequenceMatcher.ratio() = 2 * M / T เพียงแต่ M คือ LCS จริง (difflib อาจได้ M น้อยกว่า)
+# จึงได้ % เท่ากับ difflib หรือสูงกว่าเล็กน้อย และ threshold เดิมแปลงเป็น distance สูงสุดได้ตรงตัว d <= (1 - cutoff) * T
+#   serial 10 ตัว (T = 20): 80% (POTENTIAL_MATCH) -> d <= 4 = แทนที่ 2 ตัว, 50% (SIMILAR) -> d <= 10 = แทนที่ 5 ตัว
+
+# จำนวน candidate ที่ตรวจด้วย SequenceMatcher ในโหมด fast
+FAST_SHORTLIST = 32
+
+# Process pool: ขนาด batch ต่อ task และจำนวน target ขั้นต่ำที่คุ้มกับการเปิด pool
+BATCH_SIZE = 256
+PARALLEL_MIN_TARGETS = 500
+
+# Index บน disk: เปลี่ยนเลขนี้เมื่อรูปแบบไฟล์เปลี่ยน (index เก่าจะไม่ถูกโหลด)
+INDEX_FORMAT = 1
+INDEX_META_FILE = 'index.json'
+
+
+def _char_masks(serial):
+    """bit mask ของตำแหน่งแต่ละตัวอักษรใน serial (ใช้กับ _lcs_length)"""
+    masks = {}
+    for i, ch in enumerate(serial):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    return masks
+
+
+def _lcs_length(masks, length, other):
+    """ความยาว LCS ของ serial (masks, length) กับ other - bit-parallel (Hyyrö) O(len(other)) ด้วย int ของ Python"""
+    full = (1 << length) - 1
+    v = full
+    for ch in other:
+        u = v & masks.get(ch, 0)
+        v = ((v + u) | (v - u)) & full
+    return length - bin(v).count('1')
+
+
+def edit_ratio(a, b):
+    """Similarity แบบ Indel distance = 2 * LCS / (len(a) + len(b)) - สมมาตร (สลับ a, b ได้ค่าเดียวกัน)"""
+    total = len(a) + len(b)
+    return 2.0 * _lcs_length(_char_masks(a), len(a), b) / total if total else 1.0
+
+
+def match_score(target, candidate, mode=MODE_EXACT):
+    """คะแนนที่ index ใช้จัดอันดับ candidate ของ target ในแต่ละโหมด"""
+    if mode == MODE_EDIT:
+        return edit_ratio(target, candidate)
+    return difflib.SequenceMatcher(None, candidate, target).ratio()
+
+
+def similarity_ratio(target, candidate, mode=MODE_EXACT):
+    """Similarity ที่รายงานของ closest match (คำนวณแบบเดียวกับ difflib path เดิม)
+
+    โหมด exact/fast ใช้ SequenceMatcher(None, target, candidate).ratio() ซึ่งกลับด้านกับ match_score
+    (ratio() ไม่สมมาตร - ค่าที่รายงานอาจต่างจากคะแนนที่จัดอันดับเล็กน้อย เหมือนก่อนมี index)
+    """
+    if mode == MODE_EDIT:
+        return edit_ratio(target, candidate)
+    return difflib.SequenceMatcher(None, target, candidate).ratio()
+
+
+def edit_alignment(a, b):
+    """Alignment ของ a กับ b ที่ Indel distance ต่ำสุด - list ของคู่ (ตัวอักษรจาก a, ตัวอักษรจาก b)
+
+    ตัวที่ไม่มีคู่ใช้ '' และช่วงที่ไม่ตรงกันระหว่าง match สองตัวจับคู่เป็นการแทนที่ตามลำดับ
+    เช่น ('AB12X4', 'AB124') -> ..., ('2', '2'), ('X', ''), ('4', '4')
+
+    เป็น DP แยกจากรอบที่ให้คะแนน (ตั้งใจ): closest() ใช้ LCS แบบ bit-parallel ซึ่งได้แค่ความยาว
+    การเก็บ bit vector ทุกแถวไว้ traceback ต้องทำกับทุก candidate ที่ตรวจ แต่ alignment ใช้เฉพาะ
+    match ที่ชนะ - DP O(len(a) * len(b)) ของคู่เดียว (serial ~10 ตัว) ถูกกว่ามาก
+    """
+    la, lb = len(a), len(b)
+    # lcs[i][j] = LCS ของ a[i:] กับ b[j:]
+    lcs = [[0] * (lb + 1) for _ in range(la + 1)]
+    for i in range(la - 1, -1, -1):
+        row, below = lcs[i], lcs[i + 1]
+        for j in range(lb - 1, -1, -1):
+            row[j] = below[j + 1] + 1 if a[i] == b[j] else max(below[j], row[j + 1])
+
+    pairs = []
+    deleted, inserted = [], []
+
+    def flush():
+        for k in range(max(len(deleted), len(inserted))):
+            pairs.append((deleted[k] if k < len(deleted) else '', inserted[k] if k < len(inserted) else ''))
+        deleted.clear()
+        inserted.clear()
+
+    i = j = 0
+    while i < la or j < lb:
+        if i < la and j < lb and a[i] == b[j] and lcs[i][j] == lcs[i + 1][j + 1] + 1:
+            flush()
+            pairs.append((a[i], b[j]))
+            i += 1
+            j += 1
+        elif j < lb and (i == la or lcs[i][j + 1] >= lcs[i + 1][j]):
+            inserted.append(b[j])
+            j += 1
+        else:
+            deleted.append(a[i])
+            i += 1
+    flush()
+    return pairs
+
+
+def _count_keys(serial):
+    """แปลง serial เป็น posting keys (ตัวอักษร, ลำดับที่ k ของตัวอักษรนั้น)"""
+    return [(ch, k) for ch, count in Counter(serial).items() for k in range(1, count + 1)]
+
+
+class SerialArray:
+    """Sequence ของ serial (str) บน numpy array ความกว้างคงที่ (S/U) เช่น array ที่ memory map จาก disk
+
+    decode เป็น str เฉพาะตัวที่ถูกอ่าน - ไม่ต้องสร้าง list ของ str ทั้งหมดตอนโหลด
+    """
+
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, idx):
+        value = self.array[idx]
+        return value.decode('ascii') if isinstance(value, bytes) else str(value)
+
+    def __iter__(self):
+        if self.array.dtype.kind == 'S':
+            return (value.decode('ascii') for value in self.array.tolist())
+        return iter(self.array.tolist())
+
+
+def serial_array(serials):
+    """แปลง serials (เรียงแล้ว) เป็น numpy array ความกว้างคงที่ - ใช้ bytes (S) ถ้าเป็น ASCII ทั้งหมด"""
+    serials = list(serials)
+    width = max(map(len, serials), default=1)
+    dtype = f'S{width}' if all(s.isascii() for s in serials) else f'U{width}'
+    return np.array(serials, dtype=dtype)
+
+
+def _unique_sorted(array):
+    """สมาชิกที่ไม่ซ้ำของ array เรียงแล้ว - sort แล้วตัดตัวที่ซ้ำกับตัวก่อนหน้า
+
+    เร็วกว่า np.unique กับ array ของ string (numpy 2.x ทำ hash ก่อนแล้วค่อย sort)
+    """
+    array = np.sort(array)
+    if len(array) < 2:
+        return array
+    keep = np.empty(len(array), dtype=bool)
+    keep[0] = True
+    np.not_equal(array[1:], array[:-1], out=keep[1:])
+    return array[keep]
+
+
+def _common_kind(a, b):
+    """แปลง array S/U ให้เป็นชนิดเดียวกันก่อนเปรียบเทียบ (S ที่เป็น ASCII แปลงเป็น U ได้ตรงตัว)"""
+    if a.dtype.kind == b.dtype.kind:
+        return a, b
+    if a.dtype.kind == 'S':
+        return a.astype(f'U{a.dtype.itemsize}'), b
+    return a, b.astype(f'U{b.dtype.itemsize}')
+
+
+def _sorted_isin(a, b):
+    """mask ของสมาชิกใน a ที่อยู่ใน b (ทั้งสองเรียงแล้ว ไม่ซ้ำ) ด้วย searchsorted"""
+    if not len(a) or not len(b):
+        return np.zeros(len(a), dtype=bool)
+    pos = np.searchsorted(b, a)
+    pos[pos == len(b)] = 0
+    return b[pos] == a
+
+
+class SerialSet(Set):
+    """Set ของ serial (อ่านอย่างเดียว) บน numpy array ที่เรียงแล้วและไม่ซ้ำ
+
+    serial ยาวไม่เกิน 10 ตัว จึงใช้ memory ประมาณ 10 bytes ต่อ serial (S10) แทน str + hash slot
+    ของ Python set - วนลูปได้ serial เรียงตามลำดับเสมอ ไม่ต้อง sorted() ซ้ำ
+    set operation ระหว่าง SerialSet ด้วยกันทำแบบ vectorized (sorted merge ด้วย searchsorted)
+    """
+
+    __slots__ = ('array',)
+
+    def __init__(self, serials=()):
+        if isinstance(serials, SerialSet):
+            self.array = serials.array
+        else:
+            self.array = _unique_sorted(serials if isinstance(serials, np.ndarray) else serial_array(serials))
+
+    @classmethod
+    def from_sorted(cls, array):
+        """ใช้ array ที่เรียงแล้วและไม่ซ้ำ (เช่น serials.npy ของ index ที่ save ไว้) โดยไม่ copy"""
+        serial_set = cls.__new__(cls)
+        serial_set.array = array
+        return serial_set
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """รวม array ของ serial หลายส่วน (เช่น serial_array ของแต่ละ batch) ด้วยการ sort ครั้งเดียวตอนจบ
+
+        เร็วกว่า | ทีละ batch ซึ่ง sort ผลรวมใหม่ทุกครั้ง
+        """
+        arrays = [array for array in arrays if len(array)]
+        if not arrays:
+            return cls()
+        if len({array.dtype.kind for array in arrays}) > 1:
+            # S ที่เป็น ASCII แปลงเป็น U ได้ตรงตัว
+            arrays = [array.astype(f'U{array.dtype.itemsize}') if array.dtype.kind == 'S' else array
+                      for array in arrays]
+        return cls(np.concatenate(arrays))
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return cls(iterable)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        return iter(SerialArray(self.array))
+
+    def __contains__(self, serial):
+        if not isinstance(serial, str) or not len(self.array):
+            return False
+        if self.array.dtype.kind == 'S':
+            if not serial.isascii():
+                return False
+            serial = serial.encode('ascii')
+        pos = np.searchsorted(self.array, serial)
+        return pos < len(self.array) and self.array[pos] == serial
+
+    def __repr__(self):
+        return f"SerialSet({len(self)} serials, dtype={self.array.dtype})"
+
+    def __reduce__(self):
+        return self.from_sorted, (self.array,)
+
+    def tolist(self):
+        """list ของ serial (str) เรียงแล้ว"""
+        return list(self)
+
+    def split(self, other):
+        """sorted merge ครั้งเดียว - คืนค่า (เฉพาะใน self, อยู่ทั้งคู่, เฉพาะใน other) เรียงแล้วทั้งหมด"""
+        other = other if isinstance(other, SerialSet) else SerialSet(other)
+        a, b = _common_kind(self.array, other.array)
+        in_b = _sorted_isin(a, b)
+        in_a = _sorted_isin(b, a)
+        return (SerialSet.from_sorted(self.array[~in_b]), SerialSet.from_sorted(self.array[in_b]),
+                SerialSet.from_sorted(other.array[~in_a]))
+
+    def __sub__(self, other):
+        if not isinstance(other, SerialSet):
+            return Set.__sub__(self, other)
+        a, b = _common_kind(self.array, other.array)
+        return SerialSet.from_sorted(self.array[~_sorted_isin(a, b)])
+
+    def __and__(self, other):
+        if not isinstance(other, SerialSet):
+            return Set.__and__(self, other)
+        a, b = _common_kind(self.array, other.array)
+        return SerialSet.from_sorted(self.array[_sorted_isin(a, b)])
+
+    def __or__(self, other):
+        if not isinstance(other, SerialSet):
+            return Set.__or__(self, other)
+        if not len(other):
+            return self
+        if not len(self):
+            return other
+        a, b = _common_kind(self.array, other.array)
+        return SerialSet(np.concatenate([a, b]))
+
+
+class SerialMatchIndex:
+    """Index ของ candidate serials สำหรับ fuzzy matching
+
+    Posting key (ch, k) เก็บ candidate ที่มีตัวอักษร ch อย่างน้อย k ตัว
+    จำนวน key ที่ target กับ candidate มีร่วมกัน = ขนาด multiset intersection
+    ซึ่งให้ upper bound ค่าเดียวกับ SequenceMatcher.quick_ratio()
+    จึงตัด candidate ที่ไม่มีทางผ่าน cutoff ได้โดยไม่ต้องรัน SequenceMatcher
+    (LCS <= multiset intersection เช่นกัน - โหมด edit ใช้เป็น lower bound ของ edit distance)
+    """
+
+    def __init__(self, candidates, mode=MODE_EXACT, shortlist=FAST_SHORTLIST):
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {mode!r} (expected one of {MATCH_MODES})")
+
+        self.mode = mode
+        self.shortlist = shortlist
+        self.path = None
+        # SerialSet ใช้ array เดิม (decode เฉพาะตัวที่ถูกอ่าน) แทนการสร้าง list ของ str
+        self.candidates = SerialArray(candidates.array) if isinstance(candidates, SerialSet) else list(candidates)
+        self.lengths = np.fromiter(
+            (len(c) for c in self.candidates), dtype=np.int64, count=len(self.candidates)
+        )
+        self.min_length = int(self.lengths.min()) if len(self.lengths) else 0
+
+        postings = {}
+        for idx, candidate in enumerate(self.candidates):
+            for key in _count_keys(candidate):
+                postings.setdefault(key, []).append(idx)
+        self.postings = {key: np.asarray(ids, dtype=np.int64) for key, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def save(self, directory):
+        """เขียน index ลง directory: serials/lengths/postings เป็นไฟล์ .npy (postings แบบ CSR)"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        keys = sorted(self.postings)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self.postings[key]) for key in keys])
+        ids = (np.concatenate([self.postings[key] for key in keys]) if keys
+               else np.zeros(0, dtype=np.int64)).astype(np.int32)
+
+        np.save(directory / 'serials.npy', serial_array(self.candidates))
+        np.save(directory / 'lengths.npy', self.lengths)
+        np.save(directory / 'posting_ids.npy', ids)
+        np.save(directory / 'posting_offsets.npy', offsets)
+        (directory / INDEX_META_FILE).write_text(json.dumps({
+            'format': INDEX_FORMAT,
+            'count': len(self.candidates),
+            'posting_keys': [[ch, k] for ch, k in keys]
+        }, ensure_ascii=False), encoding='utf-8')
+
+    @classmethod
+    def load(cls, directory, mode=MODE_EXACT, shortlist=FAST_SHORTLIST, mmap=True):
+        """โหลด index ที่ save ไว้ - ใช้ memory map จึงแทบไม่ต้องอ่านไฟล์ตอนโหลด"""
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {mode!r} (expected one of {MATCH_MODES})")
+
+        directory = Path(directory)
+        meta = json.loads((directory / INDEX_META_FILE).read_text(encoding='utf-8'))
+        if meta.get('format') != INDEX_FORMAT:
+            raise ValueError(f"Unsupported index format {meta.get('format')!r} in {directory}")
+
+        mmap_mode = 'r' if mmap else None
+        ids = np.load(directory / 'posting_ids.npy', mmap_mode=mmap_mode)
+        offsets = np.load(directory / 'posting_offsets.npy')
+
+        index = cls.__new__(cls)
+        index.mode = mode
+        index.shortlist = shortlist
+        index.path = directory
+        index.candidates = SerialArray(np.load(directory / 'serials.npy', mmap_mode=mmap_mode))
+        index.lengths = np.load(directory / 'lengths.npy', mmap_mode=mmap_mode)
+        index.min_length = int(index.lengths.min()) if len(index.lengths) else 0
+        index.postings = {
+            (ch, k): ids[offsets[i]:offsets[i + 1]] for i, (ch, k) in enumerate(meta['posting_keys'])
+        }
+        return index
+
+    def upper_bounds(self, target, min_ratio=0.0):
+        """quick_ratio ของ target กับ candidate ที่อาจได้ไม่ต่ำกว่า min_ratio จาก postings - คืนค่า (ids, bounds)
+
+        ยังเป็น O(จำนวน candidate): นับ key ร่วมด้วย bincount ทั้ง array แต่คำนวณ ratio (float)
+        เฉพาะ candidate ที่มี key ร่วมถึงขั้นต่ำ (ปกติไม่กี่ % ที่ cutoff 0.5)
+        """
+        lists = [self.postings[key] for key in _count_keys(target) if key in self.postings]
+        if lists:
+            common = np.bincount(np.concatenate(lists), minlength=len(self.candidates))
+        else:
+            common = np.zeros(len(self.candidates), dtype=np.int64)
+
+        # bound = 2 * common / (len(target) + len(candidate)) >= min_ratio ต้องมี common >= ค่านี้ (ปัดลงไม่ให้ตัดเกิน)
+        min_common = int(min_ratio * (len(target) + self.min_length) / 2)
+        ids = np.flatnonzero(common >= min_common) if min_common > 0 else np.arange(len(self.candidates))
+
+        total = self.lengths[ids] + len(target)
+        # สูตรเดียวกับ difflib._calculate_ratio เพื่อให้ค่า float ตรงกันทุก bit
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return ids, np.where(total > 0, 2.0 * common[ids] / total, 1.0)
+
+    def closest(self, target, cutoff=0.6, n=1):
+        """หา candidate ที่ใกล้เคียง target ที่สุด n ตัว
+
+        Returns list ของ (candidate, similarity_ratio) เรียงจากใกล้ที่สุด
+        ลำดับและการตัดสินเมื่อคะแนนเท่ากันเหมือน difflib.get_close_matches
+        """
+        if not self.candidates or n <= 0:
+            return []
+
+        ids, bounds = self.upper_bounds(target, cutoff)
+        keep = bounds >= cutoff
+        ranked = np.argsort(-bounds[keep], kind='stable')
+        order, bounds = ids[keep][ranked], bounds[keep][ranked]
+        if self.mode == MODE_FAST:
+            order = order[:self.shortlist]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(target)
+        masks = _char_masks(target)
+        best = []  # min-heap ของ (score, candidate) ขนาดไม่เกิน n
+        # max-heap ของ (-lcs_ratio, idx): candidate ที่คำนวณ LCS แล้ว รอคำนวณ SequenceMatcher (exact/fast)
+        pending = []
+        pos = 0
+
+        # ratio จาก LCS เป็น score ของโหมด edit (distance เกิน (1 - cutoff) * T = ต่ำกว่า cutoff)
+        # และเป็น upper bound ของ SequenceMatcher.ratio() ที่แคบกว่า quick_ratio (block ที่ difflib
+        # จับคู่ได้เป็น common subsequence จึงยาวไม่เกิน LCS) - คำนวณ score แบบ best-first ตาม lcs_ratio
+        # เมื่อไม่มี candidate ที่ยังไม่ได้ดูตัวไหน bound สูงกว่า top ของ pending แล้ว: top n เต็มเร็ว ตัดได้มากขึ้น
+        while True:
+            next_bound = bounds[pos] if pos < len(order) else -1.0
+            if pending and -pending[0][0] >= next_bound:
+                upper, idx = -pending[0][0], heapq.heappop(pending)[1]
+                # ตัวที่เหลือทั้งหมดมี upper bound ต่ำกว่าอันดับ n แล้ว - หยุดได้
+                if len(best) == n and upper < best[0][0]:
+                    break
+                candidate = self.candidates[idx]
+                matcher.set_seq1(candidate)
+                score = matcher.ratio()
+            elif pos < len(order):
+                if len(best) == n and next_bound < best[0][0]:
+                    break
+                idx = order[pos]
+                pos += 1
+                candidate = self.candidates[idx]
+                lcs_ratio = 2.0 * _lcs_length(masks, len(target), candidate) / (len(target) + len(candidate))
+                if lcs_ratio < cutoff or (len(best) == n and lcs_ratio < best[0][0]):
+                    continue
+                if self.mode != MODE_EDIT:
+                    heapq.heappush(pending, (-lcs_ratio, idx))
+                    continue
+                score = lcs_ratio
+            else:
+                break
+
+            if score < cutoff:
+                continue
+            if len(best) < n:
+                heapq.heappush(best, (score, candidate))
+            elif (score, candidate) > best[0]:
+                heapq.heapreplace(best, (score, candidate))
+
+        # จัดอันดับด้วย match_score แต่รายงาน similarity_ratio เหมือน difflib path เดิม
+        if self.mode == MODE_EDIT:
+            return [(candidate, score) for score, candidate in sorted(best, reverse=True)]
+        return [(candidate, similarity_ratio(target, candidate)) for _, candidate in sorted(best, reverse=True)]
+
+
+def build_match_index(candidates, mode=MODE_EXACT):
+    """สร้าง index จาก candidate serials (ทำครั้งเดียวต่อการเปรียบเทียบ)"""
+    return SerialMatchIndex(candidates if isinstance(candidates, SerialSet) else sorted(candidates), mode=mode)
+
+
+# index ของแต่ละ worker process (สร้างครั้งเดียวตอนเริ่ม worker)
+_worker_index = None
+
+
+def _init_worker(candidates, mode, path=None):
+    """Initializer ของ worker - รับ candidate list ครั้งเดียวแล้วสร้าง index ไว้ใช้ทุก task
+
+    ถ้า index ถูก save ไว้ (path) จะ memory map จาก disk แทนการสร้างใหม่
+    """
+    global _worker_index
+    if path is not None:
+        _worker_index = SerialMatchIndex.load(path, mode=mode)
+    else:
+        _worker_index = SerialMatchIndex(candidates, mode=mode)
+
+
+def _closest_batch(index, targets, cutoff, n=1):
+    """หา closest match (ไม่เกิน n ตัว) ของ targets ทั้ง batch"""
+    return [index.closest(target, cutoff=cutoff, n=n) for target in targets]
+
+
+def _worker_closest_batch(targets, cutoff, n):
+    return _closest_batch(_worker_index, targets, cutoff, n)
+
+
+def closest_matches(targets, candidates, cutoff=0.6, mode=MODE_EXACT, workers=1,
+                    batch_size=BATCH_SIZE, progress=None, n=1):
+    """หา closest match ของทุก target เทียบกับ candidates
+
+    candidates เป็น iterable ของ serial หรือ SerialMatchIndex ที่สร้างไว้แล้ว
+    แบ่ง targets เป็น batch แล้วกระจายให้ process pool เมื่อ workers > 1
+    ผลลัพธ์ต่อ target เป็น list ของ (match, ratio) ไม่เกิน n ตัว เรียงจากใกล้ที่สุด (list ว่างถ้าไม่มี)
+    ได้จากการ scan candidate รอบเดียวกัน - ตามลำดับของ targets เสมอ
+    progress(done, total) ถูกเรียกทุกครั้งที่ batch เสร็จ
+    """
+    targets = list(targets)
+    # ใช้ index ที่สร้างไว้แล้วได้ (เช่น master เดิมที่เปรียบเทียบกับหลายไฟล์)
+    if isinstance(candidates, SerialMatchIndex):
+        index = candidates
+        candidates, mode, path = index.candidates, index.mode, index.path
+    else:
+        index = path = None
+        if not isinstance(candidates, SerialSet):
+            candidates = sorted(candidates)
+    total = len(targets)
+    batches = [targets[i:i + batch_size] for i in range(0, total, batch_size)]
+    results = [None] * len(batches)
+    done = 0
+
+    if workers <= 1 or total < PARALLEL_MIN_TARGETS:
+        if index is None:
+            index = SerialMatchIndex(candidates, mode=mode)
+        for batch_no, batch in enumerate(batches):
+            results[batch_no] = _closest_batch(index, batch, cutoff, n)
+            done += len(batch)
+            if progress:
+                progress(done, total)
+    else:
+        # spawn ทำงานเหมือนกันทั้ง Windows และ Linux และไม่ fork server process ที่มีหลาย thread
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches)),
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(None if path else candidates, mode, path)) as pool:
+            futures = {
+                pool.submit(_worker_closest_batch, batch, cutoff, n): batch_no
+                for batch_no, batch in enumerate(batches)
+            }
+            try:
+                for future in as_completed(futures):
+                    batch_no = futures[future]
+                    results[batch_no] = future.result()
+                    done += len(batches[batch_no])
+                    if progress:
+                        progress(done, total)
+            except BaseException:
+                # เช่น progress callback ยกเลิกงาน - ไม่ต้องรอ batch ที่ยังไม่ได้เริ่ม
+                pool.shutdown(cancel_futures=True)
+                raise
+
+    return [match for batch in results for match in batch]
@@ -0,0 +1,255 @@
+"""
+Background jobs - รันการเปรียบเทียบใน thread pool ขนาดจำกัด แยกจาก script thread ของ Streamlit
+UI เก็บแค่ job id ไว้ใน session แล้ว poll สถานะ/stage/progress ทุก rerun และสั่งยกเลิกได้
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from slider_core import Reporter
+
+# จำนวน job ที่รันพร้อมกันได้ทั้ง server (job ที่เกินรอคิว) - กำหนดเองได้ด้วย SLIDER_JOB_WORKERS
+JOB_WORKERS = int(os.environ.get('SLIDER_JOB_WORKERS', 2))
+# job ที่จบแล้วแต่ไม่มี session มารับผล (เช่นปิด browser ไปแล้ว) ถูกลบหลังจากนี้ (วินาที)
+JOB_RETENTION_SECONDS = 3600
+
+# สถานะของ job
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+logger = logging.getLogger('slider_tool')
+
+
+class JobCancelled(BaseException):
+    """job ถูกสั่งยกเลิก - raise จากจุดตรวจใน reporter (เริ่ม stage / progress ของ fuzzy batch)
+
+    เป็น BaseException (แบบเดียวกับ asyncio.CancelledError) จึงไม่ถูก except Exception ของ reader กลืนไป
+    """
+
+
+class Job:
+    """งานเปรียบเทียบหนึ่งงาน - thread ของ job เขียนสถานะ ส่วน UI อ่านผ่าน snapshot()"""
+
+    def __init__(self, label='', owner=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.owner = owner
+        self.status = JOB_QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.messages = []  # (method ของ Reporter, args) ตามลำดับ - replay บน reporter อื่นได้
+        self.progress = None  # (label, done, total) ของ progress ล่าสุด
+        self._stages = []  # stage ที่กำลังทำ (ซ้อนกันได้) เป็น (name, detail)
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """สั่งยกเลิก - job ที่ยังรอคิวจะไม่เริ่ม ส่วน job ที่รันอยู่หยุดที่จุดตรวจถัดไป"""
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def record(self, method, *args):
+        with self._lock:
+            self.messages.append((method, args))
+
+    def snapshot(self):
+        """สถานะปัจจุบันของ job (copy ที่อ่านได้ปลอดภัยจาก thread อื่น)"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'label': self.label,
+                'owner': self.owner,
+                'status': self.status,
+                'stage': self._stages[-1] if self._stages else None,
+                'progress': self.progress,
+                'messages': list(self.messages),
+                'elapsed': self.elapsed(),
+                'cancel_requested': self.cancel_requested
+            }
+
+    @contextmanager
+    def _stage(self, name, detail):
+        with self._lock:
+            self._stages.append((name, detail))
+            self.progress = None
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stages.pop()
+
+    def _start(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.status = JOB_RUNNING
+
+    def _set_progress(self, label, done, total):
+        with self._lock:
+            self.progress = (label, done, total)
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.status = status
+            self.finished_at = time.time()
+
+
+class JobReporter(Reporter):
+    """Reporter ของ background job: เก็บข้อความไว้ใน Job ให้ UI replay และตรวจการยกเลิกที่ stage/progress"""
+
+    def __init__(self, job, stats=None):
+        self.job = job
+        self.stats = stats
+
+    @contextmanager
+    def stage(self, name, rows=0, detail=''):
+        self.job.check_cancelled()
+        with self.job._stage(name, detail), super().stage(name, rows, detail) as record:
+            yield record
+
+    def write(self, message):
+        self.job.record('write', message)
+
+    def info(self, message):
+        self.job.record('info', message)
+
+    def success(self, message):
+        self.job.record('success', message)
+
+    def warning(self, message):
+        self.job.record('warning', message)
+
+    def error(self, message):
+        self.job.record('error', message)
+
+    def exception(self, exc):
+        self.job.record('exception', exc)
+
+    def details(self, title, lines, limit=20):
+        # เก็บแค่บรรทัดที่แสดง (ไม่เก็บ list ยาวไว้ใน job)
+        shown = list(lines[:limit])
+        if len(lines) > limit:
+            shown.append(f"... and {len(lines) - limit} more")
+        self.job.record('details', title, shown, len(shown))
+
+    def progress(self, label, done, total):
+        self.job.check_cancelled()
+        self.job._set_progress(label, done, total)
+
+
+def replay(messages, reporter):
+    """แสดงข้อความที่ job เก็บไว้ผ่าน reporter อื่น (เช่น StreamlitReporter)"""
+    for method, args in messages:
+        getattr(reporter, method)(*args)
+
+
+class JobRegistry:
+    """Job ทั้งหมดของ server บน thread pool ขนาดจำกัด - ใช้ร่วมกันทุก session
+
+    job ที่จบแล้วเก็บไว้จนกว่า session จะรับผล (pop) หรือเกิน retention
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, retention=JOB_RETENTION_SECONDS):
+        self.max_workers = max_workers
+        self.retention = retention
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='slider-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, label='', owner=None, stats=None):
+        """ส่ง func(reporter) เข้า pool - ค่าที่คืนเป็น job.result คืนค่า Job ทันที (ไม่รอ)"""
+        self._prune()
+        job = Job(label, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, func, JobReporter(job, stats))
+        return job
+
+    @staticmethod
+    def _run(job, func, reporter):
+        if job.cancel_requested:
+            job._finish(JOB_CANCELLED)
+            return
+        job._start()
+        try:
+            result = func(reporter)
+        except JobCancelled:
+            logger.info("Job %s cancelled: %s", job.id, job.label)
+            job._finish(JOB_CANCELLED)
+        except Exception as e:
+            logger.error("Job %s failed: %s", job.id, job.label, exc_info=e)
+            job._finish(JOB_FAILED, error=e)
+        else:
+            job._finish(JOB_DONE, result=result)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id):
+        """ลบ job ออกจาก registry (หลัง session รับผลไปแล้ว)"""
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def list(self):
+        """job ทั้งหมดใน registry เรียงจาก submit ล่าสุด"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted(jobs, key=lambda job: job.submitted_at, reverse=True)
+
+    def queue_position(self, job):
+        """จำนวน job ที่รอคิวอยู่ก่อน job นี้"""
+        with self._lock:
+            return sum(1 for other in self._jobs.values()
+                       if other.status == JOB_QUEUED and other.submitted_at < job.submitted_at)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'workers': self.max_workers,
+            'queued': statuses.count(JOB_QUEUED),
+            'running': statuses.count(JOB_RUNNING),
+            'finished': sum(1 for status in statuses if status in FINISHED_STATUSES)
+        }
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.finished and job.finished_at < cutoff]:
+                del self._jobs[job_id]
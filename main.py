@@ -0,0 +1,293 @@
+"""
+Slider Data Comparison Tool - Command Line (Batch Mode)
+เปรียบเทียบ master/measurement หลายคู่จาก disk ใน process เดียว โดยไม่ต้องเปิด browser
+
+Usage:
+    python main.py --master master.txt --measurement lot1.csv lot2.csv --out-dir reports
+    python main.py --pairs pairs.csv --out-dir reports --workers 8 --report-workers 4
+    python main.py --master master.parquet --measurement lot1.parquet --export parquet csv
+    python main.py --master master.txt.gz --measurement lot1.csv.gz lot2.zip
+
+ไฟล์ .gz/.zip/.zst ถูก decompress แบบ stream ระหว่างอ่าน (.zip ต้องมีไฟล์ที่อ่านได้ไฟล์เดียว)
+
+pairs.csv มี header: master,measurement (path แบบ relative อ้างอิงจากโฟลเดอร์ของ pairs.csv)
+"""
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from fuzzy_match import MATCH_MODES, MODE_EXACT, build_match_index
+from master_store import MasterStore
+from slider_core import (
+    COMPRESSED_EXTENSIONS,
+    EXPORT_FORMATS,
+    FUZZY_TOP_K,
+    PRIORITY_HIGH,
+    LocalFile,
+    PipelineStats,
+    Reporter,
+    compare_serials,
+    export_formats,
+    file_digest,
+    read_master_file,
+    read_measurement_file,
+    result_status,
+    write_export_files,
+    write_report_file
+)
+
+logger = logging.getLogger('slider_tool')
+
+
+class ConsoleReporter(Reporter):
+    """แสดงข้อความสถานะจาก slider_core ผ่าน logging"""
+
+    @staticmethod
+    def _plain(message):
+        return str(message).replace('**', '')
+
+    def write(self, message):
+        logger.info(self._plain(message))
+
+    def info(self, message):
+        logger.info(self._plain(message))
+
+    def success(self, message):
+        logger.info(self._plain(message))
+
+    def warning(self, message):
+        logger.warning(self._plain(message))
+
+    def error(self, message):
+        logger.error(self._plain(message))
+
+    def exception(self, exc):
+        logger.error("Traceback:", exc_info=exc)
+
+    def details(self, title, lines, limit=20):
+        logger.info(self._plain(title))
+        for line in lines[:limit]:
+            logger.info("    %s", line)
+        if len(lines) > limit:
+            logger.info("    ... and %d more", len(lines) - limit)
+
+    def progress(self, label, done, total):
+        if done >= total:
+            logger.info("%s %d/%d", label, done, total)
+
+
+def read_pairs(pairs_path):
+    """อ่านรายการคู่ master/measurement จาก CSV"""
+    pairs_path = Path(pairs_path)
+    base_dir = pairs_path.parent
+    pairs = []
+    with open(pairs_path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            pairs.append((base_dir / row['master'].strip(), base_dir / row['measurement'].strip()))
+    return pairs
+
+
+def load_master(path, masters, fuzzy_mode, reporter, store=None):
+    """อ่าน master file และสร้าง fuzzy index - master เดิม (เนื้อหาเดียวกัน) ใช้ของที่โหลดไว้แล้ว
+
+    ถ้ากำหนด store (MasterStore) จะโหลด master ที่ save ไว้ และ save master ใหม่ลง store
+    """
+    master_file = LocalFile(path)
+    digest = file_digest(master_file)
+    if digest in masters:
+        logger.info("Reusing loaded master: %s", master_file.name)
+    elif store is not None and store.get(digest) is not None:
+        logger.info("Loading saved master index: %s", master_file.name)
+        with reporter.stage('load_saved_master', detail=master_file.name):
+            masters[digest] = store.load(digest, mode=fuzzy_mode)
+    else:
+        serials, source = read_master_file(master_file, reporter)
+        index = build_match_index(serials, mode=fuzzy_mode) if serials else None
+        if serials and store is not None:
+            stored = store.save(digest, master_file.name, serials, source)
+            logger.info("Saved master index: %s (%d serials)", stored.name, stored.count)
+        masters[digest] = (serials, source, index)
+    return master_file.name, masters[digest]
+
+
+def _report_stem(path):
+    """ชื่อไฟล์ไม่รวมนามสกุล - ไฟล์บีบอัดตัดนามสกุลการบีบอัดออกด้วย (lot1.csv.gz -> lot1)"""
+    path = Path(path)
+    if path.suffix.lower() in COMPRESSED_EXTENSIONS:
+        path = path.with_suffix('')
+    return path.stem
+
+
+def report_path(out_dir, master_path, measurement_path):
+    return Path(out_dir) / f"{_report_stem(master_path)}__{_report_stem(measurement_path)}_report.xlsx"
+
+
+def compare_pair(master_path, measurement_path, out_dir, masters, summary, pending, report_pool,
+                 fuzzy_mode, workers, reporter, store=None, top_k=FUZZY_TOP_K, export=()):
+    """เปรียบเทียบคู่เดียว แล้วเขียน report (หรือส่งเข้า report pool) และไฟล์ export ตาม format ใน export"""
+    master_name, (master_serials, master_source, master_index) = load_master(
+        master_path, masters, fuzzy_mode, reporter, store
+    )
+    measurement_file = LocalFile(measurement_path)
+    measurement_serials, measurement_source = read_measurement_file(measurement_file, reporter)
+
+    if not master_serials or not measurement_serials:
+        raise ValueError("Failed to read files or no valid serials found.")
+
+    result = compare_serials(
+        master_serials, measurement_serials,
+        master_source=master_source, measurement_source=measurement_source,
+        fuzzy_mode=fuzzy_mode, workers=workers, reporter=reporter, master_index=master_index, top_k=top_k
+    )
+
+    path = report_path(out_dir, master_path, measurement_path)
+    if report_pool is not None:
+        pending.append((summary, report_pool.submit(
+            write_report_file, result, master_name, measurement_file.name, path
+        )))
+    else:
+        with reporter.stage('excel_report', rows=result['missing_count'] + result['extra_count']):
+            summary['report'] = write_report_file(result, master_name, measurement_file.name, path)
+
+    if export:
+        # Parquet/Arrow/CSV เขียนเร็ว - ทำใน process หลักได้เลย (ชื่อเดียวกับ report ต่างนามสกุล)
+        with reporter.stage('export_files', rows=result['missing_count'] + result['extra_count']):
+            summary['exports'] = ';'.join(write_export_files(result, export, path.with_suffix('')))
+
+    summary.update({
+        'status': result_status(result),
+        'total_master': result['total_master'],
+        'total_measurement': result['total_measurement'],
+        'matched': result['matched_count'],
+        'missing': result['missing_count'],
+        'extra': result['extra_count'],
+        'potential_typos': result['missing_priority'][PRIORITY_HIGH],
+        'match_percentage': result['match_percentage']
+    })
+
+
+def run_batch(pairs, out_dir, fuzzy_mode=MODE_EXACT, workers=1, report_workers=1, store=None,
+              top_k=FUZZY_TOP_K, export=()):
+    """เปรียบเทียบทุกคู่ แล้วเขียน Excel report (ขนานกันด้วย process pool)
+
+    คืนค่า list ของ summary dict ต่อคู่
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    reporter = ConsoleReporter()
+    masters = {}
+    summaries = []
+    pending = []
+
+    report_pool = None
+    if report_workers > 1:
+        report_pool = ProcessPoolExecutor(max_workers=report_workers,
+                                          mp_context=multiprocessing.get_context('spawn'))
+
+    try:
+        for pair_no, (master_path, measurement_path) in enumerate(pairs, 1):
+            logger.info("[%d/%d] %s vs %s", pair_no, len(pairs), master_path, measurement_path)
+            start = time.perf_counter()
+            summary = {
+                'master': str(master_path),
+                'measurement': str(measurement_path),
+                'status': 'ERROR',
+                'report': ''
+            }
+            summaries.append(summary)
+            # log เวลาของแต่ละ stage เป็น JSON (event: pipeline_stage)
+            reporter.stats = PipelineStats(label=f"{Path(master_path).name} vs {Path(measurement_path).name}")
+
+            try:
+                compare_pair(master_path, measurement_path, out_dir, masters, summary, pending, report_pool,
+                             fuzzy_mode, workers, reporter, store, top_k, export)
+            except OSError as e:
+                logger.error("Cannot open file: %s", e)
+                continue
+            except Exception as e:
+                logger.error("Comparison failed: %s", e, exc_info=e)
+                continue
+
+            summary['seconds'] = round(time.perf_counter() - start, 2)
+
+        for summary, future in pending:
+            try:
+                summary['report'] = future.result()
+            except Exception as e:
+                logger.error("Failed to write report for %s: %s", summary['measurement'], e)
+                summary['status'] = 'ERROR'
+    finally:
+        if report_pool is not None:
+            report_pool.shutdown()
+
+    return summaries
+
+
+def write_summary(summaries, path):
+    """เขียนสรุปผลทุกคู่เป็น CSV"""
+    fields = ['master', 'measurement', 'status', 'total_master', 'total_measurement', 'matched',
+              'missing', 'extra', 'potential_typos', 'match_percentage', 'seconds', 'report', 'exports']
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, restval='')
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Slider Data Comparison Tool - batch mode")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--pairs', help="CSV file with 'master' and 'measurement' columns")
+    source.add_argument('--master', help="Master file compared against every --measurement file")
+    parser.add_argument('--measurement', nargs='+', default=[], help="Measurement file(s) for --master")
+    parser.add_argument('--out-dir', default='reports', help="Folder for Excel reports (default: reports)")
+    parser.add_argument('--mode', choices=MATCH_MODES, default=MODE_EXACT, help="Fuzzy matching mode")
+    parser.add_argument('--top-k', type=int, default=FUZZY_TOP_K,
+                        help=f"Closest candidates listed per unmatched serial (default: {FUZZY_TOP_K})")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes for fuzzy matching (default: CPU count)")
+    parser.add_argument('--report-workers', type=int, default=2,
+                        help="Worker processes for writing Excel reports (default: 2)")
+    parser.add_argument('--export', nargs='+', choices=list(EXPORT_FORMATS), default=[],
+                        help="Also write the result table as Parquet, Arrow IPC and/or gzipped CSV next to each report")
+    parser.add_argument('--master-store', metavar='DIR',
+                        help="Load masters saved in DIR (shared with the web UI) and save new ones there")
+    args = parser.parse_args(argv)
+    if args.master and not args.measurement:
+        parser.error("--master requires at least one --measurement file")
+    unavailable = [fmt for fmt in args.export if fmt not in export_formats()]
+    if unavailable:
+        parser.error(f"--export {' '.join(unavailable)} needs pyarrow (pip install pyarrow)")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    if args.pairs:
+        pairs = read_pairs(args.pairs)
+    else:
+        pairs = [(Path(args.master), Path(path)) for path in args.measurement]
+
+    store = MasterStore(args.master_store) if args.master_store else None
+    summaries = run_batch(pairs, args.out_dir, fuzzy_mode=args.mode, workers=args.workers,
+                          report_workers=args.report_workers, store=store, top_k=args.top_k, export=args.export)
+
+    summary_path = Path(args.out_dir) / 'batch_summary.csv'
+    write_summary(summaries, summary_path)
+
+    failed = sum(1 for s in summaries if s['status'] == 'ERROR')
+    logger.info("Done: %d pair(s), %d failed - summary: %s", len(summaries), failed, summary_path)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # exe จาก PyInstaller: worker ของ process pool (spawn) ต้องไม่รัน main() ซ้ำ
+    multiprocessing.freeze_support()
+    sys.exit(main())
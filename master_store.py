@@ -0,0 +1,115 @@
+"""
+Master store - เก็บ master ที่ parse แล้วเป็น index บน disk (key คือ hash ของเนื้อหาไฟล์)
+โหลดกลับผ่าน memory map ได้ทันทีโดยไม่ต้อง parse หรือสร้าง fuzzy index ใหม่ ใช้ร่วมกันทุก session
+"""
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from fuzzy_match import MODE_EXACT, SerialMatchIndex, SerialSet, build_match_index
+from slider_core import PARSER_OPTIONS
+
+# ตำแหน่ง store - กำหนดเองได้ด้วย environment variable SLIDER_MASTER_STORE
+DEFAULT_STORE_DIR = Path(os.environ.get('SLIDER_MASTER_STORE', Path.home() / '.slider_tool' / 'masters'))
+MASTER_META_FILE = 'master.json'
+
+
+class StoredMaster:
+    """Master ที่ save ไว้ใน store - มี name เหมือนไฟล์ที่ upload และ digest ของเนื้อหาไฟล์เดิม"""
+
+    def __init__(self, store, meta):
+        self.store = store
+        self.digest = meta['digest']
+        self.name = meta['name']
+        self.source = meta['source']
+        self.count = meta['count']
+        self.saved_at = meta['saved_at']
+
+    def load(self, mode=MODE_EXACT):
+        return self.store.load(self.digest, mode)
+
+    def label(self):
+        return f"{self.name} - {self.count:,} serials (saved {self.saved_at})"
+
+
+class MasterStore:
+    """Directory ของ master ที่ save ไว้: <root>/<digest>/ มี master.json + ไฟล์ index (.npy)"""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = Path(root)
+
+    def _path(self, digest):
+        return self.root / digest
+
+    def _meta(self, digest):
+        try:
+            meta = json.loads((self._path(digest) / MASTER_META_FILE).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        # master ที่ parse ด้วย option ต่างจากปัจจุบันถือว่าไม่มี
+        if meta.get('parser_options') != list(PARSER_OPTIONS):
+            return None
+        return meta
+
+    def get(self, digest):
+        """StoredMaster ของ digest นี้ หรือ None ถ้ายังไม่ได้ save"""
+        meta = self._meta(digest)
+        return StoredMaster(self, meta) if meta else None
+
+    def list(self):
+        """master ทั้งหมดใน store เรียงจาก save ล่าสุด"""
+        if not self.root.is_dir():
+            return []
+        masters = [self.get(path.name) for path in self.root.iterdir()
+                   if path.is_dir() and not path.name.startswith('.')]
+        return sorted((m for m in masters if m is not None), key=lambda m: m.saved_at, reverse=True)
+
+    def save(self, digest, name, serials, source):
+        """สร้าง fuzzy index แล้วเขียนลง store - คืนค่า StoredMaster
+
+        เขียนลง directory ชั่วคราวก่อนแล้ว rename จึงไม่มี session ไหนเห็น index ที่เขียนไม่ครบ
+        """
+        existing = self.get(digest)
+        if existing is not None:
+            return existing
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / f".tmp-{uuid.uuid4().hex}"
+        try:
+            build_match_index(serials).save(tmp_path)
+            (tmp_path / MASTER_META_FILE).write_text(json.dumps({
+                'digest': digest,
+                'name': name,
+                'source': source,
+                'count': len(serials),
+                'saved_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'parser_options': list(PARSER_OPTIONS)
+            }, ensure_ascii=False), encoding='utf-8')
+
+            final_path = self._path(digest)
+            if final_path.exists():
+                # index เก่าที่ parser option ไม่ตรง (หรือ session อื่น save พร้อมกัน) - ใช้ของใหม่
+                shutil.rmtree(final_path, ignore_errors=True)
+            os.replace(tmp_path, final_path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            existing = self.get(digest)
+            if existing is None:
+                raise
+            return existing
+
+        return self.get(digest)
+
+    def load(self, digest, mode=MODE_EXACT):
+        """โหลด master ที่ save ไว้ - คืนค่า (serials, source, SerialMatchIndex)
+
+        serials เป็น SerialSet บน array เดียวกับ index (memory map ไม่ต้อง copy)
+        """
+        meta = self._meta(digest)
+        if meta is None:
+            raise KeyError(f"Master {digest} is not in the store")
+        index = SerialMatchIndex.load(self._path(digest), mode=mode)
+        return SerialSet.from_sorted(index.candidates.array), meta['source'], index
@@ -0,0 +1,1790 @@
+"""
+Slider comparison core - การอ่านไฟล์, เปรียบเทียบ serial, fuzzy analysis และ Excel report
+ไม่ขึ้นกับ Streamlit ใช้ได้ทั้งจาก web UI (app_streamlit.py) และ command line (main.py)
+"""
+import cProfile
+import difflib
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import marshal
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+from fuzzy_match import (
+    MODE_EDIT,
+    MODE_EXACT,
+    SerialMatchIndex,
+    SerialSet,
+    build_match_index,
+    closest_matches,
+    edit_alignment,
+    match_score,
+    serial_array,
+    similarity_ratio
+)
+
+# ลบ whitespace ทั้งหมด และตัดทุกอย่างตั้งแต่ comma แรก (DOTALL ให้ตัดข้ามบรรทัดได้)
+SERIAL_STRIP_PATTERN = r'(?s)\s+|,.*'
+# ค่าที่มีตัวอักษรนอก ASCII ปกติ (เช่น 'ß', '\v', NBSP) อาจ upper/ตัด whitespace ต่างจาก Python
+SERIAL_UNSAFE_PATTERN = r'[^\x20-\x7e\t\n\r\f]'
+
+# การอ่าน CSV/Excel: จำนวนแถวตัวอย่างสำหรับตรวจจับ column และขนาด chunk (CSV)
+CSV_SAMPLE_ROWS = 1000
+CSV_CHUNK_SIZE = 100_000
+
+# Text master: จำนวนบรรทัดที่ทำความสะอาดพร้อมกันต่อ batch และจำนวนตัวอย่างบรรทัดที่ข้ามที่เก็บไว้แสดง
+TEXT_LINE_BATCH = 100_000
+SKIPPED_SAMPLE_LINES = 20
+# ค่าที่ถือเป็น header (ไม่ใช่ serial) ใน text master
+TEXT_HEADER_WORDS = ('serial', 'slider', 'sn', 'partnumber')
+
+# ตรวจจับ serial column จากข้อมูล: ขึ้นต้นด้วยตัวอักษร 1-3 ตัว ตามด้วยตัวเลขและตัวอักษร รวม 8-17 ตัว
+SERIAL_VALUE_PATTERN = re.compile(r'[A-Z]{1,3}[A-Z0-9]{7,14}$')
+DETECT_SAMPLE_VALUES = 50
+DETECT_MIN_MATCH_RATE = 0.7
+
+# Excel reader: ใช้ python-calamine (Rust) ถ้าติดตั้งไว้ - ไม่มีก็ stream .xlsx ด้วย openpyxl read-only
+EXCEL_ENGINE = 'calamine' if importlib.util.find_spec('python_calamine') else None
+
+# Parquet / Arrow IPC (อ่าน input และ export ผล) ใช้ pyarrow ถ้าติดตั้งไว้ - ไม่มีก็ export ได้เฉพาะ .csv.gz
+ARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+ARROW_EXTENSIONS = ('.parquet', '.arrow', '.feather')
+
+# Export ผลการเปรียบเทียบ: format -> (นามสกุลไฟล์, MIME type)
+EXPORT_FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+    'csv': ('.csv.gz', 'application/gzip')
+}
+
+# นามสกุลที่อ่านได้ (ไม่บีบอัด) ของ master / measurement
+MASTER_EXTENSIONS = ('.txt', '.csv', '.xlsx', '.xls', *ARROW_EXTENSIONS)
+MEASUREMENT_EXTENSIONS = ('.csv', '.xlsx', '.xls', *ARROW_EXTENSIONS)
+# ไฟล์บีบอัด (.gz/.zip/.zst) decompress แบบ stream ระหว่างอ่าน - .zst ใช้ zstandard ถ้าติดตั้งไว้
+ZSTD_AVAILABLE = importlib.util.find_spec('zstandard') is not None
+COMPRESSED_EXTENSIONS = ('.gz', '.zip', '.zst')
+# Text/CSV อ่านตรงจาก stream ส่วน Excel/Parquet/Arrow ต้อง random access จึง decompress ลง memory ก่อน
+STREAMED_EXTENSIONS = ('.txt', '.csv')
+DECOMPRESS_BUFFER_SIZE = 1 << 20
+
+# Excel report: สไตล์ header เหมือน pandas.to_excel
+REPORT_HEADER_FONT = Font(bold=True)
+REPORT_HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'),
+                              top=Side(style='thin'), bottom=Side(style='thin'))
+REPORT_HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+# Fuzzy analysis: similarity ขั้นต่ำที่ถือว่าใกล้เคียง และที่ถือว่าน่าจะพิมพ์ผิด
+SIMILAR_CUTOFF = 0.5
+POTENTIAL_MATCH_CUTOFF = 0.8
+# จำนวน candidate ที่ใกล้ที่สุดที่แสดงต่อ serial (อันดับ 2 เป็นต้นไปอยู่ใน other_matches)
+FUZZY_TOP_K = 3
+
+# Priority ของ missing/extra แต่ละตัวตาม similarity %: ≥80 HIGH, 50-79 MEDIUM, <50 (ไม่พบ) LOW
+PRIORITY_HIGH = 'HIGH'
+PRIORITY_MEDIUM = 'MEDIUM'
+PRIORITY_LOW = 'LOW'
+PRIORITY_DTYPE = pd.CategoricalDtype([PRIORITY_LOW, PRIORITY_MEDIUM, PRIORITY_HIGH], ordered=True)
+PRIORITY_BINS = [-float('inf'), 50, 80, float('inf')]
+
+# option ที่มีผลกับผลการอ่านไฟล์ - เปลี่ยนค่าเหล่านี้แล้ว cache เดิมจะไม่ถูกใช้
+PARSER_OPTIONS = ('utf-8-sig', CSV_SAMPLE_ROWS, EXCEL_ENGINE)
+
+# stage ที่เก็บ cProfile เมื่อเปิด profile_fuzzy
+FUZZY_STAGES = ('fuzzy_missing', 'fuzzy_extra')
+
+logger = logging.getLogger('slider_tool')
+
+
+class PipelineStats:
+    """บันทึก wall time, CPU time, จำนวน rows และ peak memory ของแต่ละ stage ในการเปรียบเทียบหนึ่งครั้ง
+
+    - CPU time นับเฉพาะ thread ที่รัน stage (ไม่รวม worker process ของ fuzzy matching)
+    - peak memory วัดด้วย tracemalloc เมื่อ trace_memory=True (ช้าลงระหว่างวัด และนับรวมทุก thread)
+    - profile_fuzzy=True เก็บ cProfile ของ fuzzy stages (เฉพาะงานที่รันใน process หลัก)
+
+    ทุก stage ถูก log เป็น JSON หนึ่งบรรทัดผ่าน logger 'slider_tool'
+    """
+
+    def __init__(self, label='', trace_memory=False, profile_fuzzy=False):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.label = label
+        self.trace_memory = trace_memory
+        self.profile_fuzzy = profile_fuzzy
+        self.stages = []
+        self._depth = 0
+        self._memory_frames = []
+        self._started_tracing = False
+        self._profiler = None
+
+    @contextmanager
+    def stage(self, name, rows=0, detail=''):
+        """วัด stage หนึ่ง - yield record dict ที่แก้ rows ได้ระหว่างทำงาน (stage ซ้อนกันได้)"""
+        record = {'stage': name, 'detail': detail, 'depth': self._depth, 'rows': rows,
+                  'wall_s': 0.0, 'cpu_s': 0.0, 'peak_mb': None}
+        self.stages.append(record)
+        self._depth += 1
+        frame = self._start_memory()
+        profiling = self._start_profile(name)
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            self._depth -= 1
+            record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+            record['cpu_s'] = round(time.thread_time() - cpu_start, 4)
+            if profiling:
+                self._profiler.disable()
+            if frame is not None:
+                record['peak_mb'] = self._stop_memory(frame)
+            logger.info(json.dumps({'event': 'pipeline_stage', 'run_id': self.run_id, 'label': self.label,
+                                    **record}, ensure_ascii=False))
+
+    def _start_memory(self):
+        if not self.trace_memory:
+            return None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        current, peak = tracemalloc.get_traced_memory()
+        # เก็บ peak ของ stage ชั้นนอกไว้ก่อน reset (stage ซ้อน)
+        if self._memory_frames:
+            parent = self._memory_frames[-1]
+            parent['peak'] = max(parent['peak'], peak)
+        tracemalloc.reset_peak()
+
+        frame = {'start': current, 'peak': current}
+        self._memory_frames.append(frame)
+        return frame
+
+    def _stop_memory(self, frame):
+        self._memory_frames.pop()
+        frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+        if self._memory_frames:
+            parent = self._memory_frames[-1]
+            parent['peak'] = max(parent['peak'], frame['peak'])
+        elif self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return round((frame['peak'] - frame['start']) / 1024 / 1024, 2)
+
+    def _start_profile(self, name):
+        if not self.profile_fuzzy or name not in FUZZY_STAGES:
+            return False
+        if self._profiler is None:
+            self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError as e:
+            # มี profiler อื่นทำงานอยู่ใน process (เช่นอีก session)
+            logger.warning("cProfile not started for %s: %s", name, e)
+            return False
+        return True
+
+    def profile_data(self):
+        """ผล cProfile เป็น bytes ในรูปแบบไฟล์ .prof (เปิดด้วย pstats หรือ snakeviz) - None ถ้าไม่ได้ profile"""
+        if self._profiler is None:
+            return None
+        self._profiler.create_stats()
+        return marshal.dumps(self._profiler.stats)
+
+    def total_seconds(self):
+        return round(sum(r['wall_s'] for r in self.stages if r['depth'] == 0), 4)
+
+
+@contextmanager
+def _unrecorded_stage(name, rows=0, detail=''):
+    yield {'stage': name, 'detail': detail, 'rows': rows}
+
+
+class Reporter:
+    """รับข้อความสถานะจาก core - UI แต่ละแบบ (Streamlit, console) override method ที่ต้องการ
+
+    ค่า default ไม่แสดงอะไรเลย ถ้ากำหนด stats (PipelineStats) จะบันทึกเวลาของแต่ละ stage ด้วย
+    """
+
+    stats = None
+
+    def stage(self, name, rows=0, detail=''):
+        """context manager สำหรับวัด stage - ไม่มี stats ก็แค่ไม่บันทึก"""
+        if self.stats is None:
+            return _unrecorded_stage(name, rows, detail)
+        return self.stats.stage(name, rows, detail)
+
+    def write(self, message):
+        pass
+
+    def info(self, message):
+        pass
+
+    def success(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message):
+        pass
+
+    def exception(self, exc):
+        pass
+
+    def details(self, title, lines, limit=20):
+        """รายการยาว (เช่นบรรทัดที่ข้าม) - แสดงแค่ limit บรรทัดแรก"""
+        pass
+
+    def progress(self, label, done, total):
+        pass
+
+
+class LocalFile(io.BytesIO):
+    """ไฟล์จาก disk ที่มี interface เดียวกับ Streamlit UploadedFile (name, size, getvalue)"""
+
+    def __init__(self, path):
+        path = Path(path)
+        super().__init__(path.read_bytes())
+        self.name = path.name
+        self.path = path
+        self.size = len(self.getbuffer())
+
+
+def clean_serial(serial):
+    """ทำความสะอาด serial number"""
+    if not serial or pd.isna(serial):
+        return ""
+
+    serial_str = str(serial).strip().upper()
+
+    # ลบ whitespace ส่วนเกิน
+    serial_str = re.sub(r'\s+', '', serial_str)
+
+    # แยก suffix ออก (ถ้ามี comma)
+    if ',' in serial_str:
+        serial_str = serial_str.split(',')[0].strip()
+
+    # เอา 10 ตัวแรก
+    return serial_str[:10] if len(serial_str) >= 8 else serial_str
+
+
+def clean_serial_series(series):
+    """ทำความสะอาด serial ทั้ง column ในครั้งเดียว (กฎเดียวกับ clean_serial)
+
+    คืนค่า set ของ serial ที่ไม่ซ้ำกัน โดยตัดค่าที่สั้นกว่า 8 ตัวอักษรทิ้ง
+    """
+    values = series.dropna().astype(str)
+    unsafe = values.str.contains(SERIAL_UNSAFE_PATTERN, regex=True)
+
+    cleaned = (
+        values[~unsafe]
+        .str.upper()
+        .str.replace(SERIAL_STRIP_PATTERN, '', regex=True)
+    )
+    cleaned = cleaned[cleaned.str.len() >= 8].str[:10]
+    serials = set(cleaned.unique())
+
+    # ค่าพิเศษ (พบน้อยมาก) ใช้ clean_serial ซึ่งเป็น reference implementation
+    if unsafe.any():
+        serials.update(s for s in map(clean_serial, values[unsafe]) if len(s) >= 8)
+
+    return serials
+
+
+def serial_column_values(column):
+    """ค่าของ serial column ในรูปเดียวกับข้อความในไฟล์ CSV (อ่านด้วย dtype=str)
+
+    column ตัวเลขที่มี cell ว่าง pandas/pyarrow อ่านเป็น float - เลขจำนวนเต็มแปลงกลับเป็น int
+    เพื่อให้ได้ '12345678' ไม่ใช่ '12345678.0' เหมือนกันทุกชนิดไฟล์
+    """
+    if column.dtype.kind != 'f':
+        return column
+    integral = np.isfinite(column) & (column % 1 == 0) & (column.abs() < 2 ** 53)
+    values = column.astype(object)
+    values[integral] = column[integral].astype('int64').astype(object)
+    return values
+
+
+def detect_serial_column(df, reporter=None):
+    """ตรวจจับ column ที่มี serial number"""
+    reporter = reporter or Reporter()
+
+    with reporter.stage('detect_column', rows=len(df)):
+        # Keywords ที่บ่งบอกว่าเป็น serial column
+        serial_keywords = ['serial', 'slider', 'sn', 'part', 'number']
+        exclude_keywords = ['probe', 'date', 'time', 'tester', 'result', 'status']
+
+        reporter.write("🔍 **Detecting serial column...**")
+
+        # วิธีที่ 1: ตรวจสอบจาก column name
+        for idx, col in enumerate(df.columns):
+            col_lower = str(col).lower()
+
+            # ข้าม column ที่มี exclude keywords
+            if any(ex in col_lower for ex in exclude_keywords):
+                continue
+
+            # ตรวจสอบ serial keywords
+            if any(kw in col_lower for kw in serial_keywords):
+                reporter.success(f"✅ Found serial column: **{col}** (Column {idx})")
+                return idx, col
+
+        # วิธีที่ 2: ตรวจสอบจาก pattern ของข้อมูล
+        reporter.info("🔍 No keyword match, analyzing data patterns...")
+
+        for idx, col in enumerate(df.columns):
+            match_rate = _serial_match_rate(df.iloc[:, idx])
+            if match_rate is None:
+                continue
+
+            reporter.write(f"  - Column {idx} ({col}): {match_rate * 100:.1f}% match rate")
+
+            # ถ้าตรงกับ pattern มากกว่า 70% ถือว่าเป็น serial column (ไม่ต้องดู column ที่เหลือ)
+            if match_rate >= DETECT_MIN_MATCH_RATE:
+                reporter.success(f"✅ Detected serial column: **{col}** (Column {idx}) - {match_rate * 100:.1f}% pattern match")
+                return idx, col
+
+        # ถ้าไม่เจอ ใช้ column 0 หรือ column ที่ user เลือก
+        reporter.warning("⚠️ Could not auto-detect serial column, using first column")
+        return 0, df.columns[0]
+
+
+def _serial_match_rate(column):
+    """สัดส่วนของค่า 50 ค่าแรก (ที่ไม่ว่าง) ที่ตรงกับ SERIAL_VALUE_PATTERN - None ถ้า column ว่าง
+
+    ใช้ object dtype เพื่อให้ strip/upper ทำงานแบบ Python str ทุกประการ
+    """
+    sample = column.dropna().head(DETECT_SAMPLE_VALUES).astype(str).astype(object)
+    if len(sample) == 0:
+        return None
+
+    values = sample.str.strip().str.upper().str.split(',', n=1).str[0]
+    return values.str.match(SERIAL_VALUE_PATTERN).sum() / len(sample)
+
+
+def find_closest_match(target, candidates, cutoff=0.6):
+    """หา serial ที่ใกล้เคียงที่สุด
+
+    candidates เป็น SerialMatchIndex (ค้นผ่าน index) หรือ list (scan ด้วย difflib แบบเดิม)
+    """
+    if not candidates:
+        return None, 0.0
+
+    if isinstance(candidates, SerialMatchIndex):
+        matches = candidates.closest(target, cutoff=cutoff, n=1)
+        return matches[0] if matches else (None, 0.0)
+
+    matches = difflib.get_close_matches(target, candidates, n=1, cutoff=cutoff)
+    if matches:
+        match = matches[0]
+        return match, similarity_ratio(target, match)
+    return None, 0.0
+
+
+def highlight_diff(s1, s2):
+    """แสดงความแตกต่างระหว่าง 2 strings"""
+    diff = []
+    max_len = max(len(s1), len(s2))
+    s1_padded = s1.ljust(max_len)
+    s2_padded = s2.ljust(max_len)
+
+    for i in range(max_len):
+        if i < len(s1) and i < len(s2):
+            if s1[i] == s2[i]:
+                diff.append('✓')
+            else:
+                diff.append('✗')
+        else:
+            diff.append('✗')
+    return ''.join(diff)
+
+
+def get_char_differences(s1, s2):
+    """หาตำแหน่งที่ตัวอักษรต่างกัน"""
+    differences = []
+    max_len = max(len(s1), len(s2))
+    s1_padded = s1.ljust(max_len, ' ')
+    s2_padded = s2.ljust(max_len, ' ')
+
+    for i in range(max_len):
+        if s1_padded[i] != s2_padded[i]:
+            differences.append(f"Pos{i + 1}: '{s1_padded[i].strip()}' → '{s2_padded[i].strip()}'")
+
+    return ' | '.join(differences) if differences else 'No differences'
+
+
+def alignment_differences(s1, s2):
+    """diff pattern (✓/✗) และข้อความ "PosN: 'a' → 'b'" จาก edit alignment ในรอบเดียว
+
+    ต่างจาก highlight_diff/get_char_differences ที่เทียบตามตำแหน่ง: ตัวอักษรที่แทรก/หายไป
+    เป็น ✗ ตัวเดียว ไม่ทำให้ตัวถัดไปทั้งหมดเป็น ✗ - N คือลำดับใน alignment (ตรงกับตำแหน่งใน pattern)
+    alignment เป็น DP อีกรอบแยกจากการค้นหา (ตั้งใจ - ทำเฉพาะคู่ที่ชนะ ดู edit_alignment)
+    """
+    pattern = []
+    differences = []
+    for pos, (a, b) in enumerate(edit_alignment(s1, s2), 1):
+        if a == b:
+            pattern.append('✓')
+        else:
+            pattern.append('✗')
+            differences.append(f"Pos{pos}: '{a}' → '{b}'")
+    return ''.join(pattern), ' | '.join(differences) if differences else 'No differences'
+
+
+class LRUCache:
+    """LRU cache แบบ thread-safe จำกัดขนาดด้วยน้ำหนักรวมของ entries
+
+    weigher(value) คืนค่าน้ำหนักของแต่ละ entry (เช่นจำนวน serial)
+    """
+
+    def __init__(self, max_weight, max_entries=None, weigher=lambda value: 1):
+        self.max_weight = max_weight
+        self.max_entries = max_entries
+        self.weigher = weigher
+        self.total_weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        weight = self.weigher(value)
+        with self._lock:
+            if key in self._entries:
+                self.total_weight -= self._entries.pop(key)[1]
+            # entry ที่ใหญ่เกิน cache ทั้งหมดไม่ต้องเก็บ
+            if weight > self.max_weight:
+                return
+            self._entries[key] = (value, weight)
+            self.total_weight += weight
+
+            while (self.total_weight > self.max_weight or
+                   (self.max_entries is not None and len(self._entries) > self.max_entries)):
+                _, (_, evicted_weight) = self._entries.popitem(last=False)
+                self.total_weight -= evicted_weight
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_weight = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'weight': self.total_weight,
+                'max_weight': self.max_weight,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+def file_digest(uploaded_file):
+    """Hash ของเนื้อหาไฟล์ (ไม่ copy bytes ทั้งไฟล์)"""
+    with uploaded_file.getbuffer() as view:
+        return hashlib.blake2b(view, digest_size=16).hexdigest()
+
+
+def compressed_extensions():
+    """นามสกุลไฟล์บีบอัดที่อ่านได้ในเครื่องนี้ (.zst ต้องมี zstandard)"""
+    return [ext for ext in COMPRESSED_EXTENSIONS if ZSTD_AVAILABLE or ext != '.zst']
+
+
+def is_compressed(uploaded_file):
+    """ไฟล์บีบอัด (.gz/.zip/.zst) หรือ member ที่เลือกจาก .zip (มี attribute member)"""
+    return (getattr(uploaded_file, 'member', None) is not None
+            or Path(uploaded_file.name).suffix.lower() in COMPRESSED_EXTENSIONS)
+
+
+def archive_members(uploaded_file, extensions=MASTER_EXTENSIONS):
+    """ชื่อไฟล์ใน .zip ที่อ่านได้ (นามสกุลอยู่ใน extensions) ตามลำดับใน archive - อ่านแค่ central directory"""
+    with zipfile.ZipFile(io.BytesIO(uploaded_file.getvalue())) as archive:
+        return [info.filename for info in archive.infolist()
+                if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+                and Path(info.filename).suffix.lower() in extensions]
+
+
+class DecompressedFile(io.RawIOBase):
+    """เนื้อหาของไฟล์บีบอัดเป็น stream ที่ decompress ระหว่างอ่าน (ไม่เขียน temp file)
+
+    name คือชื่อไฟล์ข้างใน (เช่น lot1.csv) ใช้เลือก reader - seek ย้อนหลังเปิด stream ใหม่แล้วอ่านข้ามไป
+    (reader อ่านตัวอย่างก่อนแล้ว seek(0) อ่านทั้งไฟล์ จึง decompress ส่วนหัวซ้ำแค่ครั้งเดียว)
+    """
+
+    def __init__(self, name, opener):
+        super().__init__()
+        self.name = name
+        self._opener = opener
+        self._stream = opener()
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._stream.readinto(buffer)
+        self._position += count
+        return count
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Compressed streams can't seek from the end")
+        if offset < self._position:
+            self._stream.close()
+            self._stream = self._opener()
+            self._position = 0
+        while self._position < offset:
+            skipped = len(self._stream.read(min(offset - self._position, DECOMPRESS_BUFFER_SIZE)))
+            if not skipped:
+                break
+            self._position += skipped
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+
+def _decompressor(uploaded_file, extensions):
+    """(ชื่อไฟล์ข้างใน, ฟังก์ชันเปิด stream ใหม่) ของไฟล์บีบอัด"""
+    data = uploaded_file.getvalue()
+    member = getattr(uploaded_file, 'member', None)
+    file_ext = '.zip' if member is not None else Path(uploaded_file.name).suffix.lower()
+
+    if file_ext == '.gz':
+        return Path(uploaded_file.name).stem, lambda: gzip.GzipFile(fileobj=io.BytesIO(data))
+
+    if file_ext == '.zst':
+        if not ZSTD_AVAILABLE:
+            raise ValueError(".zst files need zstandard (pip install zstandard)")
+        import zstandard
+        return Path(uploaded_file.name).stem, lambda: zstandard.ZstdDecompressor().stream_reader(
+            io.BytesIO(data), read_across_frames=True)
+
+    if member is None:
+        # ไม่ได้เลือก member - ใช้ได้เมื่อมีไฟล์ที่อ่านได้ไฟล์เดียว
+        members = archive_members(uploaded_file, extensions)
+        if len(members) != 1:
+            raise ValueError(f"{uploaded_file.name} contains {len(members)} readable files"
+                             + (f" - select one of: {', '.join(members)}" if members else ""))
+        member = members[0]
+    return member, lambda: zipfile.ZipFile(io.BytesIO(data)).open(member)
+
+
+def open_upload(uploaded_file, extensions=MASTER_EXTENSIONS):
+    """file-like ที่ reader อ่านได้ - ไฟล์ไม่บีบอัดคืนตัวเดิม
+
+    .gz/.zst ใช้ชื่อไฟล์ข้างในจากนามสกุลก่อนหน้า (lot1.csv.gz -> lot1.csv) ส่วน .zip ใช้ member ที่เลือก
+    Text/CSV ได้ stream ที่ decompress ระหว่างอ่าน ส่วน Excel/Parquet/Arrow decompress ลง memory
+    """
+    if not is_compressed(uploaded_file):
+        return uploaded_file
+    name, opener = _decompressor(uploaded_file, extensions)
+    if Path(name).suffix.lower() not in extensions:
+        raise ValueError(f"Unsupported file format inside {uploaded_file.name}: {name}")
+    stream = io.BufferedReader(DecompressedFile(name, opener), buffer_size=DECOMPRESS_BUFFER_SIZE)
+    if Path(name).suffix.lower() in STREAMED_EXTENSIONS:
+        return stream
+    with stream:
+        content = io.BytesIO(stream.read())
+    content.name = name
+    return content
+
+
+class SkippedLines:
+    """บรรทัดที่ข้ามตอนอ่าน text master: เก็บจำนวนแยกตามเหตุผล + ตัวอย่างไม่เกิน limit บรรทัดแรก
+
+    len() คือจำนวนทั้งหมด ส่วน slice ได้เฉพาะตัวอย่าง - ส่งให้ Reporter.details แทน list ได้เลย
+    """
+
+    def __init__(self, limit=SKIPPED_SAMPLE_LINES):
+        self.limit = limit
+        self.sample = []
+        self.reasons = {}
+
+    def count(self, reason, count):
+        if count:
+            self.reasons[reason] = self.reasons.get(reason, 0) + count
+
+    @property
+    def room(self):
+        """จำนวนตัวอย่างที่ยังเก็บเพิ่มได้"""
+        return self.limit - len(self.sample)
+
+    def add_sample(self, line_num, line, reason):
+        if self.room > 0:
+            self.sample.append(f"Line {line_num}: '{line.strip()}' ({reason})")
+
+    def summary(self):
+        return ', '.join(f"{count} {reason}" for reason, count in self.reasons.items())
+
+    def __len__(self):
+        return sum(self.reasons.values())
+
+    def __getitem__(self, index):
+        return self.sample[index]
+
+
+def _clean_serial_lines(lines):
+    """clean_serial ของทุกบรรทัดใน batch (Series ของ str) - ไม่ตัดค่าที่สั้นทิ้ง (ใช้แยกบรรทัดที่ข้าม)
+
+    กฎเดียวกับ clean_serial_series: ค่าที่มีตัวอักษรพิเศษใช้ clean_serial ทีละค่า
+    """
+    unsafe = lines.str.contains(SERIAL_UNSAFE_PATTERN, regex=True)
+    cleaned = lines.str.upper().str.replace(SERIAL_STRIP_PATTERN, '', regex=True)
+    cleaned = cleaned.where(cleaned.str.len() < 8, cleaned.str[:10])
+    # ค่าพิเศษ (พบน้อยมาก) ใช้ clean_serial ซึ่งเป็น reference implementation
+    if unsafe.any():
+        cleaned[unsafe] = lines[unsafe].map(clean_serial)
+    return cleaned
+
+
+def read_text_serials(uploaded_file, reporter):
+    """อ่าน serial จาก text file (หนึ่ง serial ต่อบรรทัด) แบบ stream
+
+    decode ทีละส่วน (TextIOWrapper = incremental decoder บน buffer ของไฟล์) แล้วทำความสะอาดทีละ batch
+    ของบรรทัด บรรทัดที่ข้ามเก็บแค่จำนวน + ตัวอย่าง - memory ไม่ขึ้นกับจำนวนบรรทัด (นอกจาก serial ที่ได้)
+    คืนค่า (serials, จำนวนบรรทัด, SkippedLines)
+    """
+    uploaded_file.seek(0)
+    # newline='\n' แยกบรรทัดที่ '\n' เท่านั้น ('\r' ท้ายบรรทัดถูกตัดตอนทำความสะอาด)
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', errors='ignore', newline='\n')
+    batches = []  # serial ของแต่ละ batch เป็น array ขนาดกะทัดรัด - รวมด้วยการ sort ครั้งเดียวตอนจบ
+    skipped = SkippedLines()
+    line_count = 0
+    last_line = ''
+    try:
+        while True:
+            batch = list(islice(text, TEXT_LINE_BATCH))
+            if not batch:
+                break
+            lines = pd.Series(batch, dtype=str, index=range(line_count + 1, line_count + len(batch) + 1))
+            cleaned = _clean_serial_lines(lines)
+
+            # กรองบรรทัดว่าง, สั้นเกินไป, header
+            length = cleaned.str.len()
+            too_short = (length > 0) & (length < 8)
+            header = (length >= 8) & cleaned.str.lower().isin(TEXT_HEADER_WORDS)
+            skipped.count('too short', int(too_short.sum()))
+            skipped.count('header', int(header.sum()))
+            for line_num, line in lines[too_short | header].head(skipped.room).items():
+                skipped.add_sample(line_num, line, 'header' if header[line_num] else 'too short')
+
+            batches.append(serial_array(cleaned[(length >= 8) & ~header].drop_duplicates().tolist()))
+            line_count += len(batch)
+            last_line = batch[-1]
+    finally:
+        # ไม่ให้ TextIOWrapper ปิดไฟล์ที่ upload ไปด้วย
+        text.detach()
+
+    # นับบรรทัดแบบ split('\n') - บรรทัดว่างหลัง newline สุดท้าย (หรือไฟล์ว่าง) นับเป็นหนึ่งบรรทัด
+    if not last_line or last_line.endswith('\n'):
+        line_count += 1
+    serials = SerialSet.from_arrays(batches)
+
+    reporter.write(f"  - Lines: {line_count:,} (streamed in batches of {TEXT_LINE_BATCH:,} lines)")
+
+    return serials, line_count, skipped
+
+
+def read_csv_serials(uploaded_file, reporter, serial_column=None):
+    """อ่าน serial จาก CSV แบบ chunk โดยโหลดเฉพาะ serial column
+
+    อ่าน header + ตัวอย่างข้อมูลเพื่อหา serial column ก่อน แล้วค่อยอ่านทั้งไฟล์
+    ทีละ chunk เฉพาะ column นั้น - memory สูงสุดขึ้นกับขนาด chunk ไม่ใช่ขนาดไฟล์
+    serial_column (index) กำหนดได้เมื่อรู้ column อยู่แล้ว (ไม่ต้องตรวจจับใหม่)
+    คืนค่า (serials เป็น SerialSet, ชื่อ column, จำนวนแถวที่อ่าน)
+    """
+    uploaded_file.seek(0)
+    sample = pd.read_csv(uploaded_file, encoding='utf-8-sig', nrows=CSV_SAMPLE_ROWS)
+    reporter.write(f"  - Columns: {', '.join(map(str, sample.columns.tolist()))}")
+
+    # ตรวจจับ serial column จากตัวอย่าง
+    if serial_column is None:
+        serial_col_idx, serial_col_name = detect_serial_column(sample, reporter)
+    else:
+        serial_col_idx, serial_col_name = serial_column, sample.columns[serial_column]
+
+    # อ่านเฉพาะ serial column ทีละ chunk
+    uploaded_file.seek(0)
+    batches = []  # serial ของแต่ละ chunk - รวมด้วยการ sort ครั้งเดียวตอนจบ (ไม่ merge ผลรวมใหม่ทุก chunk)
+    total_rows = 0
+    with pd.read_csv(uploaded_file, encoding='utf-8-sig', usecols=[serial_col_idx],
+                     dtype=str, chunksize=CSV_CHUNK_SIZE) as reader:
+        for chunk in reader:
+            total_rows += len(chunk)
+            batches.append(serial_array(clean_serial_series(chunk.iloc[:, 0])))
+    serials = SerialSet.from_arrays(batches)
+
+    reporter.write(f"  - Shape: {total_rows} rows × {sample.shape[1]} columns "
+                   f"(read 1 column in chunks of {CSV_CHUNK_SIZE:,} rows)")
+
+    return serials, serial_col_name, total_rows
+
+
+def _excel_cell_value(cell):
+    """แปลงค่า cell แบบเดียวกับ openpyxl reader ของ pandas (ว่าง -> '', error -> NaN, เลขจำนวนเต็ม -> int)"""
+    if cell.value is None:
+        return ''
+    if cell.data_type == TYPE_ERROR:
+        return float('nan')
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+def _excel_frame(rows):
+    """DataFrame จากแถวที่แปลงค่าแล้ว - ตัด/เติม cell ว่างและส่งผ่าน TextParser แบบเดียวกับ pd.read_excel"""
+    data = []
+    last_row_with_data = -1
+    for row_number, row in enumerate(rows):
+        row = list(row)
+        while row and row[-1] == '':
+            row.pop()
+        if row:
+            last_row_with_data = row_number
+        data.append(row)
+    del data[last_row_with_data + 1:]
+
+    width = max((len(row) for row in data), default=0)
+    data = [row + [''] * (width - len(row)) for row in data]
+    with TextParser(data, header=0, skip_blank_lines=False) as parser:
+        return parser.read()
+
+
+def read_xlsx_serials(uploaded_file, reporter):
+    """อ่าน serial จาก .xlsx แบบ stream ทีละแถว (openpyxl read-only) ในรอบเดียว
+
+    แปลงทุก column เฉพาะแถวตัวอย่าง (ตรวจจับ serial column) แถวที่เหลือแปลงเฉพาะ cell ของ serial column
+    ไม่สร้าง DataFrame ทั้ง sheet - ค่าผ่าน TextParser ตัวเดียวกับ pd.read_excel จึงได้ผลเหมือนเดิม
+    คืนค่า (serials, ชื่อ column, จำนวนแถวที่อ่าน)
+    """
+    uploaded_file.seek(0)
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[0]
+        # dimension ที่บันทึกในไฟล์อาจไม่ถูกต้อง (เหมือนที่ pandas ทำ)
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows()
+
+        # header + ตัวอย่างข้อมูล
+        head = [[_excel_cell_value(cell) for cell in row] for row in islice(rows, CSV_SAMPLE_ROWS + 1)]
+        sample = _excel_frame(head)
+        reporter.write(f"  - Columns: {', '.join(map(str, sample.columns.tolist()))}")
+
+        # ตรวจจับ serial column จากตัวอย่าง
+        serial_col_idx, serial_col_name = detect_serial_column(sample, reporter)
+
+        # แถวที่เหลือ: เก็บเฉพาะ serial column (แถวว่างท้าย sheet ถูกตัดทิ้งเหมือน pandas)
+        data = [[row[serial_col_idx] if serial_col_idx < len(row) else ''] for row in head]
+        last_row_with_data = max((n for n, row in enumerate(head) if any(v != '' for v in row)), default=-1)
+        for row_number, row in enumerate(rows, len(head)):
+            data.append([_excel_cell_value(row[serial_col_idx]) if serial_col_idx < len(row) else ''])
+            if any(cell.value is not None and cell.value != '' for cell in row):
+                last_row_with_data = row_number
+    finally:
+        workbook.close()
+    del data[last_row_with_data + 1:]
+
+    with TextParser(data, header=0, skip_blank_lines=False) as parser:
+        column = parser.read().iloc[:, 0]
+    serials = SerialSet(clean_serial_series(serial_column_values(column)))
+
+    reporter.write(f"  - Shape: {len(column)} rows × {sample.shape[1]} columns (streamed 1 column)")
+
+    return serials, serial_col_name, len(column)
+
+
+def read_excel_serials(uploaded_file, reporter):
+    """อ่าน serial จาก Excel โดยตรวจจับ column จากตัวอย่างก่อน แล้วค่อยอ่านทั้งไฟล์เฉพาะ column นั้น
+
+    .xlsx ใช้ read_xlsx_serials (stream รอบเดียว) ยกเว้นติดตั้ง python-calamine ไว้
+    คืนค่า (serials, ชื่อ column, จำนวนแถวที่อ่าน)
+    """
+    if EXCEL_ENGINE is None and Path(uploaded_file.name).suffix.lower() == '.xlsx':
+        return read_xlsx_serials(uploaded_file, reporter)
+
+    uploaded_file.seek(0)
+    sample = pd.read_excel(uploaded_file, nrows=CSV_SAMPLE_ROWS, engine=EXCEL_ENGINE)
+    reporter.write(f"  - Columns: {', '.join(map(str, sample.columns.tolist()))}")
+
+    # ตรวจจับ serial column จากตัวอย่าง
+    serial_col_idx, serial_col_name = detect_serial_column(sample, reporter)
+
+    # อ่านเฉพาะ serial column
+    uploaded_file.seek(0)
+    column = pd.read_excel(uploaded_file, usecols=[serial_col_idx], engine=EXCEL_ENGINE).iloc[:, 0]
+    serials = SerialSet(clean_serial_series(serial_column_values(column)))
+
+    engine_note = f" with {EXCEL_ENGINE}" if EXCEL_ENGINE else ""
+    reporter.write(f"  - Shape: {len(column)} rows × {sample.shape[1]} columns (read 1 column{engine_note})")
+
+    return serials, serial_col_name, len(column)
+
+
+def read_arrow_serials(uploaded_file, reporter):
+    """อ่าน serial จาก Parquet / Arrow IPC (.arrow, .feather) โดยไม่ต้อง parse ข้อความ
+
+    ตรวจจับ serial column จากแถวตัวอย่างเหมือน CSV แล้วอ่านเฉพาะ column นั้นทีละ batch
+    คืนค่า (serials, ชื่อ column, จำนวนแถวที่อ่าน)
+    """
+    if not ARROW_AVAILABLE:
+        raise ValueError("Parquet/Arrow files need pyarrow (pip install pyarrow)")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    source = pa.BufferReader(uploaded_file.getvalue())
+    if Path(uploaded_file.name).suffix.lower() == '.parquet':
+        parquet = pq.ParquetFile(source)
+        schema = parquet.schema_arrow
+        head = next(parquet.iter_batches(batch_size=CSV_SAMPLE_ROWS), None)
+        sample = (head if head is not None else schema.empty_table()).to_pandas()
+    else:
+        try:
+            table = pa.ipc.open_file(source).read_all()
+        except pa.ArrowInvalid:
+            # Arrow IPC แบบ stream (ไม่มี footer ของ file format)
+            source.seek(0)
+            table = pa.ipc.open_stream(source).read_all()
+        schema = table.schema
+        sample = table.slice(0, CSV_SAMPLE_ROWS).to_pandas()
+    reporter.write(f"  - Columns: {', '.join(map(str, sample.columns.tolist()))}")
+
+    # ตรวจจับ serial column จากตัวอย่าง
+    serial_col_idx, serial_col_name = detect_serial_column(sample, reporter)
+
+    # อ่านเฉพาะ serial column ทีละ batch
+    if Path(uploaded_file.name).suffix.lower() == '.parquet':
+        batches = parquet.iter_batches(batch_size=CSV_CHUNK_SIZE, columns=[schema.names[serial_col_idx]])
+    else:
+        batches = table.select([serial_col_idx]).to_batches(max_chunksize=CSV_CHUNK_SIZE)
+    arrays = []  # serial ของแต่ละ batch - รวมด้วยการ sort ครั้งเดียวตอนจบ
+    total_rows = 0
+    for batch in batches:
+        total_rows += batch.num_rows
+        arrays.append(serial_array(clean_serial_series(serial_column_values(batch.column(0).to_pandas()))))
+    serials = SerialSet.from_arrays(arrays)
+
+    reporter.write(f"  - Shape: {total_rows} rows × {len(schema)} columns (read 1 column, no text parsing)")
+
+    return serials, serial_col_name, total_rows
+
+
+def _arrow_format(file_ext):
+    return 'Parquet' if file_ext == '.parquet' else 'Arrow'
+
+
+def _open_source(uploaded_file, extensions, reporter):
+    """เปิดไฟล์สำหรับ reader - ไฟล์บีบอัดได้ stream ของไฟล์ข้างใน (ชื่อไฟล์ข้างในเลือก reader)"""
+    source = open_upload(uploaded_file, extensions)
+    if source is not uploaded_file:
+        how = 'streamed' if Path(source.name).suffix.lower() in STREAMED_EXTENSIONS else 'in memory'
+        reporter.write(f"  - Decompressing: {source.name} ({how})")
+    return source
+
+
+def read_master_file(uploaded_file, reporter=None):
+    """อ่าน Master file (Text/CSV/Excel/Parquet/Arrow หรือบีบอัดด้วย .gz/.zip/.zst) - คืนค่า (SerialSet, source)"""
+    reporter = reporter or Reporter()
+    with reporter.stage('read_master', detail=uploaded_file.name) as stage:
+        return _read_master_file(uploaded_file, reporter, stage)
+
+
+def _read_master_file(uploaded_file, reporter, stage):
+    reporter.write(f"📄 **Reading Master File:** {uploaded_file.name}")
+
+    source = uploaded_file
+    try:
+        source = _open_source(uploaded_file, MASTER_EXTENSIONS, reporter)
+        file_ext = Path(source.name).suffix.lower()
+
+        if file_ext == '.txt':
+            # อ่าน Text file แบบ stream ทีละ batch ของบรรทัด
+            serials, stage['rows'], skipped = read_text_serials(source, reporter)
+
+            reporter.success(f"✅ Found {len(serials)} valid serials from Text file")
+
+            if skipped:
+                reporter.details(f"⚠️ Skipped {len(skipped)} lines - {skipped.summary()} (click to view)", skipped,
+                                 limit=skipped.limit)
+
+            return serials, "Text File (Line by line)"
+
+        elif file_ext == '.csv':
+            # อ่าน CSV (เฉพาะ serial column ทีละ chunk)
+            serials, serial_col_name, stage['rows'] = read_csv_serials(source, reporter)
+
+            reporter.success(f"✅ Found {len(serials)} valid serials from column '{serial_col_name}'")
+
+            return serials, f"CSV - Column: {serial_col_name}"
+
+        elif file_ext in ['.xlsx', '.xls']:
+            # อ่าน Excel (ตัวอย่างก่อน แล้วเฉพาะ serial column)
+            serials, serial_col_name, stage['rows'] = read_excel_serials(source, reporter)
+
+            reporter.success(f"✅ Found {len(serials)} valid serials from column '{serial_col_name}'")
+
+            return serials, f"Excel - Column: {serial_col_name}"
+
+        elif file_ext in ARROW_EXTENSIONS:
+            # อ่าน Parquet/Arrow (เฉพาะ serial column)
+            serials, serial_col_name, stage['rows'] = read_arrow_serials(source, reporter)
+
+            reporter.success(f"✅ Found {len(serials)} valid serials from column '{serial_col_name}'")
+
+            return serials, f"{_arrow_format(file_ext)} - Column: {serial_col_name}"
+
+        else:
+            reporter.error(f"❌ Unsupported file format: {file_ext}")
+            return SerialSet(), "Unknown"
+
+    except Exception as e:
+        reporter.error(f"❌ Error reading master file: {str(e)}")
+        reporter.exception(e)
+        return SerialSet(), "Error"
+
+    finally:
+        if source is not uploaded_file:
+            source.close()
+
+
+def read_measurement_file(uploaded_file, reporter=None):
+    """อ่าน Measurement file (CSV/Excel/Parquet/Arrow หรือบีบอัดด้วย .gz/.zip/.zst) - คืนค่า (SerialSet, source)"""
+    reporter = reporter or Reporter()
+    with reporter.stage('read_measurement', detail=uploaded_file.name) as stage:
+        return _read_measurement_file(uploaded_file, reporter, stage)
+
+
+def _read_measurement_file(uploaded_file, reporter, stage):
+    reporter.write(f"📊 **Reading Measurement File:** {uploaded_file.name}")
+
+    source = uploaded_file
+    try:
+        source = _open_source(uploaded_file, MEASUREMENT_EXTENSIONS, reporter)
+        file_ext = Path(source.name).suffix.lower()
+
+        if file_ext == '.csv':
+            # อ่าน CSV (เฉพาะ serial column ทีละ chunk)
+            serials, serial_col_name, stage['rows'] = read_csv_serials(source, reporter)
+
+        elif file_ext in ['.xlsx', '.xls']:
+            # อ่าน Excel (ตัวอย่างก่อน แล้วเฉพาะ serial column)
+            serials, serial_col_name, stage['rows'] = read_excel_serials(source, reporter)
+
+        elif file_ext in ARROW_EXTENSIONS:
+            # อ่าน Parquet/Arrow (เฉพาะ serial column)
+            serials, serial_col_name, stage['rows'] = read_arrow_serials(source, reporter)
+
+        else:
+            reporter.error(f"❌ Unsupported file format: {file_ext}")
+            return SerialSet(), "Unknown"
+
+        reporter.success(f"✅ Found {len(serials)} valid serials from column '{serial_col_name}'")
+
+        return serials, f"Column: {serial_col_name}"
+
+    except Exception as e:
+        reporter.error(f"❌ Error reading measurement file: {str(e)}")
+        reporter.exception(e)
+        return SerialSet(), "Error"
+
+    finally:
+        if source is not uploaded_file:
+            source.close()
+
+
+def _header_cell(worksheet, value):
+    """Header cell สไตล์เดียวกับที่ pandas.to_excel ใช้ (ตัวหนา มีเส้นขอบ)"""
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.font = REPORT_HEADER_FONT
+    cell.border = REPORT_HEADER_BORDER
+    cell.alignment = REPORT_HEADER_ALIGNMENT
+    return cell
+
+
+def _write_sheet(workbook, title, header, rows, max_width=None, widths=None, row_height=None):
+    """เขียน sheet แบบ streaming (write-only) ทีละแถว ใช้ memory คงที่
+
+    rows() คืน iterator ของแถวใหม่ทุกครั้งที่เรียก - openpyxl write-only เขียนความกว้าง column
+    ไว้ก่อนข้อมูล จึงวัดความกว้างระหว่างวนแถวรอบแรก แล้วเขียนข้อมูลในรอบที่สอง
+    """
+    worksheet = workbook.create_sheet(title)
+
+    if max_width is not None:
+        widths = [len(str(col)) for col in header]
+        for row in rows():
+            for idx, value in enumerate(row):
+                length = len(str(value))
+                if length > widths[idx]:
+                    widths[idx] = length
+        widths = [min(width + 2, max_width) for width in widths]
+
+    for idx, width in enumerate(widths or [], 1):
+        worksheet.column_dimensions[get_column_letter(idx)].width = width
+
+    worksheet.append([_header_cell(worksheet, col) for col in header])
+    for row_num, row in enumerate(rows(), 2):
+        if row_height is not None:
+            worksheet.row_dimensions[row_num].height = row_height
+        worksheet.append(row)
+
+    return worksheet
+
+
+MISSING_DETAIL_HEADER = [
+    'No.', 'Priority', 'Master Serial (Text File)', 'Closest Match in CSV', 'Similarity %',
+    'Visual Pattern', 'Character Differences', 'Status', '⚠️ Action Required'
+]
+
+EXTRA_DETAIL_HEADER = [
+    'No.', 'CSV Serial (Measurement)', 'Closest Match in Master', 'Similarity %',
+    'Visual Pattern', 'Character Differences', 'Status', '⚠️ Action Required'
+]
+
+
+# ข้อความ Action Required ของแต่ละ priority
+MISSING_ACTIONS = {
+    PRIORITY_HIGH: '🚨 URGENT: Verify immediately - likely a typo',
+    PRIORITY_MEDIUM: '⚠️ CHECK: Similar serial exists in CSV',
+    PRIORITY_LOW: '❌ NOT FOUND in CSV file'
+}
+
+EXTRA_ACTIONS = {
+    PRIORITY_HIGH: '🚨 CHECK: Very similar to Master - might be misplaced',
+    PRIORITY_MEDIUM: '⚠️ REVIEW: Similar serial exists in Master',
+    PRIORITY_LOW: '➕ NEW: Not found in Master file'
+}
+
+
+def _candidate_ranks(details):
+    """จำนวน candidate อันดับ 2 เป็นต้นไปที่มากที่สุดใน details (= จำนวนคู่ column ที่ต้องเพิ่ม)"""
+    return int(details['other_matches'].map(len).max()) if len(details) else 0
+
+
+def _candidate_header(ranks, source):
+    """header ของ column candidate เพิ่มเติม (Candidate #2 in <source>, Similarity #2 %, ...)"""
+    header = []
+    for rank in range(2, ranks + 2):
+        header += [f'Candidate #{rank} in {source}', f'Similarity #{rank} %']
+    return header
+
+
+def _candidate_cells(other_matches, ranks):
+    """ค่า column candidate เพิ่มเติมของ detail หนึ่งแถว (เติม '' ให้ครบ ranks คู่)"""
+    cells = []
+    for match, similarity in other_matches:
+        cells += [match, similarity]
+    return tuple(cells) + ('',) * (2 * ranks - len(cells))
+
+
+def _missing_detail_rows(missing_details, ranks=0):
+    """แถวของ sheet Missing (Detailed) - ranks คือจำนวนคู่ column candidate เพิ่มเติมท้ายแถว"""
+    for i, detail in enumerate(missing_details.itertuples(index=False), 1):
+        yield (
+            i,
+            detail.priority,
+            detail.master_serial,
+            detail.closest_csv,
+            detail.similarity,
+            detail.diff_pattern,
+            detail.char_differences,
+            detail.status,
+            MISSING_ACTIONS[detail.priority]
+        ) + _candidate_cells(detail.other_matches, ranks)
+
+
+def _extra_detail_rows(extra_details, ranks=0):
+    """แถวของ sheet Extra (Detailed) - ranks คือจำนวนคู่ column candidate เพิ่มเติมท้ายแถว"""
+    for i, detail in enumerate(extra_details.itertuples(index=False), 1):
+        yield (
+            i,
+            detail.csv_serial,
+            detail.closest_master,
+            detail.similarity,
+            detail.diff_pattern,
+            detail.char_differences,
+            detail.status,
+            EXTRA_ACTIONS[detail.priority]
+        ) + _candidate_cells(detail.other_matches, ranks)
+
+
+def _comparison_method(fuzzy_mode):
+    method = 'edit distance' if fuzzy_mode == MODE_EDIT else 'difflib'
+    return f"First 10 characters + Fuzzy Matching ({method}, indexed - {fuzzy_mode})"
+
+
+def create_excel_report(result, master_filename, measurement_filename):
+    """สร้าง Excel report แบบละเอียด (เขียนแบบ streaming ทีละแถว)"""
+    output = io.BytesIO()
+    workbook = Workbook(write_only=True)
+
+    missing_details = result['missing_details']
+    extra_details = result['extra_details']
+    missing_priority = result['missing_priority']
+
+    # ===== Sheet 1: Summary =====
+    potential_typos = missing_priority[PRIORITY_HIGH]
+
+    summary_rows = [
+        ('Report Generated', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+        ('Master File', master_filename),
+        ('Measurement File', measurement_filename),
+        ('Master Source', result.get('master_source', 'N/A')),
+        ('Measurement Source', result.get('measurement_source', 'N/A')),
+        ('Comparison Method', _comparison_method(result.get('fuzzy_mode', MODE_EXACT))),
+        ('', ''),
+        ('Total Master Sliders', result['total_master']),
+        ('Total Measurement Sliders', result['total_measurement']),
+        ('Matched Sliders', result['matched_count']),
+        ('Match Percentage', f"{result['match_percentage']}%"),
+        ('Missing Sliders', result['missing_count']),
+        ('Extra Sliders', result['extra_count']),
+        ('', ''),
+        ('🚨 Potential Typos (≥80% similar)', potential_typos),
+        ('⚠️ Need Review (50-79% similar)', missing_priority[PRIORITY_MEDIUM]),
+        ('❌ Not Found (<50% similar)', missing_priority[PRIORITY_LOW]),
+        ('', ''),
+        ('Status',
+         '🚨 CRITICAL - Check Potential Typos!' if potential_typos > 0 else
+         '⚠️ WARNING - Missing items found' if result['missing_count'] > 0 else
+         '✅ PASS - All matched')
+    ]
+    _write_sheet(workbook, 'Summary', ['Metric', 'Value'], lambda: iter(summary_rows), widths=[35, 50])
+
+    # ===== Sheet 2: Missing (Detailed) =====
+    if len(missing_details):
+        ranks = _candidate_ranks(missing_details)
+        _write_sheet(workbook, 'Missing (Detailed)', MISSING_DETAIL_HEADER + _candidate_header(ranks, 'CSV'),
+                     lambda: _missing_detail_rows(missing_details, ranks), max_width=50)
+
+    # ===== Sheet 3: Extra (Detailed) =====
+    if len(extra_details):
+        ranks = _candidate_ranks(extra_details)
+        _write_sheet(workbook, 'Extra (Detailed)', EXTRA_DETAIL_HEADER + _candidate_header(ranks, 'Master'),
+                     lambda: _extra_detail_rows(extra_details, ranks), max_width=50)
+
+    # ===== Sheet 4: 🚨 URGENT - Potential Typos =====
+    if potential_typos:
+        def typo_rows():
+            typos = missing_details[missing_details['priority'] == PRIORITY_HIGH]
+            for i, detail in enumerate(typos.itertuples(index=False), 1):
+                # Visual comparison
+                visual = f"{detail.master_serial}\n{detail.closest_csv}\n{detail.diff_pattern}"
+
+                yield (
+                    i,
+                    detail.master_serial,
+                    detail.closest_csv,
+                    detail.similarity,
+                    visual,
+                    detail.char_differences,
+                    '🔍 URGENT: Verify this mismatch immediately',
+                    'Likely a typo or data entry error - High priority to fix'
+                )
+
+        # Row height สูงขึ้นสำหรับ visual comparison (3 บรรทัด)
+        _write_sheet(workbook, '🚨 URGENT - Potential Typos', [
+            'Priority', '⚠️ Master Serial (Text)', '📊 CSV Serial (Closest)', 'Match %',
+            'Visual Comparison', 'Exact Differences', '🚨 Action', 'Recommendation'
+        ], typo_rows, max_width=60, row_height=45)
+
+    # ===== Sheet 5: Missing (Simple List) - missing/extra_serials เรียงไว้แล้ว =====
+    if result.get('missing_serials'):
+        _write_sheet(workbook, 'Missing (Simple List)', ['No.', 'Serial Number (Missing from CSV)'],
+                     lambda: enumerate(result['missing_serials'], 1))
+
+    # ===== Sheet 6: Extra (Simple List) =====
+    if result.get('extra_serials'):
+        _write_sheet(workbook, 'Extra (Simple List)', ['No.', 'Serial Number (Extra in CSV)'],
+                     lambda: enumerate(result['extra_serials'], 1))
+
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def _fuzzy_details(serials, matches, serial_key, closest_key, not_found_status, fuzzy_mode=MODE_EXACT):
+    """แปลงผล closest match (list ของ (match, ratio) ต่อ serial) เป็นตาราง detail (DataFrame หนึ่งแถวต่อ serial)
+
+    ตัวที่ใกล้ที่สุดเป็น closest_key - อันดับถัดไปเก็บใน other_matches เป็น (serial, similarity %)
+    column priority (HIGH/MEDIUM/LOW) คำนวณจาก similarity ไว้ครั้งเดียว
+    """
+    closest, similarities, patterns, differences, statuses, others = [], [], [], [], [], []
+    for serial, top in zip(serials, matches):
+        closest_match, similarity = top[0] if top else (None, 0.0)
+        if closest_match and similarity >= SIMILAR_CUTOFF:
+            if fuzzy_mode == MODE_EDIT:
+                diff_pattern, char_differences = alignment_differences(serial, closest_match)
+            else:
+                diff_pattern = highlight_diff(serial, closest_match)
+                char_differences = get_char_differences(serial, closest_match)
+            closest.append(closest_match)
+            similarities.append(round(similarity * 100, 1))
+            patterns.append(diff_pattern)
+            differences.append(char_differences)
+            statuses.append('POTENTIAL_MATCH' if similarity >= POTENTIAL_MATCH_CUTOFF else 'SIMILAR')
+            # similarity ที่รายงานไม่ใช่คะแนนที่จัดอันดับ (exact/fast) - เรียงอันดับถัดไปตาม % ที่แสดง
+            other = [(match, round(ratio * 100, 1)) for match, ratio in top[1:] if ratio >= SIMILAR_CUTOFF]
+            others.append(sorted(other, key=lambda match: match[1], reverse=True))
+        else:
+            closest.append('NOT_FOUND')
+            similarities.append(0.0)
+            patterns.append('')
+            differences.append('')
+            statuses.append(not_found_status)
+            others.append([])
+
+    similarity = pd.Series(similarities, dtype='float64')
+    return pd.DataFrame({
+        serial_key: pd.Series(list(serials), dtype=object),
+        closest_key: pd.Series(closest, dtype=object),
+        'similarity': similarity,
+        'priority': pd.cut(similarity, PRIORITY_BINS, right=False,
+                           labels=PRIORITY_DTYPE.categories).astype(PRIORITY_DTYPE),
+        'status': pd.Series(statuses, dtype=object),
+        'diff_pattern': pd.Series(patterns, dtype=object),
+        'char_differences': pd.Series(differences, dtype=object),
+        'other_matches': pd.Series(others, dtype=object)
+    })
+
+
+def priority_counts(details):
+    """จำนวน detail ของแต่ละ priority {HIGH: n, MEDIUM: n, LOW: n} - นับครั้งเดียวแล้วเก็บไว้ใน result"""
+    counts = details['priority'].value_counts(sort=False)
+    return {priority: int(counts[priority]) for priority in (PRIORITY_HIGH, PRIORITY_MEDIUM, PRIORITY_LOW)}
+
+
+def _replace_details(details, new_details, serial_key):
+    """แทน (หรือเพิ่ม) แถวของ serial ใน new_details แล้วเรียงตาม serial (ใช้กับ incremental update)"""
+    if not len(new_details):
+        return details
+    kept = details[~details[serial_key].isin(new_details[serial_key])]
+    return pd.concat([kept, new_details], ignore_index=True).sort_values(serial_key, ignore_index=True)
+
+
+def compare_serials(master_serials, measurement_serials, master_source='N/A', measurement_source='N/A',
+                    fuzzy_mode=MODE_EXACT, workers=1, reporter=None, master_index=None, top_k=FUZZY_TOP_K):
+    """เปรียบเทียบ serial sets และวิเคราะห์ missing/extra ด้วย fuzzy matching
+
+    master_index (SerialMatchIndex ของ master) ส่งมาได้เมื่อเปรียบเทียบ master เดิมกับหลายไฟล์
+    top_k คือจำนวน candidate ที่ใกล้ที่สุดที่เก็บต่อ serial (ได้จากการ scan รอบเดียวกัน)
+    คืนค่า result dict ที่ใช้ทั้งแสดงผลและสร้าง Excel report
+    """
+    return _compare_serials(master_serials, measurement_serials, master_source, measurement_source,
+                            fuzzy_mode, workers, reporter, master_index, top_k)[0]
+
+
+def _compare_serials(master_serials, measurement_serials, master_source, measurement_source,
+                     fuzzy_mode, workers, reporter, master_index, top_k=FUZZY_TOP_K):
+    """compare_serials ที่คืนค่า closest match ดิบของ missing serials ด้วย (ใช้กับ incremental update)"""
+    reporter = reporter or Reporter()
+
+    # sorted merge ครั้งเดียวได้ทั้ง missing/matched/extra ที่เรียงแล้ว
+    with reporter.stage('set_difference', rows=len(master_serials) + len(measurement_serials)):
+        missing_sliders, matched_sliders, extra_sliders = SerialSet(master_serials).split(measurement_serials)
+
+    reporter.write(f"✅ Matched: {len(matched_sliders)} serials")
+    reporter.write(f"❌ Missing (in Master but not in CSV): {len(missing_sliders)} serials")
+    reporter.write(f"➕ Extra (in CSV but not in Master): {len(extra_sliders)} serials")
+
+    # Analyze missing sliders
+    missing_sorted = missing_sliders.tolist()
+    with reporter.stage('fuzzy_missing', rows=len(missing_sorted)):
+        missing_matches = closest_matches(
+            missing_sorted, measurement_serials, cutoff=SIMILAR_CUTOFF, mode=fuzzy_mode, workers=workers,
+            progress=lambda done, total: reporter.progress("🔍 Analyzing missing serials...", done, total),
+            n=top_k
+        )
+        missing_details = _fuzzy_details(missing_sorted, missing_matches, 'master_serial', 'closest_csv', 'MISSING',
+                                         fuzzy_mode)
+
+    # Analyze extra sliders
+    extra_sorted = extra_sliders.tolist()
+    with reporter.stage('fuzzy_extra', rows=len(extra_sorted)):
+        extra_matches = closest_matches(
+            extra_sorted, master_index if master_index is not None else master_serials,
+            cutoff=SIMILAR_CUTOFF, mode=fuzzy_mode, workers=workers,
+            progress=lambda done, total: reporter.progress("🔍 Analyzing extra serials...", done, total),
+            n=top_k
+        )
+        extra_details = _fuzzy_details(extra_sorted, extra_matches, 'csv_serial', 'closest_master', 'EXTRA',
+                                       fuzzy_mode)
+
+    result = _comparison_result(master_serials, len(measurement_serials), missing_sorted, extra_sorted,
+                                missing_details, extra_details, master_source, measurement_source, fuzzy_mode)
+    return result, missing_matches
+
+
+def _comparison_result(master_serials, total_measurement, missing_sorted, extra_sorted, missing_details,
+                       extra_details, master_source, measurement_source, fuzzy_mode):
+    matched_count = len(master_serials) - len(missing_sorted)
+    return {
+        'total_master': len(master_serials),
+        'total_measurement': total_measurement,
+        'matched_count': matched_count,
+        'missing_count': len(missing_sorted),
+        'extra_count': len(extra_sorted),
+        'missing_serials': missing_sorted,
+        'extra_serials': extra_sorted,
+        'missing_details': missing_details,
+        'extra_details': extra_details,
+        'missing_priority': priority_counts(missing_details),
+        'extra_priority': priority_counts(extra_details),
+        'master_source': master_source,
+        'measurement_source': measurement_source,
+        'fuzzy_mode': fuzzy_mode,
+        'match_percentage': round((matched_count / len(master_serials) * 100),
+                                  2) if master_serials else 0
+    }
+
+
+def _match_key(target, candidate, fuzzy_mode=MODE_EXACT):
+    """คะแนนที่ใช้เลือก closest match - เหมือนที่ index จัดอันดับ (เท่ากันใช้ตัวที่มากกว่า)"""
+    return match_score(target, candidate, fuzzy_mode), candidate
+
+
+class IncrementalComparison:
+    """ผลการเปรียบเทียบ master/measurement คู่หนึ่งที่ update ต่อได้เมื่อ measurement มีแถวเพิ่ม
+
+    เมื่อมี serial ใหม่เข้ามา คำนวณเฉพาะส่วนที่เปลี่ยนได้:
+    - serial ใหม่ที่อยู่ใน master: ย้ายจาก missing เป็น matched
+    - serial ใหม่ที่ไม่อยู่ใน master: เป็น extra ใหม่ (fuzzy เทียบกับ master เฉพาะตัวใหม่)
+    - missing ที่เหลือ: ค้นเฉพาะใน serial ใหม่ แล้วรวมกับ top-k เดิม (top-k ใหม่ต้องมาจากสองกลุ่มนี้)
+    extra เดิมไม่ต้องคำนวณใหม่เพราะ master ไม่เปลี่ยน
+
+    โหมด exact และ edit ได้ผลเหมือนเปรียบเทียบใหม่ทั้งหมดทุกประการ ส่วนโหมด fast อาจได้ closest match
+    ต่างจากการรันใหม่ (ด้วยเหตุผลเดียวกับที่ fast ต่างจาก exact)
+    """
+
+    def __init__(self, master_serials, master_source='N/A', fuzzy_mode=MODE_EXACT, workers=1,
+                 master_index=None, top_k=FUZZY_TOP_K):
+        self.master_serials = SerialSet(master_serials)
+        self.master_source = master_source
+        self.fuzzy_mode = fuzzy_mode
+        self.workers = workers
+        self.top_k = top_k
+        self.master_index = master_index
+        self.measurement_serials = SerialSet()
+        self.measurement_source = 'N/A'
+        self.missing_closest = {}  # missing serial -> top-k (match, ratio) จาก measurement (list ว่างถ้าไม่มี)
+        self.missing_details = None  # ตาราง detail ของ result ล่าสุด (เรียงตาม serial)
+        self.extra_details = None
+        self.result = None
+        # ไฟล์ measurement ล่าสุด (ใช้ตรวจว่าไฟล์ใหม่เป็นไฟล์เดิม + แถวต่อท้าย)
+        self.file_size = None
+        self.file_digest = None
+
+    def compare(self, measurement_serials, measurement_source='N/A', reporter=None):
+        """เปรียบเทียบเต็มรูปแบบ แล้วจำสถานะไว้สำหรับ append"""
+        if self.master_index is None:
+            reporter = reporter or Reporter()
+            with reporter.stage('master_index', rows=len(self.master_serials)):
+                self.master_index = build_match_index(self.master_serials, mode=self.fuzzy_mode)
+
+        result, missing_matches = _compare_serials(
+            self.master_serials, measurement_serials, self.master_source, measurement_source,
+            self.fuzzy_mode, self.workers, reporter, self.master_index, self.top_k
+        )
+        self.measurement_serials = SerialSet(measurement_serials)
+        self.measurement_source = measurement_source
+        self.missing_closest = dict(zip(result['missing_serials'], missing_matches))
+        self.missing_details = result['missing_details']
+        self.extra_details = result['extra_details']
+        self.result = result
+        return result
+
+    def append(self, new_serials, reporter=None):
+        """เพิ่ม serial จากแถวใหม่ของ measurement แล้วคืนค่า result ที่ update แล้ว
+
+        result มี key 'delta' บอกจำนวนที่เปลี่ยน
+        """
+        reporter = reporter or Reporter()
+        added = SerialSet(new_serials) - self.measurement_serials
+
+        with reporter.stage('incremental_delta', rows=len(added)):
+            new_extra, newly_matched, _ = added.split(self.master_serials)
+            new_extra = new_extra.tolist()
+            self.measurement_serials |= added
+            for serial in newly_matched:
+                del self.missing_closest[serial]
+            if newly_matched:
+                self.missing_details = self.missing_details[
+                    ~self.missing_details['master_serial'].isin(newly_matched.tolist())
+                ].reset_index(drop=True)
+
+        reporter.write(f"➕ New serials: {len(added)} "
+                       f"({len(newly_matched)} now matched, {len(new_extra)} new extra)")
+
+        # missing ที่เหลือ: closest match ใหม่มาจาก serial ใหม่ได้เท่านั้น
+        remaining = sorted(self.missing_closest)
+        updated = []  # top-k เปลี่ยน (อันดับใดก็ได้)
+        improved = []  # ตัวที่ใกล้ที่สุดเปลี่ยน
+        if added and remaining:
+            with reporter.stage('fuzzy_missing', rows=len(remaining), detail='new serials only'):
+                matches = closest_matches(
+                    remaining, added, cutoff=SIMILAR_CUTOFF, mode=self.fuzzy_mode, workers=self.workers,
+                    progress=lambda done, total: reporter.progress("🔍 Re-checking missing serials...",
+                                                                   done, total),
+                    n=self.top_k
+                )
+                for serial, new_top in zip(remaining, matches):
+                    if not new_top:
+                        continue
+                    previous = self.missing_closest[serial]
+                    top = sorted(previous + new_top, key=lambda m: _match_key(serial, m[0], self.fuzzy_mode),
+                                 reverse=True)[:self.top_k]
+                    if top != previous:
+                        self.missing_closest[serial] = top
+                        updated.append(serial)
+                        if top[:1] != previous[:1]:
+                            improved.append(serial)
+                self.missing_details = _replace_details(
+                    self.missing_details,
+                    _fuzzy_details(updated, [self.missing_closest[s] for s in updated],
+                                   'master_serial', 'closest_csv', 'MISSING', self.fuzzy_mode),
+                    'master_serial'
+                )
+
+        with reporter.stage('fuzzy_extra', rows=len(new_extra), detail='new serials only'):
+            extra_matches = closest_matches(
+                new_extra, self.master_index, cutoff=SIMILAR_CUTOFF, workers=self.workers,
+                progress=lambda done, total: reporter.progress("🔍 Analyzing new extra serials...", done, total),
+                n=self.top_k
+            )
+            self.extra_details = _replace_details(
+                self.extra_details,
+                _fuzzy_details(new_extra, extra_matches, 'csv_serial', 'closest_master', 'EXTRA', self.fuzzy_mode),
+                'csv_serial'
+            )
+
+        self.result = _comparison_result(
+            self.master_serials, len(self.measurement_serials), self.missing_details['master_serial'].tolist(),
+            self.extra_details['csv_serial'].tolist(), self.missing_details, self.extra_details,
+            self.master_source, self.measurement_source, self.fuzzy_mode
+        )
+        self.result['delta'] = {
+            'new_serials': len(added),
+            'newly_matched': len(newly_matched),
+            'new_extra': len(new_extra),
+            'improved_matches': len(improved)
+        }
+        return self.result
+
+    def track_file(self, uploaded_file, digest=None):
+        """จำขนาดและ hash ของไฟล์ measurement ที่ใช้ล่าสุด"""
+        self.file_size = uploaded_file.size
+        self.file_digest = digest or file_digest(uploaded_file)
+
+    def is_append(self, uploaded_file):
+        """ไฟล์ CSV ที่ upload ใหม่ = ไฟล์ล่าสุด (ไม่เปลี่ยน) + แถวต่อท้าย หรือไม่"""
+        if self.file_digest is None or Path(uploaded_file.name).suffix.lower() != '.csv':
+            return False
+        if is_compressed(uploaded_file):
+            # member ที่เลือกจาก .zip ชื่อ .csv แต่ bytes เป็น archive - เทียบ prefix ไม่ได้
+            return False
+        if uploaded_file.size <= self.file_size:
+            return False
+        with uploaded_file.getbuffer() as view:
+            # ไฟล์เดิมต้องจบด้วย newline - ไม่งั้นแถวสุดท้ายอาจถูกต่อความยาว
+            if view[self.file_size - 1] != ord('\n'):
+                return False
+            prefix_digest = hashlib.blake2b(view[:self.file_size], digest_size=16).hexdigest()
+        return prefix_digest == self.file_digest
+
+    def append_file(self, uploaded_file, reporter=None):
+        """อ่านเฉพาะแถวที่ต่อท้ายไฟล์ CSV (ต้องผ่าน is_append) แล้ว update ผล"""
+        reporter = reporter or Reporter()
+        data = uploaded_file.getvalue()
+        prefix = data[:self.file_size]
+        header = prefix[:prefix.index(b'\n') + 1]
+
+        with reporter.stage('read_appended_rows', detail=uploaded_file.name) as stage:
+            # ตรวจจับ serial column จากตัวอย่างของไฟล์เดิม (ได้ column เดียวกับตอนอ่านครั้งแรก)
+            sample = pd.read_csv(io.BytesIO(prefix), encoding='utf-8-sig', nrows=CSV_SAMPLE_ROWS)
+            serial_column, _ = detect_serial_column(sample)
+
+            appended = io.BytesIO(header + data[self.file_size:])
+            reporter.write(f"📊 **Reading appended rows:** {uploaded_file.name} "
+                           f"({len(data) - self.file_size:,} new bytes)")
+            serials, _, stage['rows'] = read_csv_serials(appended, reporter, serial_column=serial_column)
+
+        result = self.append(serials, reporter)
+        self.track_file(uploaded_file)
+        return result
+
+
+def compare_many(master_serials, measurements, master_source='N/A', fuzzy_mode=MODE_EXACT, workers=1,
+                 reporter=None, master_index=None, top_k=FUZZY_TOP_K):
+    """เปรียบเทียบ master เดียวกับหลาย measurement โดยสร้าง master index ครั้งเดียว
+
+    measurements เป็น iterable ของ (ชื่อไฟล์, serials, source) - ส่งเป็น generator ได้
+    เพื่ออ่านทีละไฟล์ คืนค่า (list ของ (ชื่อไฟล์, result), aggregate result)
+    """
+    reporter = reporter or Reporter()
+    if master_index is None:
+        with reporter.stage('master_index', rows=len(master_serials)):
+            master_index = build_match_index(master_serials, mode=fuzzy_mode)
+
+    per_file = []
+    for name, serials, source in measurements:
+        reporter.write(f"📊 **{name}**")
+        with reporter.stage('compare_file', rows=len(serials), detail=name):
+            result = compare_serials(
+                master_serials, serials, master_source=master_source, measurement_source=source,
+                fuzzy_mode=fuzzy_mode, workers=workers, reporter=reporter, master_index=master_index,
+                top_k=top_k
+            )
+        per_file.append((name, result))
+
+    return per_file, aggregate_results(master_serials, per_file, master_source, fuzzy_mode)
+
+
+def aggregate_results(master_serials, per_file, master_source='N/A', fuzzy_mode=MODE_EXACT):
+    """รวมผลหลายไฟล์: serial ที่ขาดจากทุกไฟล์ และ extra ของทุกไฟล์รวมกัน"""
+    missing_everywhere = SerialSet(master_serials)
+    extra_anywhere = SerialSet()
+
+    for name, result in per_file:
+        missing_everywhere &= SerialSet(result['missing_serials'])
+        extra_anywhere |= SerialSet(result['extra_serials'])
+
+    missing_sorted = missing_everywhere.tolist()
+    matched_count = len(master_serials) - len(missing_sorted)
+
+    # closest match ที่ใกล้ที่สุดจากทุกไฟล์ของ serial ที่ขาดจากทุกไฟล์ (เท่ากันใช้ไฟล์แรก - idxmax คืนแถวแรก)
+    if per_file:
+        details = pd.concat([result['missing_details'].assign(file=name) for name, result in per_file],
+                            ignore_index=True)
+        details = details[details['master_serial'].isin(missing_sorted)]
+        best = details.groupby('master_serial', sort=True)['similarity'].idxmax()
+        missing_details = details.loc[best.values].reset_index(drop=True)
+    else:
+        missing_details = _fuzzy_details(missing_sorted, [[]] * len(missing_sorted), 'master_serial',
+                                         'closest_csv', 'MISSING').assign(file='')
+
+    return {
+        'file_count': len(per_file),
+        'total_master': len(master_serials),
+        'total_measurement': sum(result['total_measurement'] for _, result in per_file),
+        'matched_count': matched_count,
+        'missing_count': len(missing_sorted),
+        'extra_count': len(extra_anywhere),
+        'missing_serials': missing_sorted,
+        'extra_serials': extra_anywhere.tolist(),
+        'missing_details': missing_details,
+        'missing_priority': priority_counts(missing_details),
+        'master_source': master_source,
+        'fuzzy_mode': fuzzy_mode,
+        'match_percentage': round((matched_count / len(master_serials) * 100),
+                                  2) if master_serials else 0
+    }
+
+
+def result_status(result):
+    """สถานะสรุปของผลการเปรียบเทียบ (CRITICAL / WARNING / PASS)"""
+    if result['missing_priority'][PRIORITY_HIGH] > 0:
+        return 'CRITICAL'
+    return 'WARNING' if result['missing_count'] > 0 else 'PASS'
+
+
+def create_combined_report(per_file, aggregate, master_filename):
+    """สร้าง Excel report รวมของ master เดียวกับหลาย measurement file
+
+    Sheets: Aggregate Summary, Per-File Summary, Missing (All Files) และ Missing/Extra ของแต่ละไฟล์
+    """
+    output = io.BytesIO()
+    workbook = Workbook(write_only=True)
+    potential_typos = aggregate['missing_priority'][PRIORITY_HIGH]
+
+    # ===== Aggregate Summary =====
+    summary_rows = [
+        ('Report Generated', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+        ('Master File', master_filename),
+        ('Master Source', aggregate['master_source']),
+        ('Measurement Files', aggregate['file_count']),
+        ('Comparison Method', _comparison_method(aggregate['fuzzy_mode'])),
+        ('', ''),
+        ('Total Master Sliders', aggregate['total_master']),
+        ('Total Measurement Sliders (all files)', aggregate['total_measurement']),
+        ('Matched in Any File', aggregate['matched_count']),
+        ('Match Percentage', f"{aggregate['match_percentage']}%"),
+        ('Missing from All Files', aggregate['missing_count']),
+        ('Extra (not in Master, any file)', aggregate['extra_count']),
+        ('', ''),
+        ('🚨 Potential Typos (≥80% similar)', potential_typos),
+        ('', ''),
+        ('Status',
+         '🚨 CRITICAL - Check Potential Typos!' if potential_typos > 0 else
+         '⚠️ WARNING - Missing items found' if aggregate['missing_count'] > 0 else
+         '✅ PASS - All matched')
+    ]
+    _write_sheet(workbook, 'Aggregate Summary', ['Metric', 'Value'], lambda: iter(summary_rows), widths=[40, 50])
+
+    # ===== Per-File Summary =====
+    def per_file_rows():
+        for i, (name, result) in enumerate(per_file, 1):
+            yield (
+                i,
+                name,
+                result['measurement_source'],
+                result['total_measurement'],
+                result['matched_count'],
+                result['match_percentage'],
+                result['missing_count'],
+                result['extra_count'],
+                result['missing_priority'][PRIORITY_HIGH],
+                result_status(result)
+            )
+
+    _write_sheet(workbook, 'Per-File Summary', [
+        'No.', 'Measurement File', 'Source', 'Total Sliders', 'Matched', 'Match %',
+        'Missing', 'Extra', 'Potential Typos', 'Status'
+    ], per_file_rows, max_width=50)
+
+    # ===== Missing (All Files) =====
+    if len(aggregate['missing_details']):
+        ranks = _candidate_ranks(aggregate['missing_details'])
+
+        def aggregate_missing_rows():
+            details = aggregate['missing_details']
+            files = details['file'].where(details['similarity'] > 0, '')
+            for row, file in zip(_missing_detail_rows(details, ranks), files):
+                yield row + (file,)
+
+        _write_sheet(workbook, 'Missing (All Files)',
+                     MISSING_DETAIL_HEADER + _candidate_header(ranks, 'CSV') + ['Closest Match From File'],
+                     aggregate_missing_rows, max_width=50)
+
+    # ===== Missing / Extra ของแต่ละไฟล์ (ชื่อ sheet ยาวได้ไม่เกิน 31 ตัวอักษร) =====
+    for i, (name, result) in enumerate(per_file, 1):
+        if len(result['missing_details']):
+            ranks = _candidate_ranks(result['missing_details'])
+            _write_sheet(workbook, f"F{i} Missing", MISSING_DETAIL_HEADER + _candidate_header(ranks, 'CSV'),
+                         lambda details=result['missing_details'], ranks=ranks: _missing_detail_rows(details, ranks),
+                         max_width=50)
+        if len(result['extra_details']):
+            ranks = _candidate_ranks(result['extra_details'])
+            _write_sheet(workbook, f"F{i} Extra", EXTRA_DETAIL_HEADER + _candidate_header(ranks, 'Master'),
+                         lambda details=result['extra_details'], ranks=ranks: _extra_detail_rows(details, ranks),
+                         max_width=50)
+
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def write_report_file(result, master_filename, measurement_filename, path):
+    """สร้าง Excel report แล้วเขียนลงไฟล์ (ใช้กับ process pool ของ batch mode)"""
+    path = Path(path)
+    path.write_bytes(create_excel_report(result, master_filename, measurement_filename).getvalue())
+    return str(path)
+
+
+def export_formats():
+    """format ที่ export ได้ในเครื่องนี้ (Parquet/Arrow ต้องมี pyarrow)"""
+    return [fmt for fmt in EXPORT_FORMATS if ARROW_AVAILABLE or fmt == 'csv']
+
+
+def _export_side(details, serials, side, serial_key, closest_key):
+    """แถว export ของฝั่งหนึ่ง - ไม่มีตาราง detail (extra ของผลรวมหลายไฟล์) ก็มีแค่ serial"""
+    if details is None:
+        return pd.DataFrame({'side': side, 'serial': pd.Series(serials, dtype=object)})
+
+    table = details.drop(columns='other_matches').rename(columns={serial_key: 'serial', closest_key: 'closest_match'})
+    table.insert(0, 'side', side)
+    # candidate อันดับ 2 เป็นต้นไปเป็น column แยก (เหมือน Excel report) เพื่อให้อ่านได้ทุกเครื่องมือ
+    for rank in range(_candidate_ranks(details)):
+        table[f'candidate_{rank + 2}'] = details['other_matches'].map(
+            lambda matches: matches[rank][0] if len(matches) > rank else None)
+        table[f'similarity_{rank + 2}'] = details['other_matches'].map(
+            lambda matches: matches[rank][1] if len(matches) > rank else None).astype('float64')
+    return table
+
+
+def result_table(result):
+    """ผลการเปรียบเทียบเป็นตารางเดียวสำหรับ export - หนึ่งแถวต่อ missing/extra serial (column side)
+
+    มีทั้งตาราง detail และ serial list (serial ของ side เดียวกันเรียงตาม serial)
+    ผลรวมหลายไฟล์มี column file (ไฟล์ที่ให้ closest match) และ extra มีแค่ serial
+    """
+    return pd.concat([
+        _export_side(result['missing_details'], result['missing_serials'], 'MISSING', 'master_serial', 'closest_csv'),
+        _export_side(result.get('extra_details'), result['extra_serials'], 'EXTRA', 'csv_serial', 'closest_master')
+    ], ignore_index=True)
+
+
+def export_result(result, formats):
+    """เขียนผลการเปรียบเทียบเป็นไฟล์ export ทุก format (key ของ EXPORT_FORMATS) จากตารางเดียวกัน
+
+    คืนค่า {format: bytes} - Arrow เป็น IPC file format (Feather v2), CSV บีบอัดด้วย gzip
+    """
+    table = result_table(result)
+    exports = {}
+    for fmt in formats:
+        output = io.BytesIO()
+        if fmt == 'parquet':
+            table.to_parquet(output, index=False)
+        elif fmt == 'arrow':
+            table.to_feather(output)
+        elif fmt == 'csv':
+            table.to_csv(output, index=False, compression={'method': 'gzip', 'mtime': 0})
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+        exports[fmt] = output.getvalue()
+    return exports
+
+
+def write_export_files(result, formats, path):
+    """เขียนไฟล์ export ข้างไฟล์ report (path ไม่มีนามสกุล) - คืนค่า list ของ path ที่เขียน"""
+    path = Path(path)
+    paths = []
+    for fmt, data in export_result(result, formats).items():
+        export_path = path.with_name(path.name + EXPORT_FORMATS[fmt][0])
+        export_path.write_bytes(data)
+        paths.append(str(export_path))
+    return paths
@@ -0,0 +1,49 @@
+"""clean_serial_series (vectorized) ต้องได้ผลเดียวกับ clean_serial ทีละค่า"""
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from slider_core import clean_serial, clean_serial_series  # noqa: E402
+
+
+def reference(series):
+    """ผลที่คาดหวัง: clean_serial ทีละค่า แล้วตัดค่าที่สั้นกว่า 8 ตัวอักษรทิ้ง"""
+    return {serial for serial in series.map(clean_serial) if len(serial) >= 8}
+
+
+CASES = {
+    'missing': [None, np.nan, '', '   ', 'B72ABC1234'],
+    'numbers': [12345678, 1234567890123, 0, 7, 12345678.0, 1.5e10, -123456789],
+    'commas': ['B72ABC1234,A1', 'SY1234567, R01', ',B72ABC1234', 'AB12,34567890', 'B72ABC12 ,OK', 'B7,'],
+    'whitespace': [' b72abc1234 ', 'B72 ABC 1234', 'B72\tABC1234', 'B72ABC1234\r', 'B72\nABC\n1234',
+                   'B72\xa0ABC1234', 'B72 ABC1234', '　B72ABC1234', 'B72\vABC1234', 'B72\x1fABC1234'],
+    'case_folding': ['b72abcß1234', 'straße1234', 'ﬁle12345678', 'ıstanbul123', 'sy1234567ǆ', 'ʼn12345678'],
+    'unicode': ['B72ABC1234é', 'Ａ12345678', 'B72ABC１２３４', '序列号12345678', 'B72ABC1234́'],
+    'lengths': ['B', 'B7234', 'B72ABC1', 'B72ABC12', 'B72ABC123', 'B72ABC1234', 'B72ABC12345', 'B72ABC1234567890XYZ']
+}
+
+
+@pytest.mark.parametrize('values', CASES.values(), ids=CASES.keys())
+def test_matches_clean_serial(values):
+    series = pd.Series(values, dtype=object)
+    assert clean_serial_series(series) == reference(series)
+
+
+@pytest.mark.parametrize('dtype', [object, str])
+def test_string_dtypes(dtype):
+    series = pd.Series(['b72abc1234,a1', ' SY1234567 ', 'B72\xa0ABC1234', 'short', None], dtype=dtype)
+    assert clean_serial_series(series) == reference(series)
+
+
+def test_random_values():
+    rng = random.Random(0)
+    alphabet = 'ABCXYZabcxyz0123456789 ,\t\n\r\xa0 ßﬁı-_./'
+    values = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20))) for _ in range(5000)]
+    series = pd.Series(values, dtype=object)
+    assert clean_serial_series(series) == reference(series)
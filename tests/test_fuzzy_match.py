@@ -0,0 +1,84 @@
+"""SerialMatchIndex ต้องได้ผลเดียวกับการ scan ทั้ง list (difflib สำหรับโหมด exact, brute force สำหรับโหมด edit)"""
+import difflib
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fuzzy_match import MODE_EDIT, MODE_EXACT, SerialMatchIndex, SerialSet, closest_matches  # noqa: E402
+
+# ตัวอักษรน้อยตัว: คะแนนเท่ากันบ่อย และ SequenceMatcher(a, b) != SequenceMatcher(b, a) บ่อย
+ALPHABET = 'AB12'
+CUTOFFS = [0.0, 0.6, 0.8]
+
+
+def random_serials(rng, count, min_length=6, max_length=12):
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(min_length, max_length))) for _ in range(count)]
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = random.Random(0)
+    candidates = sorted(set(random_serials(rng, 250)))
+    targets = random_serials(rng, 80) + candidates[:5]
+    return candidates, targets
+
+
+def difflib_closest(target, candidates, cutoff, n):
+    """ผลแบบเดิม: get_close_matches + similarity ของ SequenceMatcher(None, target, match)"""
+    return [(match, difflib.SequenceMatcher(None, target, match).ratio())
+            for match in difflib.get_close_matches(target, candidates, n=n, cutoff=cutoff)]
+
+
+def lcs_length(a, b):
+    """LCS แบบ DP ตรงตัว (ไม่ใช่ bit-parallel ของ index)"""
+    row = [0] * (len(b) + 1)
+    for ch in a:
+        previous = 0
+        for j, other in enumerate(b, 1):
+            previous, row[j] = row[j], previous + 1 if ch == other else max(row[j], row[j - 1])
+    return row[-1]
+
+
+def brute_force_edit(target, candidates, cutoff, n):
+    """ให้คะแนน candidate ทุกตัวด้วย 2 * LCS / T แล้วเลือก n ตัวที่สูงสุด (เท่ากันใช้ตัวที่มากกว่า)"""
+    scored = [(2.0 * lcs_length(target, c) / (len(target) + len(c)), c) for c in candidates]
+    best = sorted((item for item in scored if item[0] >= cutoff), reverse=True)[:n]
+    return [(candidate, score) for score, candidate in best]
+
+
+@pytest.mark.parametrize('n', [1, 3])
+@pytest.mark.parametrize('cutoff', CUTOFFS)
+def test_exact_matches_difflib(data, cutoff, n):
+    candidates, targets = data
+    index = SerialMatchIndex(candidates, mode=MODE_EXACT)
+    for target in targets:
+        assert index.closest(target, cutoff=cutoff, n=n) == difflib_closest(target, candidates, cutoff, n)
+
+
+@pytest.mark.parametrize('n', [1, 3])
+@pytest.mark.parametrize('cutoff', CUTOFFS)
+def test_edit_matches_brute_force(data, cutoff, n):
+    candidates, targets = data
+    index = SerialMatchIndex(candidates, mode=MODE_EDIT)
+    for target in targets:
+        assert index.closest(target, cutoff=cutoff, n=n) == brute_force_edit(target, candidates, cutoff, n)
+
+
+@pytest.mark.parametrize('mode', [MODE_EXACT, MODE_EDIT])
+def test_closest_matches(data, mode):
+    candidates, targets = data
+    expected = difflib_closest if mode == MODE_EXACT else brute_force_edit
+    results = closest_matches(targets, SerialSet(candidates), cutoff=0.6, mode=mode, n=3)
+    assert results == [expected(target, candidates, 0.6, 3) for target in targets]
+
+
+def test_saved_index(data, tmp_path):
+    candidates, targets = data
+    SerialMatchIndex(SerialSet(candidates)).save(tmp_path / 'index')
+    index = SerialMatchIndex.load(tmp_path / 'index')
+    for target in targets:
+        assert index.closest(target, cutoff=0.6, n=3) == difflib_closest(target, candidates, 0.6, 3)
@@ -0,0 +1,79 @@
+"""IncrementalComparison.append ต้องได้ผลเหมือนเปรียบเทียบใหม่ทั้งหมด (โหมด exact และ edit)"""
+import random
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fuzzy_match import MODE_EDIT, MODE_EXACT  # noqa: E402
+from slider_core import IncrementalComparison, LocalFile, compare_serials, read_measurement_file  # noqa: E402
+
+
+def typo(rng, serial):
+    """แทนที่/แทรก/ลบตัวอักษรหนึ่งตัว"""
+    pos = rng.randrange(len(serial))
+    kind = rng.choice('sid')
+    if kind == 's':
+        return serial[:pos] + rng.choice('AB12') + serial[pos + 1:]
+    if kind == 'i':
+        return serial[:pos] + rng.choice('AB12') + serial[pos:]
+    return serial[:pos] + serial[pos + 1:] + rng.choice('AB12')
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = random.Random(0)
+    master = sorted({'SN' + ''.join(rng.choice('AB12') for _ in range(8)) for _ in range(300)})
+    measurement = [s for s in master if rng.random() < 0.7]
+    measurement += [typo(rng, s) for s in rng.sample(master, 60)]
+    measurement += ['XZ' + ''.join(rng.choice('0123456789') for _ in range(8)) for _ in range(20)]
+    rng.shuffle(measurement)
+    return master, measurement
+
+
+def assert_same_result(result, expected):
+    assert result.keys() - {'delta'} == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(result[key], value, obj=key)
+        else:
+            assert result[key] == value, key
+
+
+@pytest.mark.parametrize('mode', [MODE_EXACT, MODE_EDIT])
+def test_append_matches_full_compare(data, mode):
+    master, measurement = data
+    incremental = IncrementalComparison(master, 'master.txt', fuzzy_mode=mode)
+    incremental.compare(set(measurement[:150]), 'Column: Slider Serial')
+    # append สองรอบ รอบที่สองมี serial ซ้ำกับที่มีอยู่แล้ว
+    incremental.append(set(measurement[150:230]))
+    result = incremental.append(set(measurement[200:]))
+
+    expected = compare_serials(master, set(measurement), 'master.txt', 'Column: Slider Serial', fuzzy_mode=mode)
+    assert_same_result(result, expected)
+    assert result['delta']['new_serials'] == len(set(measurement) - set(measurement[:230]))
+
+
+def test_append_file_matches_full_read(data, tmp_path):
+    master, measurement = data
+    path = tmp_path / 'meas.csv'
+    rows = [f"{serial},PASS" for serial in measurement]
+    path.write_text('Slider Serial,Result\n' + ''.join(row + '\n' for row in rows[:200]), encoding='utf-8')
+
+    first = LocalFile(path)
+    serials, source = read_measurement_file(first)
+    incremental = IncrementalComparison(master, 'master.txt')
+    incremental.compare(serials, source)
+    incremental.track_file(first)
+
+    with path.open('a', encoding='utf-8') as file:
+        file.write(''.join(row + '\n' for row in rows[200:]))
+    appended = LocalFile(path)
+    assert incremental.is_append(appended)
+    result = incremental.append_file(appended)
+
+    serials, source = read_measurement_file(LocalFile(path))
+    assert_same_result(result, compare_serials(master, serials, 'master.txt', source))
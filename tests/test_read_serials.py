@@ -0,0 +1,64 @@
+"""serial column ตัวเลข (มี cell ว่าง) ต้องทำความสะอาดได้ผลเดียวกันทุกชนิดไฟล์"""
+import sys
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import slider_core  # noqa: E402
+from slider_core import ARROW_AVAILABLE, LocalFile, read_measurement_file  # noqa: E402
+
+# cell ว่างทำให้ pandas/pyarrow อ่าน column เป็น float (12345678 -> 12345678.0)
+ROWS = [(12345678, 'PASS'), (None, 'PASS'), (23456789, 'FAIL'), (3456789012, 'PASS'), (None, 'FAIL')]
+EXPECTED = {'12345678', '23456789', '3456789012'}
+
+
+def write_csv(path):
+    lines = ['Slider Serial,Result'] + [f"{'' if serial is None else serial},{result}" for serial, result in ROWS]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+def write_xlsx(path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Slider Serial', 'Result'])
+    for row in ROWS:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_parquet(path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pq.write_table(pa.table({'Slider Serial': [serial for serial, _ in ROWS],
+                             'Result': [result for _, result in ROWS]}), path)
+
+
+def read_serials(path):
+    serials, _ = read_measurement_file(LocalFile(path))
+    return set(serials)
+
+
+def test_csv(tmp_path):
+    write_csv(tmp_path / 'meas.csv')
+    assert read_serials(tmp_path / 'meas.csv') == EXPECTED
+
+
+def test_xlsx_stream(tmp_path):
+    write_xlsx(tmp_path / 'meas.xlsx')
+    assert read_serials(tmp_path / 'meas.xlsx') == EXPECTED
+
+
+def test_excel_pandas(tmp_path, monkeypatch):
+    # path ของ pd.read_excel (.xls หรือเมื่อมี python-calamine)
+    monkeypatch.setattr(slider_core, 'EXCEL_ENGINE', 'openpyxl')
+    write_xlsx(tmp_path / 'meas.xlsx')
+    assert read_serials(tmp_path / 'meas.xlsx') == EXPECTED
+
+
+@pytest.mark.skipif(not ARROW_AVAILABLE, reason="needs pyarrow")
+def test_parquet(tmp_path):
+    write_parquet(tmp_path / 'meas.parquet')
+    assert read_serials(tmp_path / 'meas.parquet') == EXPECTED
@@ -0,0 +1,80 @@
+"""SerialSet (sorted numpy array + searchsorted) ต้องทำงานเหมือน set ของ Python"""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fuzzy_match import SerialSet, serial_array  # noqa: E402
+
+
+def random_serials(rng, count, alphabet='AB12'):
+    """serial สั้นจากตัวอักษรน้อยตัว - มีตัวซ้ำเยอะ"""
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(count)]
+
+
+PAIRS = {
+    'empty': ([], []),
+    'empty_left': ([], ['B1', 'A2']),
+    'empty_right': (['B1', 'A2', 'B1'], []),
+    'duplicates': (['B1', 'B1', 'A2', 'A2', 'A2'], ['A2', 'A2', 'C3']),
+    'disjoint': (['A1', 'A2'], ['B1', 'B2']),
+    'equal': (['A1', 'B2', 'A1'], ['B2', 'A1']),
+    'widths': (['A', 'AB12345678', 'AB'], ['AB', 'AB1234567', 'A']),
+    'prefix': (['AB', 'AB1'], ['AB1', 'AB10']),
+    'non_ascii': (['ÄB1', 'AB1', 'ß12'], ['AB1', 'ß12', 'ZZ9']),
+    'random': (random_serials(random.Random(0), 300), random_serials(random.Random(1), 300)),
+    'random_non_ascii': (random_serials(random.Random(2), 300, 'AB1ß'), random_serials(random.Random(3), 300))
+}
+
+
+@pytest.fixture(params=PAIRS.values(), ids=PAIRS.keys())
+def pair(request):
+    return request.param
+
+
+def test_contents(pair):
+    for values in pair:
+        serials = SerialSet(values)
+        assert len(serials) == len(set(values))
+        assert list(serials) == sorted(set(values))
+        assert all(value in serials for value in values)
+        assert 'NOT-A-SERIAL' not in serials and None not in serials
+
+
+def test_operations(pair):
+    a, b = pair
+    left, right = SerialSet(a), SerialSet(b)
+    expected = {'-': set(a) - set(b), '&': set(a) & set(b), '|': set(a) | set(b)}
+    results = {'-': left - right, '&': left & right, '|': left | right}
+    for op, result in results.items():
+        assert isinstance(result, SerialSet)
+        assert list(result) == sorted(expected[op]), op
+        assert len(result) == len(expected[op]), op
+
+
+def test_operations_with_python_set(pair):
+    a, b = pair
+    left = SerialSet(a)
+    assert set(left - set(b)) == set(a) - set(b)
+    assert set(left & set(b)) == set(a) & set(b)
+    assert set(left | set(b)) == set(a) | set(b)
+    assert (left == set(a)) and (left <= set(a) | set(b))
+
+
+def test_split(pair):
+    a, b = pair
+    only_left, both, only_right = SerialSet(a).split(SerialSet(b))
+    assert list(only_left) == sorted(set(a) - set(b))
+    assert list(both) == sorted(set(a) & set(b))
+    assert list(only_right) == sorted(set(b) - set(a))
+
+
+def test_from_arrays(pair):
+    a, b = pair
+    chunks = [a[:len(a) // 2], a[len(a) // 2:], b, []]
+    arrays = [serial_array(chunk) for chunk in chunks if chunk]
+    assert list(SerialSet.from_arrays(arrays)) == sorted(set(a) | set(b))
+    assert len(SerialSet.from_arrays([])) == 0